@@ -0,0 +1,52 @@
+import os
+import sys
+import timeit
+import argparse
+import warnings
+import numpy as np
+
+# Allow running as "python Testing/bench_compiled_models.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ml_utils import build_models
+from utils.compiled_models import compile_models
+
+# Microbenchmark: sklearn predict vs. the compiled NumPy predictors on single login rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiled model latency microbenchmark')
+    parser.add_argument('--users', type=int, default=10, help='Classes in the synthetic data')
+    parser.add_argument('--samples', type=int, default=30, help='Training samples per user')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    X = rng.normal(size=(args.users * args.samples, 10)) + np.repeat(np.arange(args.users), args.samples)[:, None] * 0.5
+    y = np.repeat(np.arange(1, args.users + 1), args.samples)
+    models = build_models(forest_jobs=None)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for model in models.values():
+            model.fit(X, y)
+    compiled = compile_models(models, X)
+
+    row = rng.normal(size=(1, 10))
+    print(f"{'model':>24} {'sklearn us':>12} {'compiled us':>12} {'speedup':>8}")
+    total_sklearn = total_compiled = 0.0
+    for model_name, model in models.items():
+        sklearn_s = timeit.timeit(lambda: model.predict(row), number=args.repeat) / args.repeat
+        total_sklearn += sklearn_s
+        if model_name not in compiled:
+            print(f"{model_name:>24} {sklearn_s * 1e6:12.1f} {'-':>12}")
+            total_compiled += sklearn_s
+            continue
+        predictor = compiled[model_name]
+        compiled_s = timeit.timeit(lambda: predictor.predict(row), number=args.repeat) / args.repeat
+        total_compiled += compiled_s
+        print(f"{model_name:>24} {sklearn_s * 1e6:12.1f} {compiled_s * 1e6:12.1f} {sklearn_s / compiled_s:7.1f}x")
+    print(f"{'ensemble':>24} {total_sklearn * 1e6:12.1f} {total_compiled * 1e6:12.1f} {total_sklearn / total_compiled:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Allow running as "python Testing/bench_evaluation.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.evaluate_metrics import calculate_frr_far, user_error_rates, grid_error_rates
+
+# Time of the vectorized per-user EER/AUC and FAR/FRR curves on a synthetic score
+# matrix shaped like predict_proba output, against thresholding every user at every
+# grid threshold one by one with calculate_frr_far (timed on a sample of users).
+
+
+def make_scores(users, rows_per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    y = np.repeat(np.arange(users), rows_per_user)
+    logits = rng.normal(size=(len(y), users)).astype(np.float32)
+    logits[np.arange(len(y)), y] += 3.0
+    scores = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return scores / scores.sum(axis=1, keepdims=True), y, np.arange(users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the offline FAR/FRR/EER evaluation')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--rows-per-user', type=int, default=5)
+    parser.add_argument('--loop-users', type=int, default=20, help='Users timed with the per-threshold loop')
+    args = parser.parse_args()
+
+    scores, y, classes = make_scores(args.users, args.rows_per_user)
+    thresholds = np.linspace(0, 1, 101)
+    print(f"{len(y)} held-out rows x {args.users} users")
+
+    start = time.perf_counter()
+    rates = user_error_rates(scores, y, classes)
+    exact_time = time.perf_counter() - start
+    start = time.perf_counter()
+    grid_error_rates(scores, y, classes, thresholds)
+    grid_time = time.perf_counter() - start
+    print(f"Exact EER/AUC of every user:      {exact_time:.2f} s (mean EER {np.nanmean(rates['eer']):.4f})")
+    print(f"FAR/FRR on {len(thresholds)} thresholds:       {grid_time:.2f} s")
+
+    start = time.perf_counter()
+    for j in range(args.loop_users):
+        for threshold in thresholds:
+            calculate_frr_far(y == classes[j], scores[:, j] >= threshold, positive_class=True)
+    loop_time = (time.perf_counter() - start) / args.loop_users * args.users
+    print(f"Per-user threshold loop (estimate): {loop_time:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import timeit
+import argparse
+import numpy as np
+
+# Allow running as "python Testing/bench_features.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.calculate_features import calculate_keystroke_features, calculate_keystroke_features_batch
+
+# Microbenchmark: list-comprehension feature calculation vs. the NumPy version and the batched API
+
+
+def reference_calculate_keystroke_features(key_press_times, key_release_times):
+    # The previous pure-Python implementation, without its debug prints
+    if len(key_press_times) != len(key_release_times):
+        raise ValueError("Mismatch between key press and release times")
+    press_press_intervals = [key_press_times[i] - key_press_times[i - 1] for i in range(1, len(key_press_times))]
+    press_release_durations = [key_release_times[i] - key_press_times[i] for i in range(len(key_press_times))]
+    release_press_intervals = [key_press_times[i] - key_release_times[i - 1] for i in range(1, len(key_press_times))]
+    hold_times = [key_release_times[i] - key_press_times[i] for i in range(len(key_press_times))]
+    press_to_release_ratio_mean = (
+        sum(release_press_intervals) / sum(press_press_intervals)
+        if sum(press_press_intervals) != 0 else 0
+    )
+    total_typing_time = key_release_times[-1] - key_press_times[0]
+    typing_speed_cps = len(key_press_times) / (total_typing_time / 1000)
+    return {
+        'press_press_intervals': press_press_intervals,
+        'press_release_durations': press_release_durations,
+        'release_press_intervals': release_press_intervals,
+        'hold_times': hold_times,
+        'total_typing_time': total_typing_time,
+        'typing_speed_cps': typing_speed_cps,
+        'press_to_release_ratio_mean': press_to_release_ratio_mean,
+    }
+
+
+def make_session(keys, rng):
+    press = np.cumsum(rng.uniform(80, 250, size=keys))
+    release = press + rng.uniform(50, 150, size=keys)
+    return press.tolist(), release.tolist()
+
+
+def check_parity(sessions):
+    for press, release in sessions:
+        expected = reference_calculate_keystroke_features(press, release)
+        actual = calculate_keystroke_features(press, release)
+        for key, value in expected.items():
+            assert np.allclose(value, actual[key]), key
+
+    batch = calculate_keystroke_features_batch([p for p, _ in sessions], [r for _, r in sessions])
+    for i, (press, release) in enumerate(sessions):
+        expected = reference_calculate_keystroke_features(press, release)
+        assert np.allclose(batch['press_press_intervals'][i], expected['press_press_intervals'])
+        assert np.isclose(batch['typing_speed_cps'][i], expected['typing_speed_cps'])
+        assert np.isclose(batch['hold_time_variance'][i], np.var(expected['hold_times']))
+        assert np.isclose(batch['release_interval_mean'][i], np.mean(expected['release_press_intervals']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keystroke feature calculation microbenchmark')
+    parser.add_argument('--keys', type=int, default=20, help='Keys per session')
+    parser.add_argument('--sessions', type=int, default=1000, help='Sessions for the batch comparison')
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    sessions = [make_session(args.keys, rng) for _ in range(args.sessions)]
+    check_parity(sessions[:100])
+    print("Parity with the reference implementation: OK")
+
+    press, release = sessions[0]
+    for name, func in [('reference', reference_calculate_keystroke_features),
+                       ('numpy', calculate_keystroke_features)]:
+        seconds = timeit.timeit(lambda: func(press, release), number=args.repeat) / args.repeat
+        print(f"single session, {name:>9}: {seconds * 1e6:8.1f} us")
+
+    presses = [p for p, _ in sessions]
+    releases = [r for _, r in sessions]
+    loop = timeit.timeit(
+        lambda: [calculate_keystroke_features(p, r) for p, r in sessions], number=5) / 5
+    batch = timeit.timeit(
+        lambda: calculate_keystroke_features_batch(presses, releases), number=5) / 5
+    print(f"{args.sessions} sessions, per-call loop: {loop * 1e3:8.2f} ms")
+    print(f"{args.sessions} sessions, batched:       {batch * 1e3:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
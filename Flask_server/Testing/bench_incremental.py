@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Allow running as "python Testing/bench_incremental.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sklearn.preprocessing import StandardScaler
+from utils.feature_transform import FEATURE_COLUMNS
+from utils.ml_utils import INCREMENTAL_MODELS, build_models, partial_update_models
+
+# Benchmark: incremental partial_fit update vs. full retrain on synthetic keystroke features
+
+
+def make_data(rows, users, rng):
+    # Each user gets its own feature means so the classes are learnable
+    centers = rng.normal(0, 3, size=(users, len(FEATURE_COLUMNS)))
+    y = rng.integers(1, users + 1, size=rows)
+    X = centers[y - 1] + rng.normal(0, 1, size=(rows, len(FEATURE_COLUMNS)))
+    return X, y
+
+
+def bench(rows, users, delta_rows, full_models, rng):
+    X, y = make_data(rows + delta_rows, users, rng)
+    X_base, y_base = X[:rows], y[:rows]
+    X_delta, y_delta = X[rows:], y[rows:]
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X_base)
+
+    # Full retrain of the selected models on all rows
+    models = {name: model for name, model in build_models().items() if name in full_models}
+    start = time.perf_counter()
+    for model in models.values():
+        model.fit(X_scaled, y_base)
+    full_time = time.perf_counter() - start
+
+    # Incremental update of the partial_fit models on the new rows only
+    incremental = {name: model for name, model in build_models().items() if name in INCREMENTAL_MODELS}
+    for model in incremental.values():
+        model.fit(X_scaled, y_base)
+    start = time.perf_counter()
+    updated = partial_update_models(incremental, scaler, X_delta, y_delta)
+    incremental_time = time.perf_counter() - start
+    per_model = {name: timing['update_time_s'] for name, (_, timing) in updated.items()}
+
+    return full_time, incremental_time, per_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental update vs. full retrain benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--delta-rows', type=int, default=5, help='New rows per incremental update')
+    parser.add_argument('--full-models', nargs='+', default=list(build_models()),
+                        help='Models included in the full retrain (SVC is slow at 100k rows)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'rows':>8} {'full retrain (s)':>18} {'incremental (s)':>16} {'speedup':>8}")
+    for rows in args.sizes:
+        full_time, incremental_time, per_model = bench(rows, args.users, args.delta_rows, args.full_models, rng)
+        print(f"{rows:>8} {full_time:>18.3f} {incremental_time:>16.4f} {full_time / incremental_time:>7.0f}x  "
+              + ', '.join(f"{name} {seconds:.4f} s" for name, seconds in per_model.items()))
+
+
+if __name__ == '__main__':
+    main()
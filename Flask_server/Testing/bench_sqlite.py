@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+# Allow running as "python Testing/bench_sqlite.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Concurrent write/read benchmark: several writer processes commit one sample at a time
+# (like /authenticate and /train-keystroke) while a reader repeats the full training read.
+# Runs once with SQLite's defaults (rollback journal) and once with the Config settings.
+
+FEATURES = dict(
+    press_press_interval_mean=200.0, release_interval_mean=100.0, hold_time_mean=90.0,
+    press_press_interval_variance=10.0, release_interval_variance=12.0, hold_time_variance=5.0,
+    backspace_count=1, error_rate=0.01, total_typing_time=2400.0, typing_speed_cps=5.0
+)
+
+
+def _app_config(db_path, mode):
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'}
+    if mode == 'default':
+        config.update({'SQLITE_PRAGMAS': {}, 'SQLALCHEMY_ENGINE_OPTIONS': {}})
+    return config
+
+
+def _wait_for_start(ready, start, seconds):
+    # Imports and app setup happen before the clock starts
+    ready.put(os.getpid())
+    start.wait()
+    return time.time() + seconds
+
+
+def _writer(db_path, mode, user_id, seconds, ready, start, results):
+    from app import create_app
+    from models import db, PreprocessedKeystrokeData
+    app = create_app(_app_config(db_path, mode))
+    latencies, errors = [], 0
+    with app.app_context():
+        deadline = _wait_for_start(ready, start, seconds)
+        while time.time() < deadline:
+            began = time.perf_counter()
+            try:
+                db.session.add(PreprocessedKeystrokeData(user_id=user_id, **FEATURES))
+                db.session.commit()
+                latencies.append(time.perf_counter() - began)
+            except Exception:
+                db.session.rollback()
+                errors += 1
+    results.put(('write', latencies, errors))
+
+
+def _reader(db_path, mode, seconds, ready, start, results):
+    from app import create_app
+    from models import db
+    from utils.ml_utils import load_training_data
+    app = create_app(_app_config(db_path, mode))
+    latencies, errors = [], 0
+    with app.app_context():
+        deadline = _wait_for_start(ready, start, seconds)
+        while time.time() < deadline:
+            began = time.perf_counter()
+            try:
+                load_training_data(db.engine)
+                latencies.append(time.perf_counter() - began)
+            except Exception:
+                errors += 1
+    results.put(('read', latencies, errors))
+
+
+def _seed(db_path, mode, rows):
+    from app import create_app
+    from models import db, User, PreprocessedKeystrokeData
+    app = create_app(_app_config(db_path, mode))
+    with app.app_context():
+        db.session.add(User(username='bench', password='x'))
+        db.session.commit()
+        db.session.bulk_insert_mappings(PreprocessedKeystrokeData, [dict(user_id=1, **FEATURES)] * rows)
+        db.session.commit()
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(mode, writers, seconds, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _seed(db_path, mode, rows)
+
+        ctx = multiprocessing.get_context('spawn')
+        results, ready, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+        processes = [ctx.Process(target=_writer, args=(db_path, mode, 1, seconds, ready, start, results)) for _ in range(writers)]
+        processes.append(ctx.Process(target=_reader, args=(db_path, mode, seconds, ready, start, results)))
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get()
+        start.set()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    writes = [latency for kind, latencies, _ in collected if kind == 'write' for latency in latencies]
+    reads = [latency for kind, latencies, _ in collected if kind == 'read' for latency in latencies]
+    write_errors = sum(errors for kind, _, errors in collected if kind == 'write')
+    read_errors = sum(errors for kind, _, errors in collected if kind == 'read')
+    print(f"{mode:>8}: {len(writes) / seconds:8.1f} commits/s  "
+          f"commit p50 {_percentile(writes, 0.5) * 1000:7.2f} ms  p99 {_percentile(writes, 0.99) * 1000:8.2f} ms  "
+          f"errors {write_errors:3d}  training reads {len(reads):4d} (p50 {_percentile(reads, 0.5) * 1000:6.1f} ms, errors {read_errors})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite concurrent write/read benchmark')
+    parser.add_argument('--writers', type=int, default=4, help='Writer processes')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rows', type=int, default=20000, help='Rows seeded before the run')
+    args = parser.parse_args()
+
+    for mode in ('default', 'tuned'):
+        run(mode, args.writers, args.seconds, args.rows)
+
+
+if __name__ == '__main__':
+    main()
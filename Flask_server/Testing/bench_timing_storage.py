@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import numpy as np
+
+# Allow running as "python Testing/bench_timing_storage.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.timing_codec import TIMING_COLUMNS, decode_timings, store_timings
+
+# Database size and decode throughput of the keystrokes timing columns stored as JSON
+# text versus float32 blobs. The rows are written like the routes write them.
+
+
+def make_rows(sessions, keys, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(sessions):
+        press = np.cumsum(rng.uniform(80, 400, keys))
+        release = press + rng.uniform(40, 160, keys)
+        rows.append(((press[1:] - press[:-1]).tolist(), (press[1:] - release[:-1]).tolist(), (release - press).tolist()))
+    return rows
+
+
+def build_db(path, rows, timing_format):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE keystrokes (id INTEGER PRIMARY KEY, user_id INTEGER, "
+        "press_press_intervals VARCHAR, release_press_intervals VARCHAR, hold_times VARCHAR)"
+    )
+    with conn:
+        conn.executemany(
+            "INSERT INTO keystrokes (user_id, press_press_intervals, release_press_intervals, hold_times) VALUES (1, ?, ?, ?)",
+            [tuple(store_timings(values, timing_format) for values in row) for row in rows]
+        )
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def time_decode(path, repeats):
+    conn = sqlite3.connect(path)
+    values = [value for row in conn.execute(f"SELECT {', '.join(TIMING_COLUMNS)} FROM keystrokes") for value in row]
+    conn.close()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for value in values:
+            decode_timings(value)
+        best = min(best, time.perf_counter() - start)
+    return len(values), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON versus float32 blob storage of keystroke timings')
+    parser.add_argument('--sessions', type=int, default=20000, help='keystrokes rows')
+    parser.add_argument('--keys', type=int, default=40, help='Key presses per session')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.sessions, args.keys)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for timing_format in ('json', 'float32'):
+            path = os.path.join(tmp, f'{timing_format}.db')
+            size = build_db(path, rows, timing_format)
+            count, seconds = time_decode(path, args.repeats)
+            results[timing_format] = (size, seconds)
+            print(f"{timing_format:>8}: db {size / 2**20:7.2f} MB  decode {count / seconds:10.0f} arrays/s "
+                  f"({seconds * 1000:7.1f} ms for {count} arrays)")
+
+    (json_size, json_seconds), (blob_size, blob_seconds) = results['json'], results['float32']
+    print(f"float32 blobs: {json_size / blob_size:.1f}x smaller, decode {json_seconds / blob_seconds:.1f}x faster")
+
+    # Largest rounding error float32 storage introduces on these timings
+    error = max(
+        float(np.max(np.abs(decode_timings(store_timings(values, 'float32')) - values)))
+        for row in rows[:1000] for values in map(np.asarray, row)
+    )
+    print(f"max float32 rounding error: {error:.2e} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# Shared setup of the pytest tests in this folder (python -m pytest Testing, or a single
+# file, from Flask_server or the repo root). The Flask_server folder goes on sys.path so
+# the tests import the app the way it runs. The requests-based scripts next to them
+# (Test_*.py, test_training.py, ...) talk to a running server instead.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def new_session(rng, keys=20):
+    """
+    One typing session as the clients send it: press and release times plus the
+    backspace count and error rate.
+    """
+    press = np.cumsum(rng.uniform(120, 260, keys))
+    release = press + rng.uniform(60, 120, keys)
+    return {
+        'key_press_times': press.tolist(),
+        'key_release_times': release.tolist(),
+        'backspace_count': int(rng.integers(0, 3)),
+        'error_rate': float(rng.uniform(0, 0.1))
+    }
+
+
+@pytest.fixture
+def make_session():
+    return new_session
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Factory for apps that keep every file under tmp_path: the database (plus its feature
+    store next to it), the models folder and the per-user verifiers. Training jobs are
+    only queued unless a test turns TRAINING_WORKER_ENABLED back on.
+    """
+    from app import create_app
+    from utils import model_registry, user_cache
+
+    def factory(db_name='test.db', **config):
+        settings = {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / db_name}",
+            'MODELS_DIR': str(tmp_path / 'models'),
+            'TRAINING_WORKER_ENABLED': False
+        }
+        settings.update(config)
+        return create_app(settings)
+
+    # The registry and the profile cache are per process, not per app
+    model_registry.clear()
+    user_cache.clear()
+    yield factory
+    model_registry.clear()
+    user_cache.clear()
@@ -0,0 +1,57 @@
+import os
+import sys
+import argparse
+
+# Allow running as "python Testing/report_model_memory.py" from the Flask_server folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import joblib
+from utils import model_store
+from utils.model_registry import mapped_bytes, process_rss_bytes
+
+# Size and memory report of the active model version: file size, bytes served from
+# memory-mapped (shared) pages and the private memory each load adds to the process.
+
+
+def load_report(path, mmap_mode):
+    rss_before = process_rss_bytes()
+    obj = joblib.load(path, mmap_mode=mmap_mode)
+    rss_after = process_rss_bytes()
+    rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    return obj, mapped_bytes(obj), rss_delta
+
+
+def mb(value):
+    return f"{value / (1024 * 1024):8.2f}" if value is not None else f"{'-':>8}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Model artifact size and RSS report')
+    parser.add_argument('--version', help='Model version to report, default the active one')
+    parser.add_argument('--mmap-mode', default='r', help="joblib mmap_mode, 'none' to load into memory")
+    args = parser.parse_args()
+
+    version = args.version or model_store.current_version()
+    if version is None:
+        print("No model version has been published yet")
+        return
+    mmap_mode = None if args.mmap_mode.lower() == 'none' else args.mmap_mode
+    manifest = model_store.read_manifest(version)
+    entries = {**manifest['models'], **manifest.get('artifacts', {})}
+
+    print(f"Model version {version}, mmap_mode={mmap_mode}")
+    print(f"{'artifact':>24} {'file MB':>8} {'mapped MB':>9} {'RSS +MB':>8}")
+    loaded = []  # Keep everything alive so each RSS delta only counts its own artifact
+    total_size = total_mapped = 0
+    for name, entry in entries.items():
+        obj, mapped, rss_delta = load_report(os.path.join(model_store.version_dir(version), entry['file']), mmap_mode)
+        loaded.append(obj)
+        total_size += entry['size_bytes']
+        total_mapped += mapped
+        print(f"{name:>24} {mb(entry['size_bytes'])} {mb(mapped):>9} {mb(rss_delta)}")
+    print(f"{'total':>24} {mb(total_size)} {mb(total_mapped):>9}")
+    print(f"Process RSS: {mb(process_rss_bytes()).strip()} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+# Startup-time report: where "import app" spends its time, per top-level package and per
+# module imported directly by app.py, optionally followed by create_app and warm-up.
+
+FLASK_SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module='app'):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        list: (module name, self microseconds, cumulative microseconds, nesting level)
+        in the order the interpreter reports them (children before their parent).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=FLASK_SERVER_DIR, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return rows
+
+
+def total_import_seconds(rows, module='app'):
+    for name, _, cumulative_us, _ in rows:
+        if name == module:
+            return cumulative_us / 1e6
+    return None
+
+
+def _startup_phases():
+    # create_app and warm-up timings, measured in a fresh interpreter after the imports
+    code = (
+        "import json, time\n"
+        "import app\n"
+        "from utils import warmup\n"
+        "start = time.perf_counter()\n"
+        "application = app.create_app()\n"
+        "created = time.perf_counter() - start\n"
+        "warmup.warm_up(application)\n"
+        "state = warmup.status()\n"
+        "print(json.dumps({'create_app_ms': created * 1000, "
+        "'steps': {k: v['time_ms'] for k, v in state['steps'].items()}}))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=FLASK_SERVER_DIR, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup-time report')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list')
+    parser.add_argument('--warm', action='store_true', help='Also time create_app and the warm-up steps')
+    args = parser.parse_args()
+
+    rows = import_times()
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split('.')[0]] += self_us
+
+    print(f"import app: {total_import_seconds(rows) * 1000:.1f} ms")
+    print(f"\n{'package':>28} {'self ms':>9}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{package:>28} {self_us / 1000:9.1f}")
+
+    # Direct imports of app.py are listed just before it, one level deeper; their
+    # cumulative time includes everything they were first to import
+    app_index = next(i for i, row in enumerate(rows) if row[0] == 'app')
+    app_level = rows[app_index][3]
+    first = app_index
+    while first > 0 and rows[first - 1][3] > app_level:
+        first -= 1
+    print(f"\n{'imported by app.py':>28} {'cumul. ms':>9}")
+    for name, _, cumulative_us, level in rows[first:app_index]:
+        if level == app_level + 1:
+            print(f"{name:>28} {cumulative_us / 1000:9.1f}")
+
+    if args.warm:
+        phases = _startup_phases()
+        print(f"\n{'create_app':>28} {phases['create_app_ms']:9.1f}")
+        for step, time_ms in phases['steps'].items():
+            print(f"{'warm-up ' + step:>28} {time_ms:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+from sqlalchemy import inspect
+from sklearn.linear_model import LogisticRegression
+from app import create_app
+from models import db
+from utils import warmup, model_store
+from utils.feature_transform import FEATURE_COLUMNS
+
+# create_app builds independent, fully migrated apps from overrides; /ready answers 503
+# until warm-up has run, and reports whether the models could be loaded.
+
+
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(warmup, '_state', {
+        'ready': False, 'started_at': None, 'finished_at': None,
+        'warmed_in_pid': None, 'models_loaded': False, 'steps': {}
+    })
+
+
+def test_create_app_applies_overrides(make_app, tmp_path):
+    app = make_app(TRAINING_TRIGGER_SAMPLES=3)
+    assert app.config['TRAINING_TRIGGER_SAMPLES'] == 3 and app.config['MODELS_DIR'] == str(tmp_path / 'models')
+    with app.app_context():
+        tables = set(inspect(db.engine).get_table_names())
+    assert {'users', 'preprocessed_keystroke_data', 'training_jobs', 'training_state'} <= tables
+
+    class OverrideConfig:
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'other.db'}"
+        MODELS_DIR = str(tmp_path / 'other-models')
+        TRAINING_WORKER_ENABLED = False
+        TRAINING_TRIGGER_SAMPLES = 7
+        lowercase_is_ignored = True
+
+    other = create_app(OverrideConfig)
+    assert other.config['TRAINING_TRIGGER_SAMPLES'] == 7 and 'lowercase_is_ignored' not in other.config
+    assert other is not app
+
+
+def test_ready_after_warm_up(make_app, monkeypatch):
+    fresh_state(monkeypatch)
+    app = make_app()
+    client = app.test_client()
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.get_json()['reason']
+
+    # No model set yet: ready for registrations, but without models
+    warmup.warm_up(app)
+    state = client.get('/ready').get_json()
+    assert state['ready'] and not state['models_loaded']
+    assert state['steps']['database']['ok'] and state['steps']['features']['ok']
+    assert not state['steps']['models']['ok']
+
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        model = LogisticRegression().fit(rng.normal(size=(20, len(FEATURE_COLUMNS))), np.repeat([1, 2], 10))
+        version = model_store.publish_version({'logistic_regression': model}, {})
+    warmup.warm_up(app)
+    response = client.get('/ready')
+    assert response.status_code == 200 and response.get_json()['models_loaded']
+    assert response.get_json()['steps']['models']['detail'] == {'version': version, 'models': ['logistic_regression']}
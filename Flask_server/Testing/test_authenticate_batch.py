@@ -0,0 +1,105 @@
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from models import PreprocessedKeystrokeData
+from utils import inference, model_registry, model_store, user_cache, write_behind
+from utils.feature_transform import FEATURE_COLUMNS, TRANSFORM_ARTIFACT
+
+# /authenticate/batch must give every attempt the result /authenticate gives it alone:
+# the same errors, the same transformed feature row handed to the models, and the same
+# profile cache, sample storage and inference mode.
+
+
+def publish_model_set(rng):
+    X = rng.uniform(0, 500, (40, len(FEATURE_COLUMNS)))
+    y = np.repeat([1, 2], 20)
+    scaler = StandardScaler().fit(X)
+    model = LogisticRegression().fit(scaler.transform(X), y)
+    model_store.publish_version({'logistic_regression': model}, {'features': FEATURE_COLUMNS},
+                                artifacts={TRANSFORM_ARTIFACT: scaler})
+
+
+def test_batch_matches_single_logins(make_app, make_session, monkeypatch):
+    rng = np.random.default_rng(0)
+    app = make_app(TRAINING_TRIGGER_SAMPLES=1000)
+    client = app.test_client()
+    for name in ('alice', 'bob'):
+        client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+        payload = {'userName': name, 'password': 'pw', 'sessions': [make_session(rng) for _ in range(10)]}
+        assert client.post('/enroll/bulk', json=payload).status_code == 200
+    with app.app_context():
+        publish_model_set(rng)
+        model_registry.clear()
+        stored = PreprocessedKeystrokeData.query.count()
+
+    model_inputs = []
+    predict_ensemble = inference.predict_ensemble
+
+    def recording_predict_ensemble(models, X):
+        model_inputs.append(np.array(X))
+        return predict_ensemble(models, X)
+
+    monkeypatch.setattr(inference, 'predict_ensemble', recording_predict_ensemble)
+    mismatched = make_session(rng)
+    mismatched['key_release_times'] = mismatched['key_release_times'][:-1]
+    attempts = [
+        dict(make_session(rng), username='alice', password='pw'),
+        dict(make_session(rng), username='alice', password='wrong'),
+        dict(make_session(rng), username='bob', password='pw'),
+        dict(mismatched, username='bob', password='pw'),
+        dict(make_session(rng), username='nobody', password='pw'),
+        dict(make_session(rng), username='alice', password='pw')
+    ]
+    results = client.post('/authenticate/batch', json={'attempts': attempts}).get_json()['results']
+    assert [result['authenticated'] for result in results] == [True, False, True, False, False, True]
+    assert results[1]['error'] == 'Authentication failed' and results[4]['error'] == 'Authentication failed'
+    assert results[3]['error'] == 'Mismatch between key press and release times'
+    assert all(len(results[i]['predictions']) == 1 and results[i]['token'] for i in (0, 2, 5))
+    batch_input = model_inputs.pop()
+    assert batch_input.shape == (3, len(FEATURE_COLUMNS)) and batch_input.flags['C_CONTIGUOUS']
+
+    # The same attempts one at a time reach the models as the same rows
+    for row, i in enumerate((0, 2, 5)):
+        response = client.post('/authenticate', json=attempts[i])
+        assert response.status_code == 200
+        assert response.get_json()['predictions'] == results[i]['predictions']
+        assert np.allclose(model_inputs.pop(), batch_input[row])
+
+    with app.app_context():
+        assert PreprocessedKeystrokeData.query.count() == stored + 6  # 3 from the batch, 3 single logins
+
+
+def test_batch_rejects_malformed_requests(make_app):
+    client = make_app().test_client()
+    assert client.post('/authenticate/batch', json={'attempts': 'nope'}).status_code == 400
+    response = client.post('/authenticate/batch', json={'attempts': [{'key_press_times': 'a,b'}]})
+    assert response.get_json()['results'][0]['error'] == 'Invalid key press or release times'
+
+
+def test_batch_follows_the_single_login_settings(make_app, make_session, monkeypatch):
+    rng = np.random.default_rng(1)
+    app = make_app(TRAINING_TRIGGER_SAMPLES=1000, INFERENCE_MODE='cascade', WRITE_BEHIND_ENABLED=True,
+                   WRITE_BEHIND_FLUSH_INTERVAL=600, WRITE_BEHIND_BATCH_SIZE=1000,
+                   CASCADE_STAGES=[{'models': ['logistic_regression'], 'accept': 0.0, 'reject': -1.0}])
+    client = app.test_client()
+    client.post('/register_keystrokes', json=dict(make_session(rng), username='carol', password='pw'))
+    payload = {'userName': 'carol', 'password': 'pw', 'sessions': [make_session(rng) for _ in range(10)]}
+    assert client.post('/enroll/bulk', json=payload).status_code == 200
+    write_behind.flush()
+    with app.app_context():
+        publish_model_set(rng)
+        model_registry.clear()
+        stored = PreprocessedKeystrokeData.query.count()
+
+    hits = user_cache.cache_info()['hits']
+    attempts = [dict(make_session(rng), username='carol', password='pw') for _ in range(2)]
+    results = client.post('/authenticate/batch', json={'attempts': attempts}).get_json()['results']
+    # Cascade mode decides every attempt on its own, the profile comes from the cache
+    assert [result['cascade']['stage'] for result in results] == ['logistic_regression'] * 2
+    assert user_cache.cache_info()['hits'] > hits
+    # The samples wait in the write-behind buffer like those of single logins
+    with app.app_context():
+        assert PreprocessedKeystrokeData.query.count() == stored
+    assert write_behind.flush() == 2
+    with app.app_context():
+        assert PreprocessedKeystrokeData.query.count() == stored + 2
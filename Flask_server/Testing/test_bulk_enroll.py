@@ -0,0 +1,87 @@
+import numpy as np
+from models import Keystroke, PreprocessedKeystrokeData, TrainingJob
+from utils.feature_transform import FEATURE_COLUMNS
+
+# /enroll/bulk must store exactly what the same sessions sent one by one to
+# /train-keystroke would store, in one request and with at most one retrain.
+
+
+def register(client, username, session):
+    response = client.post('/register_keystrokes', json=dict(session, username=username, password='pw'))
+    assert response.status_code in (200, 201), response.get_json()
+
+
+def stored_rows(app, username):
+    with app.app_context():
+        from models import User
+        user_id = User.query.filter_by(username=username).one().id
+        preprocessed = [
+            [getattr(row, column) for column in FEATURE_COLUMNS]
+            for row in PreprocessedKeystrokeData.query.filter_by(user_id=user_id).order_by(PreprocessedKeystrokeData.id)
+        ]
+        keystrokes = [
+            (row.press_press_intervals, row.hold_times, row.press_to_release_ratio_mean)
+            for row in Keystroke.query.filter_by(user_id=user_id).order_by(Keystroke.id)
+        ]
+    return np.array(preprocessed), keystrokes
+
+
+def test_bulk_matches_single_enrollment(make_app, make_session, tmp_path):
+    rng = np.random.default_rng(0)
+    sessions = [make_session(rng) for _ in range(12)]
+
+    # Jobs are only queued by the test apps, nothing is published
+    app = make_app(TRAINING_TRIGGER_SAMPLES=5)
+    client = app.test_client()
+    register(client, 'single', make_session(np.random.default_rng(9)))
+    register(client, 'bulk', make_session(np.random.default_rng(9)))
+
+    for session in sessions:
+        response = client.post('/train-keystroke', json=dict(session, userName='single', password='pw'))
+        assert response.status_code == 200
+    with app.app_context():
+        jobs_before = TrainingJob.query.count()
+
+    response = client.post('/enroll/bulk', json={'userName': 'bulk', 'password': 'pw', 'sessions': sessions})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['stored'] == len(sessions)
+    assert response.get_json()['sample_count'] == len(sessions) + 1  # Plus the registration sample
+
+    # 12 samples with a trigger of 5 schedule at most one retrain
+    with app.app_context():
+        assert TrainingJob.query.count() - jobs_before <= 1
+        assert TrainingJob.query.filter(TrainingJob.status != 'queued').count() == 0
+    assert not (tmp_path / 'models' / 'CURRENT').exists()
+
+    single, single_raw = stored_rows(app, 'single')
+    bulk, bulk_raw = stored_rows(app, 'bulk')
+    # /train-keystroke leaves hold_time_variance at its default, bulk stores it like registration does
+    variance = FEATURE_COLUMNS.index('hold_time_variance')
+    others = [j for j in range(len(FEATURE_COLUMNS)) if j != variance]
+    assert np.allclose(single[:, others], bulk[:, others])
+    assert np.isclose(single[0, variance], bulk[0, variance])
+    assert len(single_raw) == len(bulk_raw) == len(sessions) + 1
+    for (pp_single, hold_single, ratio_single), (pp_bulk, hold_bulk, ratio_bulk) in zip(single_raw, bulk_raw):
+        assert np.allclose(pp_single, pp_bulk)
+        assert np.allclose(hold_single, hold_bulk)
+        assert np.isclose(ratio_single, ratio_bulk)
+    assert np.allclose(bulk[1:, variance], [np.var(hold) for _, hold, _ in bulk_raw[1:]])
+
+
+def test_bulk_is_all_or_nothing(make_app, make_session):
+    rng = np.random.default_rng(1)
+    sessions = [make_session(rng) for _ in range(3)]
+    sessions[1]['key_release_times'] = sessions[1]['key_release_times'][:-1]
+
+    app = make_app()
+    client = app.test_client()
+    register(client, 'bulk', make_session(rng))
+
+    response = client.post('/enroll/bulk', json={'userName': 'bulk', 'password': 'pw', 'sessions': sessions})
+    assert response.status_code == 400
+    assert [error['session'] for error in response.get_json()['sessions']] == [1]
+    assert client.post('/enroll/bulk', json={'userName': 'bulk', 'password': 'no', 'sessions': sessions[:1]}).status_code == 401
+    with app.app_context():
+        # Only the registration sample
+        assert PreprocessedKeystrokeData.query.count() == 1
+        assert Keystroke.query.count() == 1
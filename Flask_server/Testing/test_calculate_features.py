@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from utils.calculate_features import calculate_keystroke_features, calculate_keystroke_features_batch, ragged_mean_var
+
+# The batched features must equal the per-session calculation for ragged lists and
+# padded arrays alike, including one-key sessions that have no intervals.
+
+
+def make_sessions(rng, count=30):
+    sessions = []
+    for keys in rng.integers(1, 40, count):
+        press = np.cumsum(rng.uniform(80, 300, keys))
+        sessions.append((press.tolist(), (press + rng.uniform(40, 150, keys)).tolist()))
+    return sessions
+
+
+def assert_matches_single(batch, sessions):
+    for i, (press, release) in enumerate(sessions):
+        single = calculate_keystroke_features(press, release)
+        for key in ('press_press_intervals', 'release_press_intervals', 'hold_times'):
+            assert np.allclose(batch[key][i], single[key]), (i, key)
+        for key in ('total_typing_time', 'typing_speed_cps', 'press_to_release_ratio_mean'):
+            assert np.isclose(batch[key][i], single[key]), (i, key)
+        for prefix, key in (('press_press_interval', 'press_press_intervals'),
+                            ('release_interval', 'release_press_intervals'), ('hold_time', 'hold_times')):
+            values = single[key] or [0.0]  # Preprocessing stores 0 for a session without intervals
+            assert np.isclose(batch[f'{prefix}_mean'][i], np.mean(values))
+            assert np.isclose(batch[f'{prefix}_variance'][i], np.var(values))
+
+
+def test_ragged_batch_matches_single_sessions():
+    rng = np.random.default_rng(0)
+    sessions = make_sessions(rng)
+    batch = calculate_keystroke_features_batch([s[0] for s in sessions], [s[1] for s in sessions])
+    assert list(batch['lengths']) == [len(s[0]) for s in sessions]
+    assert_matches_single(batch, sessions)
+
+
+def test_padded_batch_matches_single_sessions():
+    rng = np.random.default_rng(1)
+    sessions = make_sessions(rng)
+    lengths = [len(s[0]) for s in sessions]
+    press = np.full((len(sessions), max(lengths)), np.nan)
+    release = np.full_like(press, np.nan)
+    for i, (p, r) in enumerate(sessions):
+        press[i, :len(p)], release[i, :len(r)] = p, r
+    assert_matches_single(calculate_keystroke_features_batch(press, release, lengths=lengths), sessions)
+
+
+def test_invalid_sessions_are_rejected():
+    with pytest.raises(ValueError):
+        calculate_keystroke_features_batch([[1.0, 2.0]], [[1.5]])
+    with pytest.raises(ValueError):
+        calculate_keystroke_features_batch([[]], [[]])
+    with pytest.raises(ValueError):
+        calculate_keystroke_features([1.0, 2.0], [1.5])
+
+
+def test_ragged_mean_var():
+    sequences = [[1.0, 2.0, 4.0], [], [5.0]]
+    means, variances = ragged_mean_var(sequences)
+    assert np.allclose(means, [np.mean(sequences[0]), 0.0, 5.0])
+    assert np.allclose(variances, [np.var(sequences[0]), 0.0, 0.0])
@@ -0,0 +1,50 @@
+import warnings
+import numpy as np
+from utils.ml_utils import build_models
+from utils.compiled_models import compile_model, compile_models
+
+# Parity of the compiled predictors with the sklearn models they were built from
+
+
+def make_data(classes, rng):
+    X = rng.normal(size=(40 * classes, 10)) + np.repeat(np.arange(classes), 40)[:, None] * 0.8
+    y = np.repeat(np.arange(1, classes + 1), 40)
+    return X, y
+
+
+def fitted_models(X, y):
+    models = build_models(forest_jobs=None)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # ConvergenceWarning on the small data set
+        for model in models.values():
+            model.fit(X, y)
+    return models
+
+
+def test_compiled_predictions_match_sklearn():
+    rng = np.random.default_rng(42)
+    for classes in (2, 3, 5):
+        X, y = make_data(classes, rng)
+        models = fitted_models(X, y)
+        X_new = rng.normal(size=(300, 10)) * 2
+        for model_name, model in models.items():
+            predictor = compile_model(model, X.shape[1])
+            assert predictor is not None, model_name
+            assert np.array_equal(predictor.predict(X_new), model.predict(X_new)), (model_name, classes)
+            assert np.array_equal(predictor.predict(X_new[:1]), model.predict(X_new[:1])), (model_name, classes)
+            if hasattr(predictor, 'predict_proba'):
+                assert np.allclose(predictor.predict_proba(X_new), model.predict_proba(X_new)), (model_name, classes)
+
+
+def test_compile_models_keeps_only_matching_predictors():
+    rng = np.random.default_rng(7)
+    X, y = make_data(3, rng)
+    models = fitted_models(X, y)
+    compiled = compile_models(models, X)
+    assert set(compiled) == set(models)
+
+    class Unsupported:
+        def predict(self, X):
+            return np.zeros(len(X))
+
+    assert compile_models({'custom': Unsupported()}, X) == {}
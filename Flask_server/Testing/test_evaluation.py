@@ -0,0 +1,73 @@
+import numpy as np
+from sklearn.metrics import roc_auc_score
+from utils import evaluate_metrics
+from utils.evaluate_metrics import calculate_frr_far, user_error_rates, grid_error_rates
+
+# The vectorized per-user metrics must match the straightforward per-user, per-threshold
+# computation, including tied scores and users split over several column blocks.
+
+
+def brute_force_rates(scores, genuine, threshold):
+    accepted = scores >= threshold
+    return np.mean(accepted[~genuine]), np.mean(~accepted[genuine])  # FAR, FRR
+
+
+def brute_force_eer(scores, genuine):
+    # Walk the distinct thresholds from the top, interpolating where FRR drops below FAR
+    points = [(0.0, 1.0)] + [brute_force_rates(scores, genuine, t) for t in np.unique(scores)[::-1]]
+    for (far0, frr0), (far1, frr1) in zip(points, points[1:]):
+        if frr1 - far1 <= 0:
+            before, after = frr0 - far0, frr1 - far1
+            weight = before / (before - after) if before != after else 0.0
+            return far0 + weight * (far1 - far0)
+
+
+def make_scores(rng, rows=300, users=25):
+    y = rng.integers(0, users + 3, rows)  # Some rows belong to users the model doesn't know
+    scores = rng.random((rows, users))
+    scores[np.arange(rows)[y < users], y[y < users]] += rng.uniform(0, 0.8, np.count_nonzero(y < users))
+    scores = np.round(scores, 2)  # Plenty of ties
+    return scores, y, np.arange(users)
+
+
+def test_user_error_rates_match_brute_force(monkeypatch):
+    rng = np.random.default_rng(0)
+    scores, y, classes = make_scores(rng)
+    monkeypatch.setattr(evaluate_metrics, 'BLOCK_ELEMENTS', 7 * len(y))  # Several blocks
+    rates = user_error_rates(scores, y, classes)
+    for j, user in enumerate(classes):
+        genuine = y == user
+        assert rates['genuine'][j] == genuine.sum()
+        assert np.isclose(rates['auc'][j], roc_auc_score(genuine, scores[:, j]))
+        assert np.isclose(rates['eer'][j], brute_force_eer(scores[:, j], genuine))
+        # At the reported threshold FRR has just dropped to FAR or below
+        far, frr = brute_force_rates(scores[:, j], genuine, rates['eer_threshold'][j])
+        assert frr <= far
+
+    # A user without genuine rows has no EER
+    rates = user_error_rates(scores[:, :2], y, np.array([classes[0], 999]))
+    assert not np.isnan(rates['eer'][0]) and np.isnan(rates['eer'][1]) and rates['genuine'][1] == 0
+
+
+def test_grid_error_rates_match_brute_force(monkeypatch):
+    rng = np.random.default_rng(1)
+    scores, y, classes = make_scores(rng)
+    monkeypatch.setattr(evaluate_metrics, 'BLOCK_ELEMENTS', 5 * len(y))
+    thresholds = np.linspace(0, 1.8, 37)
+    far, frr = grid_error_rates(scores, y, classes, thresholds)
+    assert far.shape == frr.shape == (len(classes), len(thresholds))
+    for j, user in enumerate(classes):
+        for g, threshold in enumerate(thresholds):
+            expected = brute_force_rates(scores[:, j], y == user, threshold)
+            assert np.allclose((far[j, g], frr[j, g]), expected)
+
+
+def test_calculate_frr_far_multiclass():
+    y_true = [1, 1, 2, 2, 3, 3]
+    y_pred = [1, 2, 2, 2, 3, 1]
+    # User 1: one of two rejected, one of four impostors accepted
+    assert calculate_frr_far(y_true, y_pred, positive_class=1) == (0.5, 0.25)
+    frr, far = calculate_frr_far(y_true, y_pred)  # One-vs-rest average
+    assert np.isclose(frr, (0.5 + 0 + 0.5) / 3) and np.isclose(far, (0.25 + 0.25 + 0) / 3)
+    assert calculate_frr_far([0, 1, 1], [0, 1, 0]) == (0.5, 0.0)  # Binary, as before
+    assert calculate_frr_far([3], [3]) == (0.0, 0.0)
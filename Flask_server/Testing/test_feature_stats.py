@@ -0,0 +1,69 @@
+import numpy as np
+from sqlalchemy import text
+from models import db, PreprocessedKeystrokeData
+from utils import feature_stats, write_behind
+from utils.feature_transform import FEATURE_COLUMNS
+
+# The running statistics must match a full recompute after every way rows are stored.
+
+
+def test_running_updates_are_stable(make_app):
+    # Large offset, small spread: the naive sum-of-squares formula loses every digit here
+    rng = np.random.default_rng(0)
+    values = 1e9 + rng.normal(0, 1, size=(500, len(FEATURE_COLUMNS)))
+    app = make_app()
+    with app.app_context():
+        for start in range(0, len(values), 50):
+            for row in values[start:start + 50]:
+                feature_stats.record_samples([dict(user_id=1, **dict(zip(FEATURE_COLUMNS, row)))])
+        db.session.commit()
+        stats = feature_stats.get_user_stats(1)
+    for j, column in enumerate(FEATURE_COLUMNS):
+        assert stats[column]['count'] == len(values)
+        assert np.isclose(stats[column]['mean'], values[:, j].mean(), rtol=1e-12)
+        assert np.isclose(stats[column]['variance'], values[:, j].var(), rtol=1e-6)
+
+
+def test_routes_keep_stats_in_sync(make_app, make_session):
+    rng = np.random.default_rng(1)
+    # The per-user engine, so no trained ensemble is needed; its verifiers go to the tmp models folder
+    app = make_app(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_FLUSH_INTERVAL=60, VERIFICATION_ENGINE='per_user')
+    client = app.test_client()
+    for name in ('alice', 'bob'):
+        response = client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+        assert response.status_code == 200
+        for _ in range(4):
+            assert client.post('/train-keystroke', json=dict(make_session(rng), userName=name, password='pw')).status_code == 200
+        sessions = [make_session(rng) for _ in range(6)]
+        assert client.post('/enroll/bulk', json={'userName': name, 'password': 'pw', 'sessions': sessions}).status_code == 200
+
+    # Buffered login samples count once they are flushed
+    for _ in range(3):
+        client.post('/authenticate', json=dict(make_session(rng), username='alice', password='pw'))
+    write_behind.flush()
+    attempts = [dict(make_session(rng), username=name, password='pw') for name in ('alice', 'bob')]
+    assert client.post('/authenticate/batch', json={'attempts': attempts}).status_code == 200
+    write_behind.flush()  # Batch logins are buffered too
+
+    with app.app_context():
+        assert feature_stats.check() == []
+        counts = {row[0]: row[1] for row in db.session.execute(
+            text("SELECT user_id, COUNT(*) FROM preprocessed_keystroke_data GROUP BY user_id"))}
+        assert counts[1] == 1 + 4 + 6 + 3 + 1
+        assert feature_stats.get_user_stats(1)['typing_speed_cps']['count'] == counts[1]
+
+
+def test_rebuild_after_external_writes(make_app, make_session):
+    rng = np.random.default_rng(2)
+    app = make_app()
+    client = app.test_client()
+    client.post('/register_keystrokes', json=dict(make_session(rng), username='carol', password='pw'))
+    with app.app_context():
+        # Rows written around the app are not counted until a rebuild
+        db.session.execute(PreprocessedKeystrokeData.__table__.insert(), [
+            dict(user_id=1, **{column: float(rng.uniform(1, 100)) for column in FEATURE_COLUMNS}) for _ in range(5)
+        ])
+        db.session.commit()
+        assert {m['feature'] for m in feature_stats.check()} == set(FEATURE_COLUMNS)
+        assert feature_stats.rebuild() == 1
+        assert feature_stats.check() == []
@@ -0,0 +1,97 @@
+import os
+import threading
+import numpy as np
+import pytest
+from sqlalchemy import text
+from models import db, PreprocessedKeystrokeData
+from utils import feature_store
+from utils.feature_transform import FEATURE_COLUMNS
+
+# The cached matrix must always equal the table: appended for new rows, rebuilt after
+# deleted or rewritten rows, and unharmed by an interrupted append.
+
+
+def add_rows(rng, count, user_id=1):
+    db.session.execute(PreprocessedKeystrokeData.__table__.insert(), [
+        dict(user_id=user_id, **{column: float(rng.uniform(1, 500)) for column in FEATURE_COLUMNS}) for _ in range(count)
+    ])
+    db.session.commit()
+
+
+def table_arrays():
+    rows = np.array(db.session.execute(text(
+        f"SELECT id, user_id, {', '.join(FEATURE_COLUMNS)} FROM preprocessed_keystroke_data ORDER BY id"
+    )).all(), dtype=np.float64)
+    return rows[:, 2:].astype(np.float32), rows[:, 1].astype(np.int64), rows[:, 0].astype(np.int64)
+
+
+def assert_in_sync():
+    X, y, row_ids = feature_store.load()
+    X_table, y_table, ids_table = table_arrays()
+    assert np.array_equal(X, X_table) and np.array_equal(y, y_table) and np.array_equal(row_ids, ids_table)
+
+
+def test_append_rebuild_and_torn_writes(make_app):
+    rng = np.random.default_rng(0)
+    app = make_app('store.db')
+    with app.app_context():
+        assert feature_store.sync() == {'rows': 0, 'appended': 0, 'rebuilt': True}
+        add_rows(rng, 50)
+        assert feature_store.sync() == {'rows': 50, 'appended': 50, 'rebuilt': False}
+        assert_in_sync()
+
+        # New rows are appended, nothing changed means only the aggregate queries run
+        add_rows(rng, 7, user_id=2)
+        assert feature_store.sync() == {'rows': 57, 'appended': 7, 'rebuilt': False}
+        assert feature_store.sync()['appended'] == 0
+        assert_in_sync()
+
+        # Only the rows after a watermark
+        X, y, row_ids = feature_store.load(after_row_id=50)
+        assert list(row_ids) == list(range(51, 58)) and set(y) == {2}
+
+        # A deleted row invalidates the cache
+        db.session.execute(text("DELETE FROM preprocessed_keystroke_data WHERE id = 10"))
+        db.session.commit()
+        assert feature_store.sync()['rebuilt']
+        assert_in_sync()
+
+        # So does a row rewritten in place, with the count and max id unchanged
+        db.session.execute(text("UPDATE preprocessed_keystroke_data SET hold_time_mean = hold_time_mean + 1 WHERE id = 20"))
+        db.session.commit()
+        assert feature_store.sync() == {'rows': 56, 'appended': 56, 'rebuilt': True}
+        assert_in_sync()
+        assert not feature_store.sync()['rebuilt']
+
+        # Bytes of an append that crashed before meta.json was replaced are dropped
+        with open(os.path.join(feature_store.store_dir(), 'X.f32'), 'ab') as f:
+            f.write(b'\x00' * 13)
+        add_rows(rng, 3)
+        assert feature_store.sync() == {'rows': 59, 'appended': 3, 'rebuilt': False}
+        assert_in_sync()
+
+
+def test_sync_waits_for_another_process(make_app):
+    fcntl = pytest.importorskip('fcntl')
+    rng = np.random.default_rng(1)
+    app = make_app('locked.db')
+    with app.app_context():
+        add_rows(rng, 5)
+        directory = feature_store.store_dir()
+        os.makedirs(directory, exist_ok=True)
+    results = []
+
+    def sync_in_thread():
+        with app.app_context():
+            results.append(feature_store.sync())
+
+    # A lock taken through its own open file behaves like one held by another process
+    with open(os.path.join(directory, feature_store.LOCK_FILE), 'a+') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        thread = threading.Thread(target=sync_in_thread)
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive() and not results
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    thread.join(10)
+    assert results == [{'rows': 5, 'appended': 5, 'rebuilt': True}]
@@ -0,0 +1,31 @@
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from utils import feature_transform
+from utils.feature_transform import FEATURE_COLUMNS, TRANSFORM_ARTIFACT
+
+# The shared transform stage: one StandardScaler applied the way sklearn applies it, a
+# contiguous float64 matrix for the models, and raw features for older model sets.
+
+
+def test_transform_matches_the_scaler():
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 500, (50, len(FEATURE_COLUMNS)))
+    scaler = StandardScaler().fit(X)
+    rows = rng.uniform(0, 500, (7, len(FEATURE_COLUMNS)))
+    transformed = feature_transform.transform(rows.tolist(), {TRANSFORM_ARTIFACT: scaler})
+    assert np.allclose(transformed, scaler.transform(rows))
+    assert transformed.dtype == np.float64 and transformed.flags['C_CONTIGUOUS']
+    # A single login row comes back as a one-row matrix
+    assert feature_transform.transform(rows[0], {TRANSFORM_ARTIFACT: scaler}).shape == (1, len(FEATURE_COLUMNS))
+
+
+def test_model_sets_without_a_transform_get_raw_features():
+    rows = np.arange(2 * len(FEATURE_COLUMNS), dtype=np.int64).reshape(2, -1)[:, ::-1]  # Not contiguous
+    transformed = feature_transform.transform(rows, {})
+    assert np.array_equal(transformed, rows) and transformed.flags['C_CONTIGUOUS']
+
+
+def test_processed_to_vector_uses_the_training_column_order():
+    processed = {column: float(i) for i, column in enumerate(reversed(FEATURE_COLUMNS))}
+    vector = feature_transform.processed_to_vector(processed)
+    assert vector == [processed[column] for column in FEATURE_COLUMNS]
@@ -0,0 +1,24 @@
+import os
+import sys
+import json
+import subprocess
+from report_startup import FLASK_SERVER_DIR, import_times, total_import_seconds
+
+# Import-time budget: the web app must start without the training stack, which is only
+# imported when a training job or preprocessing run needs it.
+
+IMPORT_TIME_BUDGET_S = float(os.environ.get('IMPORT_TIME_BUDGET_S', '1.5'))
+DEFERRED_MODULES = ['pandas', 'sklearn', 'scipy', 'joblib']
+
+
+def test_app_import_defers_training_stack():
+    code = f"import sys, json, app; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=FLASK_SERVER_DIR, capture_output=True, text=True, check=True)
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == [], f"import app loaded {loaded}"
+
+
+def test_app_import_time_within_budget():
+    # Best of three runs, so a busy machine does not fail the test on its own
+    seconds = min(total_import_seconds(import_times()) for _ in range(3))
+    assert seconds <= IMPORT_TIME_BUDGET_S, f"import app took {seconds:.2f} s, budget {IMPORT_TIME_BUDGET_S} s"
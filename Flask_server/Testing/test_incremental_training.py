@@ -0,0 +1,105 @@
+import warnings
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+from models import db
+from utils import ml_utils, model_registry
+from utils.feature_transform import FEATURE_COLUMNS
+from utils.ml_utils import INCREMENTAL_MODELS, build_models, partial_update_models
+
+# Incremental training: only the new rows are read, every partial_fit model reports its
+# own update time, the compiled copies are checked on the new rows plus a bounded sample
+# of older ones, and the SGD classifier trained for the updates only predicts when
+# SERVE_SGD_CLASSIFIER is set.
+
+
+def enroll(client, make_session, rng, name, sessions):
+    client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+    payload = {'userName': name, 'password': 'pw', 'sessions': [make_session(rng) for _ in range(sessions)]}
+    assert client.post('/enroll/bulk', json=payload).status_code == 200
+
+
+def test_partial_update_times_each_model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 10)) + np.repeat(np.arange(4), 50)[:, None]
+    y = np.repeat(np.arange(1, 5), 50)
+    scaler = StandardScaler().fit(X)
+    models = {name: model for name, model in build_models().items() if name in INCREMENTAL_MODELS}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # ConvergenceWarning on the small data set
+        for model in models.values():
+            model.fit(scaler.transform(X), y)
+        updated = partial_update_models(models, scaler, X[:20], y[:20])
+    assert set(updated) == set(INCREMENTAL_MODELS)
+    for model_name, (model, timing) in updated.items():
+        assert model is not models[model_name]  # The shared instance is left alone
+        assert timing['update_time_s'] >= 0
+    # A user the models have never seen needs a full rebuild
+    assert partial_update_models(models, scaler, X[:1], np.array([99])) is None
+
+
+def test_incremental_update_reads_only_new_rows(make_app, make_session, monkeypatch):
+    rng = np.random.default_rng(1)
+    app = make_app(TRAINING_TRIGGER_SAMPLES=1000)
+    client = app.test_client()
+    for name in ('ann', 'ben', 'cas'):
+        enroll(client, make_session, rng, name, 15)
+
+    with app.app_context():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            ml_utils.train_model()
+        served = model_registry.serving_models(model_registry.get_model_set())
+        assert 'sgd_classifier' not in served and len(served) == len(model_registry.MODEL_NAMES)
+
+    enroll(client, make_session, rng, 'ann', 4)
+    checked = []
+    loaded = []
+    compile_models = ml_utils.compile_models
+    training_arrays = ml_utils.training_arrays
+
+    def recording_compile_models(models, X_check):
+        checked.append(len(X_check))
+        return compile_models(models, X_check)
+
+    def recording_training_arrays(bind, after_row_id=0):
+        arrays = training_arrays(bind, after_row_id=after_row_id)
+        loaded.append(len(arrays[2]))
+        return arrays
+
+    monkeypatch.setattr(ml_utils, 'compile_models', recording_compile_models)
+    monkeypatch.setattr(ml_utils, 'training_arrays', recording_training_arrays)
+    monkeypatch.setattr(ml_utils, 'PARITY_SAMPLE_ROWS', 10)
+    with app.app_context():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = ml_utils.update_models_incrementally()
+        rows = model_registry.get_model_set()['manifest']['training_rows']
+    assert set(results) == set(INCREMENTAL_MODELS)
+    assert all(result['rows'] == 4 for result in results.values())
+    assert rows == 3 * 16 + 4
+    # Only the new rows are loaded; the parity check adds a bounded sample of the older ones
+    assert loaded == [4] and checked == [4 + 10]
+
+
+def test_sample_training_rows(make_app, make_session):
+    rng = np.random.default_rng(2)
+    for feature_store_enabled in (True, False):
+        app = make_app(db_name=f'sample-{feature_store_enabled}.db', FEATURE_STORE_ENABLED=feature_store_enabled,
+                       TRAINING_TRIGGER_SAMPLES=1000)
+        enroll(app.test_client(), make_session, rng, 'dan', 15)
+        with app.app_context():
+            X, _, row_ids = ml_utils.training_arrays(db.engine)
+            sample = ml_utils.sample_training_rows(db.engine, int(row_ids[9]), 5)
+            assert sample.shape == (5, len(FEATURE_COLUMNS))
+            # Every sampled row is one of the first ten
+            first_rows = np.asarray(X[:10], dtype=np.float32)
+            assert all((np.abs(first_rows - row.astype(np.float32)) < 1e-3).all(axis=1).any() for row in sample)
+            assert len(ml_utils.sample_training_rows(db.engine, int(row_ids[9]), 50)) == 10
+
+
+def test_sgd_classifier_served_only_when_enabled(make_app):
+    model_set = {'models': {'logistic_regression': 'lr', 'sgd_classifier': 'sgd'}, 'artifacts': {}}
+    with make_app().app_context():
+        assert model_registry.serving_models(model_set) == {'logistic_regression': 'lr'}
+    with make_app(db_name='sgd.db', SERVE_SGD_CLASSIFIER=True).app_context():
+        assert model_registry.serving_models(model_set, compiled=False) == model_set['models']
@@ -0,0 +1,136 @@
+import time
+import numpy as np
+from config import Config
+from utils import inference, model_registry
+
+# Ensemble inference: a slow model in the thread pool is reported as timed out without
+# holding up the login, and a failing model does not take the others down. Cascade
+# stages go through the same timeouts.
+
+
+class FixedModel:
+    def __init__(self, label, delay=0.0):
+        self.label = label
+        self.delay = delay
+
+    def predict(self, X):
+        time.sleep(self.delay)
+        if self.label is None:
+            raise ValueError('broken model')
+        return np.full(len(X), self.label)
+
+
+def test_thread_pool_times_out_slow_models(make_app):
+    app = make_app(INFERENCE_EXECUTOR='threads', INFERENCE_TIMEOUT=0.2,
+                   INFERENCE_MODEL_TIMEOUTS={'patient': 2.0})
+    models = {
+        'fast': FixedModel(1),
+        'slow': FixedModel(2, delay=1.0),
+        'patient': FixedModel(2, delay=0.5),
+        'broken': FixedModel(None)
+    }
+    X = np.zeros((3, 10))
+    with app.app_context():
+        start = time.perf_counter()
+        results = inference.predict_ensemble(models, X)
+        elapsed = time.perf_counter() - start
+    assert list(results) == list(models)
+    assert list(results['fast']['prediction']) == [1, 1, 1] and not results['fast']['timed_out']
+    assert results['slow']['timed_out'] and results['slow']['prediction'] is None
+    # The per-model override gives this one time to finish
+    assert list(results['patient']['prediction']) == [2, 2, 2]
+    assert results['broken']['error'] == 'broken model' and not results['broken']['timed_out']
+    assert elapsed < 0.9  # Waited for the patient model, not for the slow one
+    assert inference.latency_report(results)['broken'] is None
+
+
+def test_sequential_runs_every_model(make_app):
+    models = {'fast': FixedModel(1), 'slow': FixedModel(2, delay=0.05), 'broken': FixedModel(None)}
+    with make_app().app_context():
+        results = inference.predict_ensemble(models, np.zeros((1, 10)))
+    assert results['slow']['prediction'][0] == 2 and not results['slow']['timed_out']
+    assert results['broken']['error'] == 'broken model'
+
+
+class ProbabilityModel:
+    # Gives the claimed user (user 1) a fixed probability and counts its calls
+    classes_ = np.array([1, 2])
+
+    def __init__(self, probability, delay=0.0):
+        self.probability = probability
+        self.delay = delay
+        self.calls = 0
+
+    def predict_proba(self, X):
+        self.calls += 1
+        time.sleep(self.delay)
+        return np.tile([self.probability, 1 - self.probability], (len(X), 1))
+
+    def predict(self, X):
+        self.calls += 1
+        return np.full(len(X), 1 if self.probability >= 0.5 else 2)
+
+
+STAGES = [
+    {'models': ['cheap'], 'accept': 0.9, 'reject': 0.1},
+    {'models': ['medium', 'missing'], 'accept': 0.8, 'reject': 0.2}
+]
+
+
+def run_cascade(app, models):
+    with app.app_context():
+        return inference.predict_cascade(models, np.zeros((1, 10)), 1)
+
+
+def test_cascade_stops_at_the_first_confident_stage(make_app, monkeypatch, caplog):
+    monkeypatch.setattr(inference, '_unserved_stage_models', set())
+    app = make_app(CASCADE_STAGES=STAGES)
+    models = {'cheap': ProbabilityModel(0.95), 'medium': ProbabilityModel(0.5), 'expensive': ProbabilityModel(0.5)}
+    results, decision = run_cascade(app, models)
+    assert decision['stage'] == 'cheap' and decision['decision'] == 'valid'
+    assert list(results) == ['cheap'] and models['medium'].calls == 0 and models['expensive'].calls == 0
+
+    # Unsure first, then a confident rejection; a stage model that is not served is skipped
+    models = {'cheap': ProbabilityModel(0.5), 'medium': ProbabilityModel(0.05), 'expensive': ProbabilityModel(0.5)}
+    results, decision = run_cascade(app, models)
+    assert decision['stage'] == 'medium' and decision['decision'] == 'intruder'
+    assert list(results) == ['cheap', 'medium'] and models['expensive'].calls == 0
+    assert inference.cascade_stats()['medium'] >= 1
+    # ... and reported once
+    run_cascade(app, models)
+    assert [record.getMessage() for record in caplog.records if 'not served' in record.getMessage()] == [
+        'Cascade stage model missing is not served, the stage runs without it'
+    ]
+
+
+def test_default_stages_only_use_served_models():
+    for stages in (inference.DEFAULT_CASCADE_STAGES, Config.CASCADE_STAGES):
+        names = {name for stage in stages for name in stage['models']}
+        assert names <= set(model_registry.MODEL_NAMES)
+
+
+def test_cascade_stage_models_time_out(make_app):
+    app = make_app(CASCADE_STAGES=STAGES, INFERENCE_EXECUTOR='threads', INFERENCE_TIMEOUT=0.2,
+                   CASCADE_FALLBACK='last_stage')
+    models = {'cheap': ProbabilityModel(0.95, delay=1.0), 'medium': ProbabilityModel(0.05)}
+    start = time.perf_counter()
+    results, decision = run_cascade(app, models)
+    elapsed = time.perf_counter() - start
+    # The slow first stage is cut off and the next stage decides
+    assert results['cheap']['timed_out'] and results['cheap']['prediction'] is None
+    assert decision['stage'] == 'medium' and decision['decision'] == 'intruder'
+    assert elapsed < 0.9
+
+
+def test_cascade_fallbacks(make_app):
+    models = {'cheap': ProbabilityModel(0.5), 'medium': ProbabilityModel(0.6), 'expensive': ProbabilityModel(0.3)}
+    results, decision = run_cascade(make_app(CASCADE_STAGES=STAGES), models)
+    # Nobody is sure: every remaining model runs, the results keep the model order
+    assert decision['stage'] == 'full_ensemble' and list(results) == list(models)
+    assert models['expensive'].calls == 1 and results['expensive']['prediction'][0] == 2
+
+    models = {'cheap': ProbabilityModel(0.5), 'medium': ProbabilityModel(0.6), 'expensive': ProbabilityModel(0.3)}
+    app = make_app(db_name='last.db', CASCADE_STAGES=STAGES, CASCADE_FALLBACK='last_stage')
+    results, decision = run_cascade(app, models)
+    assert decision == {'stage': 'last_stage', 'decision': 'valid', 'probability': 0.6}
+    assert models['expensive'].calls == 0
@@ -0,0 +1,94 @@
+import os
+import warnings
+import joblib
+import numpy as np
+from utils import model_registry, model_store
+
+# The registry loads the active version once per process, swaps in a version published
+# by another process as a whole, and keeps serving what it has if the new one is broken.
+# Legacy models that cannot be loaded are skipped one by one.
+
+
+def publish(value):
+    # Any picklable object works as a model for the registry
+    return model_store.publish_version({'model': {'weights': np.full(4, value)}}, {'training_rows': value})
+
+
+def test_registry_loads_once_and_hot_swaps(make_app, monkeypatch):
+    monkeypatch.setattr(model_registry, 'RELOAD_CHECK_INTERVAL', 0.0)
+    with make_app().app_context():
+        first = publish(1)
+        model_set = model_registry.get_model_set()
+        assert model_set['version'] == first
+        assert model_registry.get_model_set() is model_set  # No reload while CURRENT is unchanged
+        assert model_registry.get_model('model')['weights'][0] == 1
+
+        # A version published elsewhere (no activate() in this process) is picked up
+        second = publish(2)
+        swapped = model_registry.get_model_set()
+        assert swapped['version'] == second and swapped['models']['model']['weights'][0] == 2
+        # A request holding the old snapshot still sees one consistent set
+        assert model_set['version'] == first and model_set['models']['model']['weights'][0] == 1
+
+        model_store.rollback()
+        assert model_registry.get_model_set()['version'] == first
+        assert model_registry.model_info()['version'] == first
+
+
+def test_broken_version_keeps_the_loaded_one(make_app, monkeypatch):
+    monkeypatch.setattr(model_registry, 'RELOAD_CHECK_INTERVAL', 0.0)
+    with make_app().app_context():
+        first = publish(1)
+        assert model_registry.get_model_set()['version'] == first
+        second = publish(2)
+        with open(os.path.join(model_store.version_dir(second), 'model.joblib'), 'wb') as f:
+            f.write(b'not a pickle')
+        assert model_registry.get_model_set()['version'] == first
+
+
+def test_activate_skips_the_reload(make_app, monkeypatch):
+    monkeypatch.setattr(model_registry, 'RELOAD_CHECK_INTERVAL', 0.0)
+    with make_app().app_context():
+        models = {'model': {'weights': np.zeros(4)}}
+        version = model_store.publish_version(models, {})
+        model_registry.activate(version, models)
+        model_set = model_registry.get_model_set()
+        assert model_set['models']['model'] is models['model']  # The trained instance, not a copy from disk
+        assert model_set['info']['model']['load_time_ms'] == 0.0
+
+
+def test_artifacts_are_memory_mapped(make_app):
+    weights = np.arange(100000, dtype=np.float64)
+    with make_app().app_context():
+        model_store.publish_version({'model': {'weights': weights}}, {})
+        model_set = model_registry.get_model_set()
+        loaded = model_set['models']['model']['weights']
+        assert isinstance(loaded, np.memmap) and not loaded.flags['WRITEABLE']
+        assert np.array_equal(loaded, weights)
+        assert model_set['info']['model']['mapped_bytes'] == weights.nbytes
+
+    # MODEL_MMAP_MODE None loads private copies
+    model_registry.clear()
+    with make_app(db_name='private.db', MODEL_MMAP_MODE=None).app_context():
+        model_store.publish_version({'model': {'weights': weights}}, {})
+        model_set = model_registry.get_model_set()
+        assert not isinstance(model_set['models']['model']['weights'], np.memmap)
+        assert model_set['info']['model']['mapped_bytes'] == 0
+
+
+def test_legacy_models_load_one_by_one(make_app):
+    with make_app().app_context():
+        os.makedirs(model_store.models_dir(), exist_ok=True)
+        # A compressed artifact, one that cannot be unpickled, the rest missing
+        weights = np.arange(1000, dtype=np.float64)
+        joblib.dump({'weights': weights}, os.path.join(model_store.models_dir(), 'logistic_regression.joblib'), compress=3)
+        with open(os.path.join(model_store.models_dir(), 'random_forest.joblib'), 'wb') as f:
+            f.write(b'not a pickle')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # No mmap warning for the compressed file
+            model_set = model_registry.get_model_set()
+        assert model_set['version'] == model_registry.LEGACY_VERSION
+        assert list(model_set['models']) == ['logistic_regression']
+        assert not isinstance(model_set['models']['logistic_regression']['weights'], np.memmap)
+        assert set(model_set['failed']) == set(model_registry.MODEL_NAMES) - {'logistic_regression'}
+        assert set(model_registry.model_info()['failed']) == set(model_set['failed'])
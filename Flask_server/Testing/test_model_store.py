@@ -0,0 +1,107 @@
+import os
+import time
+import pytest
+from routes.auth import generate_token
+from utils import ml_utils, model_store
+from utils.watermarks import get_watermark, set_watermark
+
+# Versioned publishing: each publish becomes the active version, older ones stay for
+# rollback up to the retention count, and a killed publish does not leave its
+# temporary directory behind forever. Rolling back through the admin-only route also
+# moves the training watermark back.
+
+
+def publish(value, keep=3):
+    return model_store.publish_version({'model': {'value': value}}, {'training_rows': value}, keep=keep)
+
+
+def test_publish_and_rollback(make_app):
+    with make_app().app_context():
+        assert model_store.current_version() is None
+        with pytest.raises(ValueError):
+            model_store.rollback()
+        first = publish(1)
+        second = publish(2)
+        assert model_store.current_version() == second and model_store.list_versions() == [first, second]
+        assert model_store.read_manifest(second)['training_rows'] == 2
+        assert os.path.isfile(os.path.join(model_store.version_dir(second), 'model.joblib'))
+
+        assert model_store.rollback() == first
+        assert model_store.current_version() == first
+        with pytest.raises(ValueError):
+            model_store.set_current('missing')
+        model_store.set_current(second)
+
+
+def test_prune_keeps_the_active_version(make_app):
+    with make_app().app_context():
+        versions = [publish(value, keep=2) for value in range(4)]
+        assert model_store.list_versions() == versions[-2:]
+        # The active version survives even when it is the oldest
+        versions = [publish(value, keep=10) for value in range(4, 7)]
+        model_store.set_current(versions[0])
+        model_store.prune_versions(keep=2)
+        assert model_store.list_versions() == versions
+
+
+def test_prune_removes_abandoned_publishes(make_app):
+    with make_app().app_context():
+        publish(1)
+        abandoned = os.path.join(model_store.versions_dir(), '.tmp-20000101T000000000000Z')
+        in_progress = os.path.join(model_store.versions_dir(), '.tmp-29990101T000000000000Z')
+        for path in (abandoned, in_progress):
+            os.makedirs(path)
+            with open(os.path.join(path, 'model.joblib'), 'w') as f:
+                f.write('partial')
+        old = time.time() - model_store.TMP_GRACE_SECONDS - 60
+        os.utime(abandoned, (old, old))
+
+        model_store.prune_versions()
+        assert not os.path.exists(abandoned)
+        assert os.path.exists(in_progress)  # Possibly still being written
+        assert len(model_store.list_versions()) == 1
+
+
+def test_size_budget(make_app):
+    files = {
+        'big': {'file': 'big.joblib', 'size_bytes': 3 * 1024 * 1024},
+        'small': {'file': 'small.joblib', 'size_bytes': 1024}
+    }
+    assert model_store.check_size_budget(files, None) is None
+    assert model_store.check_size_budget(files, 4) is None
+    assert 'big 3.0 MB' in model_store.check_size_budget(files, 1)
+    with pytest.raises(ValueError):
+        model_store.check_size_budget(files, 1, action='fail')
+
+    with make_app().app_context():
+        first = publish(1)
+        large = {'model': bytes(2 * 1024 * 1024)}
+        with pytest.raises(ValueError):
+            model_store.publish_version(large, {}, size_budget_mb=1, size_budget_action='fail')
+        # Nothing published and nothing left behind
+        assert model_store.current_version() == first and model_store.list_versions() == [first]
+        assert os.listdir(model_store.versions_dir()) == [first]
+
+        version = model_store.publish_version(large, {}, size_budget_mb=1)
+        manifest = model_store.read_manifest(version)
+        assert manifest['size_budget_warning'] and manifest['size_bytes'] > 2 * 1024 * 1024
+
+
+def test_rollback_route_restores_the_watermark(make_app):
+    app = make_app(ADMIN_USERS=['root'])
+    client = app.test_client()
+    with app.app_context():
+        first = model_store.publish_version({'model': {'value': 1}}, {'watermark': 5})
+        model_store.publish_version({'model': {'value': 2}}, {'watermark': 9})
+        set_watermark(ml_utils.TRAINING_WATERMARK, 9)
+        tokens = {name: generate_token(name) for name in ('eve', 'root')}
+
+    assert client.post('/models/rollback').status_code == 401
+    assert client.post('/models/rollback', headers={'Authorization': 'Bearer nonsense'}).status_code == 401
+    assert client.post('/models/rollback', headers={'Authorization': f"Bearer {tokens['eve']}"}).status_code == 403
+    response = client.post('/models/rollback', headers={'Authorization': f"Bearer {tokens['root']}"})
+    assert response.status_code == 200 and response.get_json()['version'] == first
+    with app.app_context():
+        assert model_store.current_version() == first
+        # The next incremental update starts after the rows the restored version has seen
+        assert get_watermark(ml_utils.TRAINING_WATERMARK) == 5
@@ -0,0 +1,64 @@
+import warnings
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from utils import ml_utils, model_registry
+
+# TRAINING_PARALLEL: the models are fitted in a spawned process pool (pytest's entry
+# point has the __main__ guard the workers need), and a pool that breaks falls back to
+# fitting them one by one. Peak memory is only traced with TRAINING_MEASURE_MEMORY.
+
+
+def enrolled_app(make_app, make_session, rng, **config):
+    app = make_app(TRAINING_TRIGGER_SAMPLES=1000, TRAINING_PARALLEL=True, TRAINING_WORKERS=2, **config)
+    client = app.test_client()
+    for name in ('ida', 'jon'):
+        client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+        payload = {'userName': name, 'password': 'pw', 'sessions': [make_session(rng) for _ in range(15)]}
+        assert client.post('/enroll/bulk', json=payload).status_code == 200
+    return app
+
+
+def train(app):
+    with app.app_context():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # ConvergenceWarning on the small data set
+            results = ml_utils.train_model()
+        return results, model_registry.get_model_set()
+
+
+def test_parallel_training_publishes_every_model(make_app, make_session):
+    app = enrolled_app(make_app, make_session, np.random.default_rng(0))
+    results, model_set = train(app)
+    assert set(results) == set(ml_utils.build_models())
+    assert all(result['fit_time_s'] > 0 for result in results.values())
+    assert set(model_set['manifest']['models']) == {model_registry.model_file_name(name) for name in results}
+
+
+def test_broken_pool_falls_back_to_serial_fitting(make_app, make_session, monkeypatch):
+    app = enrolled_app(make_app, make_session, np.random.default_rng(1))
+
+    def broken_pool(*args):
+        raise BrokenProcessPool('A child process terminated abruptly')
+
+    monkeypatch.setattr(ml_utils, '_fit_models_parallel', broken_pool)
+    results, model_set = train(app)
+    assert set(results) == set(ml_utils.build_models())
+    assert model_set['manifest']['training_mode'] == 'full'
+
+
+def test_peak_memory_only_when_asked(make_app, make_session, monkeypatch):
+    app = enrolled_app(make_app, make_session, np.random.default_rng(2))
+    app.config['TRAINING_PARALLEL'] = False  # Serial fits run in this process
+
+    def no_tracing():
+        raise AssertionError('tracemalloc started without TRAINING_MEASURE_MEMORY')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ml_utils.tracemalloc, 'start', no_tracing)
+        results, _ = train(app)
+    assert all(result['peak_memory_mb'] is None for result in results.values())
+
+    app.config['TRAINING_MEASURE_MEMORY'] = True
+    results, _ = train(app)
+    assert all(result['peak_memory_mb'] > 0 for result in results.values())
+    assert not ml_utils.tracemalloc.is_tracing()
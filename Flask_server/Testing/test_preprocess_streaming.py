@@ -0,0 +1,101 @@
+import json
+import numpy as np
+from models import db, Keystroke, PreprocessedKeystrokeData
+from utils import feature_stats
+from utils import preprocess_keystrokes
+from utils.calculate_features import calculate_keystroke_features
+from utils.preprocess_keystrokes import preprocess_keystroke_data, process_single_keystroke_data, PREPROCESS_WATERMARK
+from utils.watermarks import get_watermark, set_watermark
+
+# Streaming preprocessing: only keystrokes past the watermark, chunk by chunk, never twice.
+
+
+def add_raw_keystrokes(make_session, rng, user_id, count):
+    # Keystrokes stored without a sample, e.g. imported from another system
+    expected = []
+    for _ in range(count):
+        session = make_session(rng)
+        features = calculate_keystroke_features(session['key_press_times'], session['key_release_times'])
+        keystroke = Keystroke(
+            user_id=user_id,
+            press_press_intervals=json.dumps(features['press_press_intervals']),
+            release_press_intervals=json.dumps(features['release_press_intervals']),
+            hold_times=json.dumps(features['hold_times']),
+            total_typing_time=features['total_typing_time'],
+            typing_speed=features['typing_speed_cps'],
+            backspace_count=1,
+            error_rate=0.02,
+            press_to_release_ratio_mean=features['press_to_release_ratio_mean']
+        )
+        db.session.add(keystroke)
+        expected.append(process_single_keystroke_data(
+            user_id, features['press_press_intervals'], features['release_press_intervals'], features['hold_times'],
+            features['total_typing_time'], features['typing_speed_cps'], 1, 0.02
+        ))
+    db.session.commit()
+    return expected
+
+
+def test_streaming_preprocessing(monkeypatch, make_app, make_session):
+    rng = np.random.default_rng(0)
+    app = make_app()
+    client = app.test_client()
+    client.post('/register_keystrokes', json=dict(make_session(rng), username='dave', password='pw'))
+
+    with app.app_context():
+        # The registration keystroke already has its sample
+        assert preprocess_keystroke_data(chunk_size=10)['inserted'] == 0
+        expected = add_raw_keystrokes(make_session, rng, 1, 25)
+
+        # A failure in the second chunk keeps the first one, the rerun continues after it
+        calls = {'n': 0}
+        record = feature_stats.record_samples
+
+        def failing_record(rows, bind=None):
+            calls['n'] += 1
+            if calls['n'] == 2:
+                raise RuntimeError('simulated crash')
+            record(rows, bind)
+
+        monkeypatch.setattr(preprocess_keystrokes.feature_stats, 'record_samples', failing_record)
+        try:
+            preprocess_keystroke_data(chunk_size=10)
+            assert False, 'expected the simulated crash'
+        except RuntimeError:
+            pass
+        assert PreprocessedKeystrokeData.query.count() == 1 + 10
+        monkeypatch.setattr(preprocess_keystrokes.feature_stats, 'record_samples', record)
+
+        summary = preprocess_keystroke_data(chunk_size=10)
+        assert summary['inserted'] == 15 and summary['chunks'] == 2
+        assert summary['watermark'] == 26
+
+        # Nothing new, and even a reset watermark does not store anything twice
+        assert preprocess_keystroke_data(chunk_size=10)['read'] == 0
+        set_watermark(PREPROCESS_WATERMARK, 0)
+        summary = preprocess_keystroke_data(chunk_size=7)
+        assert summary['inserted'] == 0 and summary['already_preprocessed'] == 26
+        assert get_watermark(PREPROCESS_WATERMARK) == 26
+
+        # Same values as the per-row preprocessing of the routes
+        rows = PreprocessedKeystrokeData.query.filter(PreprocessedKeystrokeData.keystroke_id > 1) \
+            .order_by(PreprocessedKeystrokeData.keystroke_id).all()
+        assert len(rows) == 25
+        for row, want in zip(rows, expected):
+            for column in ('press_press_interval_mean', 'press_press_interval_variance', 'release_interval_mean',
+                           'release_interval_variance', 'hold_time_mean', 'hold_time_variance',
+                           'total_typing_time', 'typing_speed_cps'):
+                assert np.isclose(getattr(row, column), want[column]), column
+        assert feature_stats.check() == []
+
+
+def test_invalid_rows_are_skipped(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Keystroke(user_id=1, press_press_intervals='not json', hold_times='[1, 2]'))
+        db.session.add(Keystroke(user_id=1, press_press_intervals='[100, 120]', hold_times='[80, 90, 85]'))
+        db.session.commit()
+        summary = preprocess_keystroke_data()
+        assert (summary['invalid'], summary['inserted'], summary['watermark']) == (1, 1, 2)
+        sample = PreprocessedKeystrokeData.query.one()
+        assert (sample.press_press_interval_mean, sample.release_interval_mean) == (110.0, 0.0)
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event, func
+from app import create_app
+from models import db, User, Keystroke, PreprocessedKeystrokeData
+from utils.db_migrations import migrate, schema_version, LATEST_VERSION
+from utils.ml_utils import load_training_data
+
+# The hot queries must be answered from an index, not by scanning the tables. The SQL
+# the app really emits is captured and run through EXPLAIN QUERY PLAN.
+
+FEATURES = dict(
+    press_press_interval_mean=200.0, release_interval_mean=100.0, hold_time_mean=90.0,
+    press_press_interval_variance=10.0, release_interval_variance=12.0, hold_time_variance=5.0,
+    backspace_count=1, error_rate=0.01, total_typing_time=2400.0, typing_speed_cps=5.0
+)
+
+
+def make_app(db_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+    with app.app_context():
+        for i in range(3):
+            user = User(username=f'user{i}', password='x')
+            db.session.add(user)
+            db.session.flush()
+            for _ in range(5):
+                db.session.add(PreprocessedKeystrokeData(user_id=user.id, **FEATURES))
+                db.session.add(Keystroke(user_id=user.id, total_typing_time=2400.0))
+        db.session.commit()
+    return app
+
+
+def captured_plans(app, db_path, run):
+    # Run a query through the app's engine and return the plan of every statement it sent
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            run()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return [
+            ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {statement}', parameters))
+            for statement, parameters in statements if statement.lstrip().upper().startswith('SELECT')
+        ]
+    finally:
+        conn.close()
+
+
+def test_hot_queries_use_indexes():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'plans.db')
+        app = make_app(db_path)
+
+        # /authenticate: samples of the user
+        plans = captured_plans(app, db_path, lambda: PreprocessedKeystrokeData.query.filter_by(user_id=1).count())
+        assert any('ix_preprocessed_keystroke_data_user_created' in plan for plan in plans), plans
+
+        # /authenticate/batch: grouped sample counts of the users in the batch
+        plans = captured_plans(app, db_path, lambda: (
+            db.session.query(PreprocessedKeystrokeData.user_id, func.count())
+            .filter(PreprocessedKeystrokeData.user_id.in_({1, 2}))
+            .group_by(PreprocessedKeystrokeData.user_id).all()
+        ))
+        assert any('ix_preprocessed_keystroke_data_user_created' in plan for plan in plans), plans
+        assert not any('TEMP B-TREE' in plan for plan in plans), plans
+
+        # Incremental training: rows after the watermark
+        plans = captured_plans(app, db_path, lambda: load_training_data(db.engine, after_row_id=10))
+        assert any('INTEGER PRIMARY KEY' in plan for plan in plans), plans
+
+        # Raw keystrokes of a user
+        plans = captured_plans(app, db_path, lambda: Keystroke.query.filter_by(user_id=2).all())
+        assert any('ix_keystrokes_user_id' in plan for plan in plans), plans
+
+
+def test_migration_of_legacy_schema():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'legacy.db')
+        conn = sqlite3.connect(db_path)
+        # The schema of instance/keystroke_dynamics.db before the surrogate key
+        conn.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, password TEXT NOT NULL);
+            CREATE TABLE keystrokes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                press_press_intervals TEXT, release_press_intervals TEXT, total_typing_time REAL, typing_speed REAL,
+                backspace_count INTEGER DEFAULT 0, error_rate REAL DEFAULT 0.0, press_to_release_ratio_mean REAL,
+                hold_times TEXT, FOREIGN KEY (user_id) REFERENCES users(id));
+            CREATE TABLE preprocessed_keystroke_data (user_id INTEGER NOT NULL, press_press_interval_mean REAL NOT NULL,
+                release_interval_mean REAL NOT NULL, hold_time_mean REAL NOT NULL, press_press_interval_variance REAL NOT NULL,
+                backspace_count INTEGER NOT NULL, error_rate REAL NOT NULL, total_typing_time REAL NOT NULL DEFAULT 0.0,
+                typing_speed_cps REAL NOT NULL DEFAULT 0.0, hold_time_variance REAL NOT NULL DEFAULT 0.0,
+                release_interval_variance REAL NOT NULL DEFAULT 0.0, FOREIGN KEY (user_id) REFERENCES users(id));
+        """)
+        conn.execute("INSERT INTO users (username, password) VALUES ('legacy', 'x')")
+        for speed in (4.0, 5.0, 6.0):
+            conn.execute(
+                "INSERT INTO preprocessed_keystroke_data (user_id, press_press_interval_mean, release_interval_mean, "
+                "hold_time_mean, press_press_interval_variance, backspace_count, error_rate, typing_speed_cps) "
+                "VALUES (1, 200, 100, 90, 10, 1, 0.01, ?)", (speed,)
+            )
+        conn.execute("DELETE FROM preprocessed_keystroke_data WHERE typing_speed_cps = 5.0")
+        before = conn.execute("SELECT rowid, typing_speed_cps FROM preprocessed_keystroke_data ORDER BY rowid").fetchall()
+        conn.commit()
+        conn.close()
+
+        assert migrate(db_path) == ['preprocessed_surrogate_key', 'user_feature_stats', 'preprocessed_keystroke_link',
+                                    'training_job_heartbeat']
+        assert migrate(db_path) == []
+
+        conn = sqlite3.connect(db_path)
+        assert schema_version(conn) == LATEST_VERSION
+        # Row ids survive as sample ids, so training watermarks stay valid
+        assert conn.execute("SELECT id, typing_speed_cps FROM preprocessed_keystroke_data ORDER BY id").fetchall() == before
+        conn.close()
+
+        # The app can insert into the migrated table, new ids continue after the old ones
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'})
+        with app.app_context():
+            entry = PreprocessedKeystrokeData(user_id=1, **FEATURES)
+            db.session.add(entry)
+            db.session.commit()
+            assert entry.id > before[-1][0]
+            assert entry.created_at is not None
@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from sqlalchemy import text
+from models import db
+from utils import sqlite_tuning, db_migrations
+
+# Every pooled connection gets SQLITE_PRAGMAS; in WAL mode a reader in the middle of a
+# transaction does not block a writer. Migrations apply atomically or not at all.
+
+
+def test_pragmas_on_every_connection(make_app):
+    app = make_app()
+    with app.app_context():
+        pragmas = sqlite_tuning.current_pragmas()
+        assert pragmas['journal_mode'] == 'wal' and pragmas['busy_timeout'] == 5000
+        assert pragmas['synchronous'] == 1  # NORMAL
+        # A second connection checked out at the same time is tuned as well
+        with db.engine.connect() as first, db.engine.connect() as second:
+            assert first.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+            assert second.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+
+    app = make_app(db_name='plain.db', SQLITE_PRAGMAS={'busy_timeout': 1234})
+    with app.app_context():
+        pragmas = sqlite_tuning.current_pragmas(['busy_timeout', 'journal_mode'])
+    assert pragmas == {'busy_timeout': 1234, 'journal_mode': 'delete'}
+
+
+def test_reader_does_not_block_writer(make_app):
+    app = make_app()
+    with app.app_context():
+        with db.engine.connect() as reader:
+            reader.exec_driver_sql("BEGIN")
+            assert reader.execute(text("SELECT COUNT(*) FROM users")).scalar() == 0
+            with db.engine.begin() as writer:
+                writer.execute(text("INSERT INTO users (username, password) VALUES ('kim', 'x')"))
+            # The reader keeps its snapshot until its transaction ends
+            assert reader.execute(text("SELECT COUNT(*) FROM users")).scalar() == 0
+            reader.exec_driver_sql("COMMIT")
+            assert reader.execute(text("SELECT COUNT(*) FROM users")).scalar() == 1
+
+
+def test_failed_migration_rolls_back(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'migrate.db')
+    sqlite3.connect(db_path).close()
+    assert db_migrations.migrate(db_path, dry_run=True) == [name for _, name, _ in db_migrations.MIGRATIONS]
+
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(db_migrations, 'MIGRATIONS', db_migrations.MIGRATIONS + [(99, 'broken', broken)])
+    with pytest.raises(RuntimeError):
+        db_migrations.migrate(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        # Neither the earlier migrations of the run nor the broken one were kept
+        assert db_migrations.schema_version(conn) == 0
+        assert not db_migrations._table_exists(conn, 'half_done')
+    finally:
+        conn.close()
@@ -0,0 +1,62 @@
+import json
+import sqlite3
+import numpy as np
+from sqlalchemy import text
+from models import db, Keystroke, PreprocessedKeystrokeData
+from utils.timing_codec import encode_timings, decode_timings, store_timings, convert_keystrokes
+from utils.preprocess_keystrokes import preprocess_keystroke_data, PREPROCESS_WATERMARK
+from utils.watermarks import set_watermark
+
+
+def test_round_trip():
+    values = [123.25, 98.5, 250.125, 77.0]
+    blob = encode_timings(values)
+    assert len(blob) == 4 + 4 * len(values)
+    decoded = decode_timings(blob)
+    assert decoded.dtype == np.float32 and not decoded.flags.writeable  # A view of the blob
+    assert np.array_equal(decoded, values)
+    assert np.array_equal(decode_timings(json.dumps(values)), values)
+    assert len(decode_timings(encode_timings([]))) == 0
+    assert len(decode_timings(None)) == 0
+    try:
+        decode_timings(blob[:-2])
+        assert False, 'expected a length error'
+    except ValueError:
+        pass
+
+
+def test_float32_rows_convert_and_preprocess(make_app, make_session, tmp_path):
+    db_path = str(tmp_path / 'timings.db')
+    app = make_app('timings.db', KEYSTROKE_TIMING_FORMAT='float32')
+    client = app.test_client()
+    session = make_session(np.random.default_rng(0), keys=15)
+    press, release = np.array(session['key_press_times']), np.array(session['key_release_times'])
+    response = client.post('/register_keystrokes', json=dict(session, username='erin', password='pw'))
+    assert response.status_code == 200
+
+    with app.app_context():
+        keystroke = Keystroke.query.one()
+        assert np.allclose(keystroke.hold_times, release - press)  # Decoded by the column type
+        assert db.session.execute(text("SELECT typeof(hold_times) FROM keystrokes")).scalar() == 'blob'
+
+    # Mixed formats: add a JSON row, convert everything to float32 and back
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO keystrokes (user_id, press_press_intervals, release_press_intervals, hold_times) "
+                 "VALUES (1, ?, ?, ?)", (store_timings([100.0, 120.0], 'json'), store_timings([20.0, 30.0], 'json'),
+                                          store_timings([80.0, 90.0, 85.0], 'json')))
+    conn.commit()
+    conn.close()
+    assert convert_keystrokes(db_path, 'float32') == 1
+    assert convert_keystrokes(db_path, 'float32') == 0
+    assert convert_keystrokes(db_path, 'json') == 2
+
+    with app.app_context():
+        # The model reads the JSON text too
+        assert list(db.session.get(Keystroke, 2).hold_times) == [80.0, 90.0, 85.0]
+        # The preprocessing reads both formats
+        assert convert_keystrokes(db_path, 'float32', chunk_size=1) == 2
+        set_watermark(PREPROCESS_WATERMARK, 0)
+        summary = preprocess_keystroke_data()
+        assert (summary['inserted'], summary['already_preprocessed']) == (1, 1)
+        sample = PreprocessedKeystrokeData.query.filter_by(keystroke_id=2).one()
+        assert (sample.press_press_interval_mean, sample.hold_time_mean) == (110.0, 85.0)
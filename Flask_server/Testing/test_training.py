@@ -1,3 +1,4 @@
+import time
 import requests
 
 def test_train_model():
@@ -8,10 +9,18 @@ def test_train_model():
         # Send a POST request to the /train_model route
         response = requests.post(url)
 
-        # Check the response status code
-        if response.status_code == 200:
-            print("Test passed: Model trained successfully")
-            print("Response:", response.json())  # Print the response from the server
+        # The route queues a background job (202) and returns its id to poll
+        if response.status_code == 202:
+            job_id = response.json()['job_id']
+            job = response.json()
+            while job['status'] in ('queued', 'running'):
+                time.sleep(1)
+                job = requests.get(f"{url}/{job_id}").json()
+            if job['status'] == 'succeeded':
+                print("Test passed: Model trained successfully")
+            else:
+                print(f"Test failed: Training job {job['status']}")
+            print("Response:", job)  # Print the finished job
         else:
             print(f"Test failed: Received HTTP status code {response.status_code}")
             print("Response:", response.json())  # Print the response for further details
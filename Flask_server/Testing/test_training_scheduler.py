@@ -0,0 +1,112 @@
+import time
+import numpy as np
+from sqlalchemy import event, text
+from models import db, TrainingJob, TrainingState
+from utils import training_scheduler
+
+# The scheduler's guarantees: requests coalesce into the queued job, one job runs at a
+# time, failures and dead workers (but not long live jobs) end up as failed jobs, and a
+# stored sample is counted in the same commit that stores it.
+
+
+def test_requests_coalesce_into_the_queued_job(make_app):
+    app = make_app()
+    with app.app_context():
+        first, coalesced = training_scheduler.request_training()
+        assert not coalesced and first['status'] == 'queued'
+        second, coalesced = training_scheduler.request_training()
+        assert coalesced and second['job_id'] == first['job_id'] and second['requests'] == 2
+        assert TrainingJob.query.count() == 1
+
+
+def test_one_job_runs_at_a_time(make_app):
+    app = make_app()
+    with app.app_context():
+        first, _ = training_scheduler.request_training()
+        assert training_scheduler._claim_next_job() == first['job_id']
+        # The next request queues a new job, which waits for the running one
+        second, coalesced = training_scheduler.request_training()
+        assert not coalesced
+        assert training_scheduler._claim_next_job() is None
+        training_scheduler._finish_job(first['job_id'], 'succeeded')
+        assert training_scheduler._claim_next_job() == second['job_id']
+        # A job another worker already claimed cannot be claimed again
+        assert training_scheduler._claim_next_job() is None
+
+
+def test_failed_and_stale_jobs(make_app, monkeypatch):
+    app = make_app(TRAINING_JOB_TIMEOUT=60)
+    with app.app_context():
+        def failing_training():
+            raise RuntimeError('no training data')
+
+        from utils import ml_utils
+        monkeypatch.setattr(ml_utils, 'run_training', failing_training)
+        job, _ = training_scheduler.request_training()
+        assert training_scheduler._run_one_job()
+        job = training_scheduler.get_job(job['job_id'])
+        assert job['status'] == 'failed' and job['error'] == 'no training data'
+
+        monkeypatch.setattr(ml_utils, 'run_training', lambda: {})
+        job, _ = training_scheduler.request_training()
+        assert training_scheduler._run_one_job()
+        assert training_scheduler.get_job(job['job_id'])['status'] == 'succeeded'
+        assert not training_scheduler._run_one_job()  # Queue drained
+
+        # A long job with a fresh heartbeat keeps running and blocks the queue
+        db.session.add(TrainingJob(id='busy', status='running', reason='manual', requests=1,
+                                   created_at=time.time() - 120, started_at=time.time() - 120,
+                                   heartbeat_at=time.time() - 10))
+        db.session.commit()
+        job, _ = training_scheduler.request_training()
+        assert training_scheduler._claim_next_job() is None
+        assert training_scheduler.get_job('busy')['status'] == 'running'
+
+        # Once its heartbeat is older than the timeout, its process is taken for dead
+        db.session.execute(text("UPDATE training_jobs SET heartbeat_at = :stale WHERE id = 'busy'"),
+                           {'stale': time.time() - 120})
+        db.session.commit()
+        assert training_scheduler._claim_next_job() == job['job_id']
+        assert training_scheduler.get_job('busy')['error'] == 'Timed out'
+
+
+def test_running_job_refreshes_its_heartbeat(make_app, monkeypatch):
+    app = make_app(TRAINING_JOB_HEARTBEAT=0.05)
+    with app.app_context():
+        heartbeats = []
+
+        def slow_training():
+            time.sleep(0.3)
+            heartbeats.append(db.session.execute(
+                text("SELECT started_at, heartbeat_at FROM training_jobs WHERE status = 'running'")
+            ).one())
+
+        from utils import ml_utils
+        monkeypatch.setattr(ml_utils, 'run_training', slow_training)
+        training_scheduler.request_training()
+        assert training_scheduler._run_one_job()
+        started_at, heartbeat_at = heartbeats[0]
+        assert heartbeat_at > started_at + 0.1
+
+
+def test_login_sample_is_stored_and_counted_in_one_commit(make_app, make_session):
+    rng = np.random.default_rng(0)
+    # The per-user engine, so no trained ensemble is needed
+    app = make_app(VERIFICATION_ENGINE='per_user', TRAINING_TRIGGER_SAMPLES=12)
+    client = app.test_client()
+    client.post('/register_keystrokes', json=dict(make_session(rng), username='frank', password='pw'))
+    sessions = [make_session(rng) for _ in range(10)]
+    assert client.post('/enroll/bulk', json={'userName': 'frank', 'password': 'pw', 'sessions': sessions}).status_code == 200
+
+    with app.app_context():
+        commits = []
+        event.listen(db.engine, 'commit', lambda conn: commits.append(conn))
+        for expected_pending in (11, 0):
+            commits.clear()
+            response = client.post('/authenticate', json=dict(make_session(rng), username='frank', password='pw'))
+            assert response.status_code == 200
+            # The 12th counted sample resets the counter and queues a job, which is its own commit
+            assert len(commits) == (1 if expected_pending else 2)
+            db.session.expire_all()
+            assert db.session.get(TrainingState, 1).pending_samples == expected_pending
+        assert TrainingJob.query.filter_by(reason='new_samples').count() == 1
@@ -0,0 +1,94 @@
+import types
+import numpy as np
+from sqlalchemy import event
+from models import db, PreprocessedKeystrokeData
+from utils import user_cache
+from utils.feature_transform import FEATURE_COLUMNS
+
+# Cached profiles answer logins without queries until USER_CACHE_TTL runs out; samples
+# stored by this process count at once, those of other processes after the expiry.
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def registered_app(make_app, make_session, names, **config):
+    rng = np.random.default_rng(0)
+    app = make_app(USER_CACHE_TTL=60, **config)
+    client = app.test_client()
+    for name in names:
+        client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+    user_cache.clear()
+    return app
+
+
+def count_queries(run):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, len(statements)
+
+
+def test_profiles_expire_after_the_ttl(make_app, make_session, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_cache, 'time', types.SimpleNamespace(monotonic=clock.monotonic))
+    app = registered_app(make_app, make_session, ['lena'])
+    with app.app_context():
+        profile, queries = count_queries(lambda: user_cache.get_profile('lena'))
+        assert queries == 2 and profile['sample_count'] == 1
+        profile, queries = count_queries(lambda: user_cache.get_profile('lena'))
+        assert queries == 0 and user_cache.cache_info()['hits'] >= 1
+
+        # This process's own samples count at once
+        user_cache.add_samples('lena', 3)
+        assert user_cache.get_profile('lena')['sample_count'] == 4
+
+        # A sample stored by another process is only seen after the TTL
+        db.session.add(PreprocessedKeystrokeData(user_id=profile['id'], **{column: 1.0 for column in FEATURE_COLUMNS}))
+        db.session.commit()
+        clock.now += 59
+        assert user_cache.get_profile('lena')['sample_count'] == 4
+        expired = user_cache.cache_info()['expired']
+        clock.now += 2
+        assert user_cache.get_profile('lena')['sample_count'] == 2  # Reloaded from the table
+        assert user_cache.cache_info()['expired'] == expired + 1
+
+
+def test_lru_eviction_and_invalidation(make_app, make_session):
+    app = registered_app(make_app, make_session, ['mia', 'ned', 'ola'], USER_CACHE_SIZE=2)
+    with app.app_context():
+        # The counters are per process, so only their changes are checked
+        before = user_cache.cache_info()
+        assert user_cache.get_profile('nobody') is None
+        for name in ('mia', 'ned', 'mia', 'ola'):  # ned is the least recently used
+            user_cache.get_profile(name)
+        info = user_cache.cache_info()
+        assert info['size'] == 2 and info['evictions'] == before['evictions'] + 1
+        _, queries = count_queries(lambda: user_cache.get_profile('mia'))
+        assert queries == 0
+        _, queries = count_queries(lambda: user_cache.get_profile('ned'))
+        assert queries == 2
+
+        user_cache.invalidate('ned')
+        assert user_cache.cache_info()['invalidations'] == before['invalidations'] + 1
+        # A returned profile is a copy
+        user_cache.get_profile('ola')['sample_count'] = 99
+        assert user_cache.get_profile('ola')['sample_count'] == 1
+
+
+def test_disabled_cache_always_queries(make_app, make_session):
+    app = registered_app(make_app, make_session, ['pia'], USER_CACHE_ENABLED=False)
+    with app.app_context():
+        for _ in range(2):
+            _, queries = count_queries(lambda: user_cache.get_profile('pia'))
+            assert queries == 2
+        assert user_cache.cache_info()['size'] == 0
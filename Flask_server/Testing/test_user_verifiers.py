@@ -0,0 +1,35 @@
+import numpy as np
+from utils import user_verifiers
+
+# A retrain of some users evicts only their cached verifiers; every other process-wide
+# cached model stays loaded.
+
+
+def enroll(client, make_session, rng, name, sessions):
+    payload = {'userName': name, 'password': 'pw', 'sessions': [make_session(rng) for _ in range(sessions)]}
+    assert client.post('/enroll/bulk', json=payload).status_code == 200
+
+
+def test_retrain_evicts_only_changed_users(make_app, make_session):
+    rng = np.random.default_rng(0)
+    app = make_app(VERIFICATION_ENGINE='per_user', TRAINING_TRIGGER_SAMPLES=1000)
+    client = app.test_client()
+    for name in ('dora', 'emil'):
+        client.post('/register_keystrokes', json=dict(make_session(rng), username=name, password='pw'))
+        enroll(client, make_session, rng, name, 12)
+
+    with app.app_context():
+        assert set(user_verifiers.train_user_verifiers()) == {1, 2}
+        dora, emil = user_verifiers.get_verifier(1), user_verifiers.get_verifier(2)
+        assert dora is not None and emil is not None
+        invalidations = user_verifiers.cache_info()['invalidations']
+
+    enroll(client, make_session, rng, 'dora', 3)
+    with app.app_context():
+        assert set(user_verifiers.train_user_verifiers()) == {1}
+        hits = user_verifiers.cache_info()['hits']
+        assert user_verifiers.get_verifier(2) is emil
+        assert user_verifiers.cache_info()['hits'] == hits + 1
+        assert user_verifiers.get_verifier(1) is not dora  # Reloaded from the new file
+        assert user_verifiers.cache_info()['invalidations'] == invalidations + 1
+        assert user_verifiers.get_verifier(3) is None  # Never trained
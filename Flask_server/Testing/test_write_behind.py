@@ -0,0 +1,108 @@
+import atexit
+import numpy as np
+from sqlalchemy import text
+from models import db, TrainingJob, TrainingState
+from utils import write_behind, training_scheduler, feature_stats
+
+# The write-behind buffer writes each row exactly once: a failed insert transaction puts
+# the batch back for the next flush, anything failing after the commit does not.
+
+
+def sample_row(rng, user_id=1):
+    values = rng.uniform(50, 300, 6)
+    return dict(
+        user_id=user_id,
+        press_press_interval_mean=values[0], release_interval_mean=values[1], hold_time_mean=values[2],
+        press_press_interval_variance=values[3], release_interval_variance=values[4], hold_time_variance=values[5],
+        backspace_count=1, error_rate=0.05, total_typing_time=3000.0, typing_speed_cps=6.5
+    )
+
+
+def buffered_app(make_app, make_session, rng, **config):
+    # The flush thread never fires by itself, the tests flush explicitly
+    app = make_app(WRITE_BEHIND_ENABLED=True, WRITE_BEHIND_FLUSH_INTERVAL=600, WRITE_BEHIND_BATCH_SIZE=1000,
+                   VERIFICATION_ENGINE='per_user', **config)
+    client = app.test_client()
+    client.post('/register_keystrokes', json=dict(make_session(rng), username='grace', password='pw'))
+    write_behind.flush()
+    with app.app_context():
+        # Start from an empty trigger, whatever registration counted
+        db.session.execute(text("UPDATE training_state SET pending_samples = 0"))
+        db.session.commit()
+    return app
+
+
+def stored_rows(app):
+    with app.app_context():
+        return db.session.execute(text("SELECT COUNT(*) FROM preprocessed_keystroke_data")).scalar()
+
+
+def pending_samples(app):
+    with app.app_context():
+        state = db.session.get(TrainingState, 1)
+        return state.pending_samples if state is not None else 0
+
+
+def test_flush_writes_and_counts_rows_once(make_app, make_session):
+    rng = np.random.default_rng(0)
+    app = buffered_app(make_app, make_session, rng, TRAINING_TRIGGER_SAMPLES=100)
+    before = stored_rows(app)
+    for _ in range(5):
+        assert write_behind.enqueue(sample_row(rng))
+    assert write_behind.stats()['depth'] == 5
+    assert write_behind.flush() == 5
+    assert write_behind.flush() == 0
+    assert stored_rows(app) == before + 5
+    assert pending_samples(app) == 5
+
+
+def test_failed_insert_is_retried(make_app, make_session, monkeypatch):
+    rng = np.random.default_rng(1)
+    app = buffered_app(make_app, make_session, rng, TRAINING_TRIGGER_SAMPLES=100)
+    before = stored_rows(app)
+    failed = write_behind.stats()['failed_flushes']
+    record_samples = feature_stats.record_samples
+
+    def broken_record_samples(rows, bind=None):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(feature_stats, 'record_samples', broken_record_samples)
+    for _ in range(3):
+        write_behind.enqueue(sample_row(rng))
+    assert write_behind.flush() == 0
+    # The transaction rolled back: nothing stored or counted, the rows wait in the buffer
+    assert write_behind.stats()['depth'] == 3
+    assert write_behind.stats()['failed_flushes'] == failed + 1
+    assert stored_rows(app) == before and pending_samples(app) == 0
+
+    monkeypatch.setattr(feature_stats, 'record_samples', record_samples)
+    assert write_behind.flush() == 3
+    assert stored_rows(app) == before + 3 and pending_samples(app) == 3
+
+
+def test_failed_retrain_request_does_not_rewrite_rows(make_app, make_session, monkeypatch):
+    rng = np.random.default_rng(2)
+    app = buffered_app(make_app, make_session, rng, TRAINING_TRIGGER_SAMPLES=4)
+    before = stored_rows(app)
+
+    def broken_request_training(reason='manual'):
+        raise RuntimeError('database is locked')
+
+    monkeypatch.setattr(training_scheduler, 'request_training', broken_request_training)
+    for _ in range(4):
+        write_behind.enqueue(sample_row(rng))
+    # The rows and the counter reset are committed even though no job could be queued
+    assert write_behind.flush() == 4
+    assert write_behind.stats()['depth'] == 0
+    assert stored_rows(app) == before + 4 and pending_samples(app) == 0
+    with app.app_context():
+        assert TrainingJob.query.count() == 0
+
+
+def test_shutdown_hook_is_registered_once(make_app, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    monkeypatch.setattr(write_behind, '_atexit_registered', False)
+    make_app()
+    make_app(db_name='other.db')
+    assert registered == [write_behind.shutdown]
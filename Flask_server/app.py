@@ -2,23 +2,59 @@ import os
 from flask import Flask
 from config import Config
 from models import db
+from utils import training_scheduler
+from utils import warmup
+from utils import db_migrations
+from utils import sqlite_tuning
+from utils import write_behind
 from routes.logout import logout_bp
 from routes.auth import auth_bp
 from routes.registration import registration_bp 
 from routes.ml_models import ml_models_bp
 from routes.keystroke_route import preprocess_bp
 from routes.train_keystroke import train_keystroke_bp
-app = Flask(__name__)
-app.config.from_object(Config)
-if not os.path.exists('instance/keystroke_dynamics.db'):
-    print("Database not found! Please ensure the database file exists in the instance folder.")
-db.init_app(app)
-app.register_blueprint(logout_bp, url_prefix='/auth') # Register logout route
-app.register_blueprint(preprocess_bp) # preprocess routes
-app.register_blueprint(auth_bp) # Register authentication route
-app.register_blueprint(registration_bp) # Register registration route
-app.register_blueprint(ml_models_bp) # Register machine learning model training route   
-app.register_blueprint(train_keystroke_bp) # Register data gathering route
+from routes.health import health_bp
+
+
+def create_app(config=None):
+    """
+    Build and configure the Flask application.
+
+    Args:
+        config: Optional settings applied on top of Config, either a dict or an
+            object/class with upper-case attributes (like Config itself).
+
+    Returns:
+        Flask: The configured application. Models are not loaded yet, see warmup.warm_up.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    if not os.path.exists('instance/keystroke_dynamics.db'):
+        print("Database not found! Please ensure the database file exists in the instance folder.")
+    db.init_app(app)
+    sqlite_tuning.init_app(app)  # WAL journal, busy timeout and the other SQLITE_PRAGMAS on every connection
+    with app.app_context():
+        db.create_all()  # Creates missing tables such as training_state and training_jobs
+        if app.config.get('AUTO_MIGRATE_DB', True):
+            db_migrations.migrate(db.engine.url.database)  # Brings existing tables to the current schema
+    training_scheduler.init_app(app)
+    write_behind.init_app(app)
+    warmup.init_app(app)
+    app.register_blueprint(logout_bp, url_prefix='/auth') # Register logout route
+    app.register_blueprint(preprocess_bp) # preprocess routes
+    app.register_blueprint(auth_bp) # Register authentication route
+    app.register_blueprint(registration_bp) # Register registration route
+    app.register_blueprint(ml_models_bp) # Register machine learning model training route   
+    app.register_blueprint(train_keystroke_bp) # Register data gathering route
+    app.register_blueprint(health_bp) # Register readiness route
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0')
\ No newline at end of file
+    app = create_app()
+    warmup.warm_up(app)
+    app.run(debug=True, host='0.0.0.0')
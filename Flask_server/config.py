@@ -1,4 +1,61 @@
 class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///../instance/keystroke_dynamics.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = 'secret'
\ No newline at end of file
+    AUTO_MIGRATE_DB = True  # Apply pending utils/db_migrations at startup
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 5,  # Connections kept open per process
+        'max_overflow': 10,  # Extra connections under bursts, closed when returned
+        'pool_timeout': 10,  # Seconds to wait for a free connection
+        'connect_args': {'timeout': 5}  # pysqlite lock wait, matches busy_timeout
+    }
+    SQLITE_PRAGMAS = {  # Applied to every new connection, in this order
+        'busy_timeout': 5000,  # Milliseconds to wait for a lock instead of failing
+        'journal_mode': 'WAL',  # Readers and the writer no longer block each other
+        'synchronous': 'NORMAL',  # Crash safe in WAL mode, syncs only at checkpoints
+        'mmap_size': 256 * 1024 * 1024  # Memory-mapped reads of the database file
+    }
+    SECRET_KEY = 'secret'
+    MODELS_DIR = 'models'  # Published model versions, CURRENT and the per-user verifiers
+    MODEL_VERSIONS_TO_KEEP = 3  # Published model versions retained for rollback
+    ADMIN_USERS = None  # Usernames allowed to roll back models, None = any user with a valid login token
+    TRAINING_TRIGGER_SAMPLES = 5  # New samples that schedule a background retrain
+    TRAINING_WORKER_ENABLED = True  # Run queued training jobs in this process
+    TRAINING_JOB_TIMEOUT = 300  # Seconds without a heartbeat before a running training job is considered dead
+    TRAINING_JOB_HEARTBEAT = 30.0  # Seconds between heartbeats of a running training job
+    TRAINING_PARALLEL = False  # Fit the models in a spawned process pool; the entry script needs an if __name__ == '__main__' guard
+    TRAINING_WORKERS = None  # Pool size for parallel training, None = min(5, CPU count)
+    TRAINING_MEASURE_MEMORY = False  # Trace the peak memory of every fit (peak_memory_mb); tracemalloc slows training
+    TRAINING_MODE = 'full'  # 'full' retrain or 'incremental' partial_fit updates
+    SERVE_SGD_CLASSIFIER = False  # Also predict with the SGD classifier trained for incremental updates
+    FULL_REBUILD_EVERY = 20  # Incremental updates before a full rebuild, 0 = never by count
+    FULL_REBUILD_MAX_AGE = 24 * 3600  # Seconds since the last full rebuild, 0 = never by age
+    VERIFICATION_ENGINE = 'ensemble'  # 'ensemble' multiclass models or 'per_user' verifiers
+    PER_USER_MODEL = 'user_vs_rest'  # 'user_vs_rest' or 'one_class' per-user verifiers
+    USER_VERIFIERS_DIR = None  # None = '<MODELS_DIR>/users'
+    VERIFIER_CACHE_SIZE = 1024  # Per-user verifiers kept loaded in each process
+    INFERENCE_EXECUTOR = 'sequential'  # 'sequential' or 'threads' for concurrent ensemble predictions
+    INFERENCE_WORKERS = 5  # Thread pool size for concurrent inference
+    INFERENCE_TIMEOUT = 1.0  # Seconds each model may take before it is skipped
+    INFERENCE_MODEL_TIMEOUTS = {}  # Per-model overrides, e.g. {'gradient_boosting': 0.5}
+    INFERENCE_MODE = 'ensemble'  # 'ensemble' runs every model, 'cascade' stops at the first confident stage
+    CASCADE_STAGES = [  # Cheapest first; accept/reject are probabilities of the claimed user, unserved models are skipped with a warning
+        {'models': ['logistic_regression'], 'accept': 0.9, 'reject': 0.05},
+        {'models': ['neural_network'], 'accept': 0.8, 'reject': 0.1}
+    ]
+    CASCADE_FALLBACK = 'full_ensemble'  # 'full_ensemble' or 'last_stage' when no stage is confident
+    WRITE_BEHIND_ENABLED = False  # Buffer /authenticate sample inserts and write them in batches
+    WRITE_BEHIND_BATCH_SIZE = 100  # Rows that trigger a flush
+    WRITE_BEHIND_FLUSH_INTERVAL = 0.5  # Seconds the oldest buffered row may wait
+    WRITE_BEHIND_MAX_PENDING = 10000  # Buffer limit, beyond it samples are written synchronously
+    KEYSTROKE_TIMING_FORMAT = 'json'  # 'json' text or compact 'float32' blobs for new keystrokes rows
+    FEATURE_STORE_ENABLED = True  # Train from the memory-mapped feature matrix, SQLite is only read for new rows
+    FEATURE_STORE_DIR = None  # None = '<database file>-features'
+    PREPROCESS_CHUNK_SIZE = 1000  # Keystrokes rows per preprocessing transaction
+    ENROLL_BULK_MAX_SESSIONS = 500  # Sessions accepted by one /enroll/bulk request
+    USER_CACHE_ENABLED = True  # Cache id, password hash and sample count per username
+    USER_CACHE_SIZE = 10000  # Profiles kept per process
+    USER_CACHE_TTL = 60  # Seconds before a profile is reloaded from the database
+    USE_COMPILED_MODELS = True  # Serve the NumPy copies of the models that passed the parity check
+    MODEL_MMAP_MODE = 'r'  # joblib mmap_mode for model artifacts, None loads them into private memory
+    MODEL_SIZE_BUDGET_MB = None  # Allowed size of a published model set, None = no limit
+    MODEL_SIZE_BUDGET_ACTION = 'warn'  # 'warn' or 'fail' the training run when over budget
@@ -1,5 +0,0 @@
-
-# global_vars.py
-
-# Global variable to count new keystroke data
-new_keystrokes = 0
\ No newline at end of file
@@ -1,4 +1,6 @@
+import time
 from flask_sqlalchemy import SQLAlchemy
+from utils.timing_codec import TimingArray  # float32 blobs or legacy JSON text
 
 db = SQLAlchemy()  # For keystroke_dynamics.db
 
@@ -12,10 +14,10 @@ class User(db.Model):
 class Keystroke(db.Model):
     __tablename__ = 'keystrokes'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    press_press_intervals = db.Column(db.String, nullable=True)
-    release_press_intervals = db.Column(db.String, nullable=True)
-    hold_times = db.Column(db.String, nullable=True)  # New column for hold times
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    press_press_intervals = db.Column(TimingArray, nullable=True)
+    release_press_intervals = db.Column(TimingArray, nullable=True)
+    hold_times = db.Column(TimingArray, nullable=True)  # New column for hold times
     total_typing_time = db.Column(db.Float, nullable=True)
     typing_speed = db.Column(db.Float, nullable=True)
     backspace_count = db.Column(db.Integer, nullable=True)
@@ -24,8 +26,13 @@ class Keystroke(db.Model):
 
 class PreprocessedKeystrokeData(db.Model):
     __tablename__ = 'preprocessed_keystroke_data'
+    __table_args__ = (
+        db.Index('ix_preprocessed_keystroke_data_user_created', 'user_id', 'created_at'),  # Per-user counts and reads
+        {'sqlite_autoincrement': True}  # Ids never reused, the training watermark relies on it
+    )
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True)  # Sample id (the SQLite rowid)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     press_press_interval_mean = db.Column(db.Float, nullable=False)
     release_interval_mean = db.Column(db.Float, nullable=False)
     hold_time_mean = db.Column(db.Float, nullable=False, default=0.0)  # New column for hold time mean
@@ -36,3 +43,42 @@ class PreprocessedKeystrokeData(db.Model):
     error_rate = db.Column(db.Float, nullable=False)
     total_typing_time = db.Column(db.Float, nullable=False)  # Added to store total typing time
     typing_speed_cps = db.Column(db.Float, nullable=False)  # Added to store typing speed
+    created_at = db.Column(  # Epoch seconds; the server default covers pandas to_sql appends
+        db.Float, nullable=False, default=time.time,
+        server_default=db.text("((julianday('now') - 2440587.5) * 86400.0)")
+    )
+    keystroke_id = db.Column(  # The keystrokes row this sample was computed from, if any
+        db.Integer, db.ForeignKey('keystrokes.id'), nullable=True, unique=True, index=True
+    )
+
+class TrainingState(db.Model):
+    __tablename__ = 'training_state'
+    id = db.Column(db.Integer, primary_key=True)  # Single row, id = 1
+    pending_samples = db.Column(db.Integer, nullable=False, default=0)  # New samples since the last retrain was scheduled
+
+class TrainingJob(db.Model):
+    __tablename__ = 'training_jobs'
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(16), nullable=False, index=True)  # queued, running, succeeded, failed
+    reason = db.Column(db.String(64), nullable=True)
+    requests = db.Column(db.Integer, nullable=False, default=1)  # Retrain requests coalesced into this job
+    created_at = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.Float, nullable=True)
+    finished_at = db.Column(db.Float, nullable=True)
+    heartbeat_at = db.Column(db.Float, nullable=True)  # Refreshed by the worker while the job runs
+    model_version = db.Column(db.String(64), nullable=True)
+    error = db.Column(db.String, nullable=True)
+
+class Watermark(db.Model):
+    __tablename__ = 'watermarks'
+    name = db.Column(db.String(64), primary_key=True)  # e.g. 'training'
+    value = db.Column(db.Integer, nullable=False, default=0)  # Highest row id already processed
+    updated_at = db.Column(db.Float, nullable=True)
+
+class UserFeatureStat(db.Model):
+    __tablename__ = 'user_feature_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    feature = db.Column(db.String(64), primary_key=True)  # Column name in preprocessed_keystroke_data
+    count = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)  # Sum of squared deviations from the mean
@@ -2,15 +2,22 @@ from flask import Blueprint, request, jsonify
 from flask import current_app
 import jwt
 import datetime
+from functools import wraps
 from werkzeug.security import check_password_hash
 from utils.preprocess_keystrokes import process_single_keystroke_data  # Import the new function
-from utils.evaluate_metrics import evaluate_model  # Import the evaluate_model function
-from models import db, User, PreprocessedKeystrokeData
-import os
-import joblib  # Import joblib for loading models
-import pandas as pd  # Import pandas
-import globals
+from models import db, PreprocessedKeystrokeData
+import numpy as np
+from utils import training_scheduler
+from utils import write_behind  # Optional buffered sample inserts
+from utils import user_cache  # Cached id, password hash and sample count per username
+from utils import feature_stats  # Per-user running feature statistics
+from utils import model_registry  # Shared, once-per-process model instances
+from utils import user_verifiers  # Per-user verification engine
+from utils import inference  # Runs the ensemble sequentially or in a thread pool
 from utils.calculate_features import calculate_keystroke_features  # Import the feature calculation function
+from utils.calculate_features import calculate_keystroke_features_batch
+from utils import feature_transform  # Shared feature-transform stage
+from utils.feature_transform import FEATURE_COLUMNS
 
 # This script is used to authenticate a user and generate a JWT token for the user
 auth_bp = Blueprint('auth', __name__)
@@ -29,6 +36,124 @@ def generate_token(username):
         print(f"Error generating token: {e}")  # Log the error
         return None
 
+def admin_required(view):
+    """
+    Let a request through only with a valid 'Bearer <token>' from /authenticate whose
+    user is one of ADMIN_USERS (any authenticated user when ADMIN_USERS is not set).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('Authorization', '')
+        if token.startswith('Bearer '):
+            token = token.split(' ')[1]
+        try:
+            claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except jwt.InvalidTokenError:  # Also expired tokens
+            return jsonify({'error': 'Invalid or missing token'}), 401
+        admins = current_app.config.get('ADMIN_USERS')
+        if admins is not None and claims.get('sub') not in admins:
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def user_verifier_messages(user_id, feature_vector):
+    """
+    Check the feature vector against the user's own verifier model.
+    """
+    is_valid_user = user_verifiers.verify(user_id, feature_vector)
+    if is_valid_user is None:
+        return ['No per-user model yet. Train the model to add predictions.']
+    if is_valid_user:
+        return ['per_user_verifier predicts that you are the valid user.']
+    return ['per_user_verifier predicts that you are an intruder.']
+
+def prediction_message(model_name, result, row, user_id):
+    """
+    Turn one model's result for one row of the input into a prediction message.
+    """
+    if result['prediction'] is None:
+        if result['timed_out']:
+            return f"{model_name} did not respond in time."
+        return f"{model_name} could not make a prediction."
+    # Check if the predicted user ID matches the authenticated user's ID
+    if int(result['prediction'][row]) == user_id:
+        return f"{model_name} predicts that you are the valid user."
+    return f"{model_name} predicts that you are an intruder."
+
+def store_login_samples(samples):
+    """
+    Store the samples of authenticated logins: through the write-behind buffer when it is
+    enabled and has room, else in one transaction with the retrain trigger count.
+
+    Args:
+        samples (list): (username, dict of preprocessed_keystroke_data column values) pairs.
+    """
+    direct = []
+    for username, new_entry in samples:
+        if current_app.config.get('WRITE_BEHIND_ENABLED', False) and write_behind.enqueue(new_entry):
+            print("Data queued for the database")  # Counted towards retraining when flushed
+        else:
+            direct.append(new_entry)
+        user_cache.add_samples(username)
+    if direct:
+        db.session.add_all([PreprocessedKeystrokeData(**new_entry) for new_entry in direct])
+        feature_stats.record_samples(direct)
+        # Count the new samples towards the next background retrain, one commit for both
+        training_scheduler.note_new_samples(len(direct))
+        print("Data added to the database")
+
+def login_predictions(feature_matrix, user_ids):
+    """
+    Run the configured verification engine on the feature rows of authenticated logins.
+    The rows are transformed together and, in ensemble mode, every model predicts all of
+    them in one call; cascade mode scores each row on its own.
+
+    Args:
+        feature_matrix (array-like): Raw feature rows, in FEATURE_COLUMNS order.
+        user_ids (list): The claimed user of every row.
+
+    Returns:
+        list: Per row, the response fields: 'predictions', plus 'cascade' in cascade mode
+        and 'model_latency_ms' in debug mode.
+    """
+    if current_app.config.get('VERIFICATION_ENGINE', 'ensemble') == 'per_user':
+        return [
+            {'predictions': user_verifier_messages(user_id, feature_vector)}
+            for feature_vector, user_id in zip(feature_matrix, user_ids)
+        ]
+
+    # Use the trained models held by the model registry and make predictions
+    model_set = model_registry.get_model_set()
+    # Transform the features once, every model consumes the same contiguous array
+    model_input = feature_transform.transform(feature_matrix, model_set['artifacts'])
+    serving_models = model_registry.serving_models(model_set, current_app.config.get('USE_COMPILED_MODELS', True))
+    if current_app.config.get('INFERENCE_MODE', 'ensemble') == 'cascade':
+        # Cheap models first, expensive ones only when the cheap ones are unsure
+        rows = [
+            (inference.predict_cascade(serving_models, model_input[row:row + 1], user_id), 0, user_id)
+            for row, user_id in enumerate(user_ids)
+        ]
+    else:
+        model_results = inference.predict_ensemble(serving_models, model_input)
+        rows = [((model_results, None), row, user_id) for row, user_id in enumerate(user_ids)]
+
+    responses = []
+    for (model_results, cascade), row, user_id in rows:
+        prediction_messages = [
+            prediction_message(model_name, result, row, user_id)
+            for model_name, result in model_results.items()
+        ]
+        print(prediction_messages)
+        # Debug level: shown when app.debug is on, not on every production login
+        current_app.logger.debug("Model latency (ms): %s", inference.latency_report(model_results))
+        fields = {'predictions': prediction_messages}
+        if cascade is not None:
+            fields['cascade'] = cascade
+        if current_app.debug:
+            fields['model_latency_ms'] = inference.latency_report(model_results)
+        responses.append(fields)
+    return responses
+
 @auth_bp.route('/authenticate', methods=['POST'])
 def authenticate():
     try:
@@ -76,27 +201,17 @@ def authenticate():
             return jsonify({'error': 'Error processing keystroke data.'}), 500
 
         # Prepare the feature vector for model prediction
-        feature_vector = [
-            processed_data['press_press_interval_mean'],
-            processed_data['release_interval_mean'],
-            processed_data['hold_time_mean'],
-            processed_data['press_press_interval_variance'],
-            processed_data['release_interval_variance'],
-            processed_data['hold_time_variance'],
-            processed_data['backspace_count'],
-            processed_data['error_rate'],
-            processed_data['total_typing_time'],
-            processed_data['typing_speed_cps']
-        ]
+        feature_vector = feature_transform.processed_to_vector(processed_data)
         print(f"Feature vector for prediction: {feature_vector}")
 
-        # Find the user in the database
-        user = User.query.filter_by(username=username).first()
+        # Find the user (from the profile cache when possible)
+        user = user_cache.get_profile(username)
 
         # Validate the user and password
-        if user and check_password_hash(user.password, password):
+        if user and check_password_hash(user['password_hash'], password):
+            user_id = user['id']
             # Check if the user has enough preprocessed keystroke entries
-            keystroke_count = PreprocessedKeystrokeData.query.filter_by(user_id=user.id).count()
+            keystroke_count = user['sample_count']
             if keystroke_count < 10:
                 token = generate_token(username)
                 return jsonify({
@@ -105,12 +220,9 @@ def authenticate():
                     'predictions': ['No predictions yet. Train the model to add predictions.']
                 }), 200
 
-            # Increment the new_keystrokes counter
-            globals.new_keystrokes += 1
-
             # Add the new keystroke data to the database
-            new_entry = PreprocessedKeystrokeData(
-                user_id=user.id,
+            new_entry = dict(
+                user_id=user_id,
                 press_press_interval_mean=processed_data['press_press_interval_mean'],
                 release_interval_mean=processed_data['release_interval_mean'],
                 hold_time_mean=processed_data['hold_time_mean'],
@@ -122,59 +234,121 @@ def authenticate():
                 total_typing_time=processed_data['total_typing_time'],
                 typing_speed_cps=processed_data['typing_speed_cps']
             )
-            db.session.add(new_entry)
-            db.session.commit()
-            print("Data added to the database")
+            store_login_samples([(username, new_entry)])
 
             # Generate the JWT token
             token = generate_token(username)
             print("Token: " + token)
 
-            # Load the trained models from the "models" folder and make predictions
-            model_names = [
-                'logistic_regression.joblib',
-                'random_forest.joblib',
-                'support_vector_machine.joblib',
-                'gradient_boosting.joblib',
-                'neural_network.joblib'
-            ]
-            prediction_messages = []
-            
-            for model_name in model_names:
-                model_path = os.path.join('models', model_name)
-                model = joblib.load(model_path)  # Load the trained model
-
-                # Create DataFrame for predictions
-                df_features = pd.DataFrame([feature_vector], columns=[
-                    'press_press_interval_mean', 'release_interval_mean',
-                    'hold_time_mean', 'press_press_interval_variance', 
-                 'release_interval_variance',
-                    'hold_time_variance', 'backspace_count', 
-                    'error_rate', 'total_typing_time', 'typing_speed_cps'
-                ])
-
-                prediction = model.predict(df_features)  # Make a prediction
-                predicted_user_id = int(prediction[0])  # Assuming this returns the user ID
-                print(f"Model: {model_name}, Prediction: {predicted_user_id}")
-
-                # Check if the predicted user ID matches the authenticated user's ID
-                if predicted_user_id == user.id:
-                    message = f"{model_name.replace('.joblib', '')} predicts that you are the valid user."
-                else:
-                    message = f"{model_name.replace('.joblib', '')} predicts that you are an intruder."
-
-                prediction_messages.append(message)
-                print(prediction_messages)
-
             # Include predictions in the response
-            return jsonify({
-                'authenticated': True,
-                'token': token,
-                'predictions': prediction_messages  # Include model prediction messages in the response
-            }), 200  # Return token on successful authentication
+            response = {'authenticated': True, 'token': token}
+            response.update(login_predictions([feature_vector], [user_id])[0])
+            return jsonify(response), 200  # Return token on successful authentication
         else:
             return jsonify({'error': 'Authentication failed'}), 401
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({'error': 'An unexpected error occurred.', 'details': str(e)}), 500  # Return the actual error message in the response
+
+def _parse_times(times):
+    # Accept lists or comma-separated strings, like /authenticate
+    if isinstance(times, str):
+        times = [float(x) for x in times.split(',')]
+    return times
+
+@auth_bp.route('/authenticate/batch', methods=['POST'])
+def authenticate_batch():
+    """
+    Authenticate many login attempts at once. Every attempt goes through the same user
+    cache, sample storage and verification engine as /authenticate; only the feature
+    computation and the model calls are shared by the whole batch.
+    """
+    try:
+        data = request.get_json()
+        if data is None or not isinstance(data.get('attempts'), list):
+            return jsonify({'error': 'Expected a JSON object with an "attempts" list'}), 400
+        attempts = data['attempts']
+        results = [None] * len(attempts)
+
+        # Validate the timing data of every attempt
+        timings = {}
+        for i, attempt in enumerate(attempts):
+            try:
+                press_times = _parse_times(attempt.get('key_press_times', ''))
+                release_times = _parse_times(attempt.get('key_release_times', ''))
+            except (AttributeError, ValueError):
+                results[i] = {'authenticated': False, 'error': 'Invalid key press or release times'}
+                continue
+            if not isinstance(press_times, list) or not isinstance(release_times, list):
+                results[i] = {'authenticated': False, 'error': 'press_times and release_times must be lists'}
+            elif not press_times or len(press_times) != len(release_times):
+                results[i] = {'authenticated': False, 'error': 'Mismatch between key press and release times'}
+            else:
+                timings[i] = (press_times, release_times)
+
+        # Find the users (from the profile cache when possible) and check the passwords
+        authenticated = []
+        profiles = {}
+        for i in timings:
+            username = attempts[i].get('username')
+            if username not in profiles:
+                profiles[username] = user_cache.get_profile(username)
+            user = profiles[username]
+            if user and check_password_hash(user['password_hash'], attempts[i].get('password') or ''):
+                authenticated.append(i)
+            else:
+                results[i] = {'authenticated': False, 'error': 'Authentication failed'}
+
+        if authenticated:
+            user_ids = [profiles[attempts[i]['username']]['id'] for i in authenticated]
+
+            # Compute the features of all authenticated attempts in one pass
+            features = calculate_keystroke_features_batch(
+                [timings[i][0] for i in authenticated],
+                [timings[i][1] for i in authenticated]
+            )
+            backspace_counts = [attempts[i].get('backspace_count', 0) for i in authenticated]
+            error_rates = [attempts[i].get('error_rate', 0.0) for i in authenticated]
+            feature_matrix = np.column_stack([
+                features['press_press_interval_mean'],
+                features['release_interval_mean'],
+                features['hold_time_mean'],
+                features['press_press_interval_variance'],
+                features['release_interval_variance'],
+                features['hold_time_variance'],
+                np.asarray(backspace_counts, dtype=np.float64),
+                np.asarray(error_rates, dtype=np.float64),
+                features['total_typing_time'],
+                features['typing_speed_cps']
+            ])
+
+            # Users with enough samples get predictions and their sample stored
+            enrolled = [
+                k for k, i in enumerate(authenticated) if profiles[attempts[i]['username']]['sample_count'] >= 10
+            ]
+            for k, i in enumerate(authenticated):
+                results[i] = {
+                    'authenticated': True,
+                    'token': generate_token(attempts[i]['username']),
+                    'predictions': ['No predictions yet. Train the model to add predictions.']
+                }
+
+            if enrolled:
+                store_login_samples([
+                    (
+                        attempts[authenticated[k]]['username'],
+                        dict(user_id=user_ids[k],
+                             **{column: float(feature_matrix[k, j]) for j, column in enumerate(FEATURE_COLUMNS)})
+                    )
+                    for k in enrolled
+                ])
+                predictions = login_predictions(feature_matrix[enrolled], [user_ids[k] for k in enrolled])
+                for k, fields in zip(enrolled, predictions):
+                    results[authenticated[k]].update(fields)
+
+        return jsonify({'results': results}), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({'error': 'An unexpected error occurred.', 'details': str(e)}), 500
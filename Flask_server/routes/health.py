@@ -0,0 +1,13 @@
+from flask import Blueprint, jsonify
+from utils import warmup
+
+# Readiness endpoint for load balancers and orchestrators
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    # 503 until warm-up has finished, so no traffic reaches a cold process
+    state = warmup.status()
+    return jsonify(state), 200 if state['ready'] else 503
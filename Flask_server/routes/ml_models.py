@@ -1,14 +1,62 @@
 from flask import Blueprint, request, jsonify
-from utils.ml_utils import train_model
+from utils import model_registry, model_store, training_scheduler, user_verifiers, inference, write_behind, user_cache, feature_store
+from routes.auth import admin_required
 
-##this script is used to train the machine learning model by calling the train_model function
+##this script is used to train the machine learning model through the background training scheduler
 
 ml_models_bp = Blueprint('ml_models', __name__)
 
 @ml_models_bp.route('/train_model', methods=['POST'])
 def train_ml_model():
     try:
-        model = train_model()
-        return jsonify({'message': 'Model trained successfully'})
+        # Queue the retrain and return right away with a handle to poll
+        job, coalesced = training_scheduler.request_training(reason='manual')
+        return jsonify({
+            'message': 'Model training scheduled',
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'coalesced': coalesced
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+@ml_models_bp.route('/train_model/status', methods=['GET'])
+def train_model_status():
+    return jsonify(training_scheduler.status())
+
+@ml_models_bp.route('/train_model/<job_id>', methods=['GET'])
+def train_model_job(job_id):
+    job = training_scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Training job not found'}), 404
+    return jsonify(job)
+
+@ml_models_bp.route('/models/info', methods=['GET'])
+def models_info():
+    # Report load time, artifact size and loaded version of the models held in this process
+    info = model_registry.model_info()
+    info['user_verifier_cache'] = user_verifiers.cache_info()
+    info['cascade_decisions'] = inference.cascade_stats()
+    info['write_behind'] = write_behind.stats()  # Queue depth and flush latency
+    info['user_cache'] = user_cache.cache_info()
+    info['feature_store'] = feature_store.stats()  # Rows cached for training and sync counters
+    return jsonify(info)
+
+@ml_models_bp.route('/models/versions', methods=['GET'])
+def model_versions():
+    return jsonify({
+        'current': model_store.current_version(),
+        'versions': model_store.list_versions()
+    })
+
+@ml_models_bp.route('/models/rollback', methods=['POST'])
+@admin_required
+def rollback_models():
+    # Switch back to an older retained version, the previous one unless a version is given
+    from utils import ml_utils  # Imported on use, ml_utils pulls in pandas and sklearn
+    data = request.get_json(silent=True) or {}
+    try:
+        version = ml_utils.rollback_models(data.get('version'))
+        return jsonify({'message': 'Rolled back model version', 'version': version})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
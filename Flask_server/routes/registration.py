@@ -2,9 +2,10 @@ from flask import Blueprint, request, jsonify
 from models import db, User, Keystroke, PreprocessedKeystrokeData
 from werkzeug.security import generate_password_hash
 import numpy as np
-import json
 from utils.calculate_features import calculate_keystroke_features  # Import the feature calculation function
 from utils.preprocess_keystrokes import process_single_keystroke_data  # Import the preprocessing function
+from utils import user_cache
+from utils import feature_stats
 ## This script is used to register a new user and store their keystroke data in the database
 registration_bp = Blueprint('registration', __name__)
 
@@ -65,18 +66,15 @@ def register_keystrokes():
         # Create a new keystroke entry with all the collected data
         keystroke = Keystroke(
             user_id=user.id,  # Use user.id to link to the user
-            press_press_intervals=json.dumps(keystroke_features['press_press_intervals']),  # Store as JSON strings
-            release_press_intervals=json.dumps(keystroke_features['release_press_intervals']),  # Store as JSON strings
-            hold_times=json.dumps(keystroke_features['hold_times']),  # Store hold times as JSON strings
+            press_press_intervals=keystroke_features['press_press_intervals'],  # Stored in KEYSTROKE_TIMING_FORMAT
+            release_press_intervals=keystroke_features['release_press_intervals'],
+            hold_times=keystroke_features['hold_times'],
             total_typing_time=keystroke_features['total_typing_time'],  # Total typing time
             typing_speed=keystroke_features['typing_speed_cps'],  # Typing speed in characters per second
             backspace_count=backspace_count,
             error_rate=error_rate,
             press_to_release_ratio_mean=keystroke_features['press_to_release_ratio_mean']  # Mean press-to-release ratio
         )
-            # Calculate keystroke features
-        keystroke_features = calculate_keystroke_features(press_times, release_times)
-
         # Extract necessary features from keystroke_features for preprocessing
         press_press_intervals = keystroke_features['press_press_intervals']
         release_press_intervals = keystroke_features['release_press_intervals']
@@ -110,8 +108,12 @@ def register_keystrokes():
 
         # Save the keystroke data to the database
         db.session.add(keystroke)
+        db.session.flush()  # Assigns the keystroke id the sample links to
+        new_preprocessed.keystroke_id = keystroke.id
         db.session.add(new_preprocessed)
+        feature_stats.record_samples([new_preprocessed])
         db.session.commit()
+        user_cache.invalidate(username)  # A profile cached under this name is stale now
 
         # If a new user registers, retrain the models
         # request.post('http://localhost:5000/train_model')  # Uncomment if needed
@@ -1,12 +1,11 @@
-from flask import Blueprint, request, jsonify
-from models import db, User, Keystroke, PreprocessedKeystrokeData
+from flask import Blueprint, request, jsonify, current_app
+from models import db, Keystroke, PreprocessedKeystrokeData
 from utils.preprocess_keystrokes import process_single_keystroke_data
 from werkzeug.security import check_password_hash
-import numpy as np
-import requests
-import json
-import globals
-from utils.calculate_features import calculate_keystroke_features  # Import the feature calculation function
+from utils import training_scheduler
+from utils import user_cache
+from utils import feature_stats
+from utils.calculate_features import calculate_keystroke_features, calculate_keystroke_features_batch  # Import the feature calculation functions
 
 # Create blueprint
 train_keystroke_bp = Blueprint('train_keystroke', __name__)
@@ -25,18 +24,18 @@ def train_keystroke():
 
     print(f'backspace: {backspace_count}')
 
-    # Query the database to retrieve the user's actual stored password hash
-    user = User.query.filter_by(username=user_name).first()
+    # Retrieve the user's stored password hash (from the profile cache when possible)
+    user = user_cache.get_profile(user_name)
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
     # Verify the raw password with the stored hash
-    if not check_password_hash(user.password, password):
+    if not check_password_hash(user['password_hash'], password):
         return jsonify({'error': 'Incorrect password'}), 401
 
     # Find the user id
-    user_id = user.id
+    user_id = user['id']
 
     # Calculate keystroke features
     keystroke_features = calculate_keystroke_features(key_press_times, key_release_times)
@@ -77,9 +76,9 @@ def train_keystroke():
     # Create a new Keystroke record
     new_keystroke = Keystroke(
         user_id=user_id,
-        press_press_intervals=json.dumps(keystroke_features['press_press_intervals']),  # Added for new structure
-        release_press_intervals=json.dumps(keystroke_features['release_press_intervals']),  # Added for new structure
-        hold_times=json.dumps(keystroke_features['hold_times']),  # Added hold times
+        press_press_intervals=keystroke_features['press_press_intervals'],  # Stored in KEYSTROKE_TIMING_FORMAT
+        release_press_intervals=keystroke_features['release_press_intervals'],
+        hold_times=keystroke_features['hold_times'],  # Added hold times
         total_typing_time=keystroke_features['total_typing_time'],  # Total typing time
         typing_speed=keystroke_features['typing_speed_cps'],  # Typing speed in characters per second
         backspace_count=backspace_count,
@@ -89,13 +88,117 @@ def train_keystroke():
 
     # Add the keystroke data to the database
     db.session.add(new_keystroke)
+    db.session.flush()  # Assigns the keystroke id the sample links to
+    new_preprocessed_data.keystroke_id = new_keystroke.id
     db.session.add(new_preprocessed_data)
-    db.session.commit()
-    globals.new_keystrokes += 1
-    print(globals.new_keystrokes)
-
-    if globals.new_keystrokes >= 5:
-        requests.post('http://localhost:5000/train_model')
-        globals.new_keystrokes = 0
+    feature_stats.record_samples([new_preprocessed_data])
+    # Count the sample in the same commit and schedule a background retrain once enough have arrived
+    training_scheduler.note_new_samples()
+    user_cache.add_samples(user_name)
 
     return jsonify({'message': 'Keystroke dynamics data added successfully'})
+
+@train_keystroke_bp.route('/enroll/bulk', methods=['POST'])
+def enroll_bulk():
+    """
+    Store many typing sessions of one user at once: one password check, one feature
+    computation for all sessions, one transaction and at most one scheduled retrain.
+    The request is all or nothing, a single invalid session rejects the whole batch.
+    """
+    data = request.get_json()
+    if data is None or not isinstance(data.get('sessions'), list) or not data['sessions']:
+        return jsonify({'error': 'Expected a JSON object with a non-empty "sessions" list'}), 400
+
+    user_name = data.get('userName')
+    password = data.get('password')
+    sessions = data['sessions']
+
+    max_sessions = current_app.config.get('ENROLL_BULK_MAX_SESSIONS', 500)
+    if len(sessions) > max_sessions:
+        return jsonify({'error': f'At most {max_sessions} sessions per request'}), 413
+
+    user = user_cache.get_profile(user_name)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    if not check_password_hash(user['password_hash'], password or ''):
+        return jsonify({'error': 'Incorrect password'}), 401
+    user_id = user['id']
+
+    # Validate every session before anything is written
+    errors = []
+    for i, session in enumerate(sessions):
+        press_times = session.get('key_press_times') if isinstance(session, dict) else None
+        release_times = session.get('key_release_times') if isinstance(session, dict) else None
+        if not isinstance(press_times, list) or not isinstance(release_times, list):
+            errors.append({'session': i, 'error': 'key_press_times and key_release_times must be lists'})
+        elif not press_times or len(press_times) != len(release_times):
+            errors.append({'session': i, 'error': 'Mismatch between key press and release times'})
+    if errors:
+        return jsonify({'error': 'Invalid sessions, nothing was stored', 'sessions': errors}), 400
+
+    # Features of all sessions in one vectorized pass
+    try:
+        features = calculate_keystroke_features_batch(
+            [session['key_press_times'] for session in sessions],
+            [session['key_release_times'] for session in sessions]
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid key press or release times: {e}'}), 400
+
+    keystrokes = []
+    preprocessed = []
+    for k, session in enumerate(sessions):
+        backspace_count = session.get('backspace_count', 0)
+        error_rate = session.get('error_rate', 0.0)
+        total_typing_time = float(features['total_typing_time'][k])
+        typing_speed_cps = float(features['typing_speed_cps'][k])
+        keystrokes.append(Keystroke(
+            user_id=user_id,
+            press_press_intervals=features['press_press_intervals'][k],
+            release_press_intervals=features['release_press_intervals'][k],
+            hold_times=features['hold_times'][k],
+            total_typing_time=total_typing_time,
+            typing_speed=typing_speed_cps,
+            backspace_count=backspace_count,
+            error_rate=error_rate,
+            press_to_release_ratio_mean=float(features['press_to_release_ratio_mean'][k])
+        ))
+        preprocessed.append(PreprocessedKeystrokeData(
+            user_id=user_id,
+            press_press_interval_mean=float(features['press_press_interval_mean'][k]),
+            release_interval_mean=float(features['release_interval_mean'][k]),
+            hold_time_mean=float(features['hold_time_mean'][k]),
+            press_press_interval_variance=float(features['press_press_interval_variance'][k]),
+            release_interval_variance=float(features['release_interval_variance'][k]),
+            hold_time_variance=float(features['hold_time_variance'][k]),
+            backspace_count=backspace_count,
+            error_rate=error_rate,
+            total_typing_time=total_typing_time,
+            typing_speed_cps=typing_speed_cps
+        ))
+
+    # One transaction for all rows
+    try:
+        db.session.add_all(keystrokes)
+        db.session.flush()  # Assigns the keystroke ids the samples link to
+        for keystroke, sample in zip(keystrokes, preprocessed):
+            sample.keystroke_id = keystroke.id
+        db.session.add_all(preprocessed)
+        feature_stats.record_samples(preprocessed)
+        # One trigger update for the whole batch, so it schedules at most one retrain
+        retrain_due = training_scheduler.count_new_samples(len(sessions))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Bulk enrollment for user {user_id} failed: {e}")
+        return jsonify({'error': 'Could not store the sessions', 'details': str(e)}), 500
+    user_cache.add_samples(user_name, len(sessions))
+
+    job = training_scheduler.request_training(reason='new_samples')[0] if retrain_due else None
+
+    return jsonify({
+        'message': f'{len(sessions)} keystroke sessions added successfully',
+        'stored': len(sessions),
+        'sample_count': user['sample_count'] + len(sessions),
+        'training_job': job
+    })
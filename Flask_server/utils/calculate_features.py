@@ -1,6 +1,10 @@
+from itertools import chain
+import numpy as np
+
+
 def calculate_keystroke_features(key_press_times, key_release_times):
     """
-    This function calculates key intervals, durations, hold times, total typing time, 
+    This function calculates key intervals, durations, hold times, total typing time,
     and typing speed for keystroke dynamics based on key press and release timestamps.
 
     Args:
@@ -10,55 +14,145 @@ def calculate_keystroke_features(key_press_times, key_release_times):
     Returns:
         dict: A dictionary containing calculated features.
     """
-    print("key_press_times is :"+str(key_press_times))
-    print("key_release_times is :"+str(key_release_times))
     # Ensure the press and release times match
     if len(key_press_times) != len(key_release_times):
         raise ValueError("Mismatch between key press and release times")
 
-    # Calculate press-press intervals
-    press_press_intervals = [
-        key_press_times[i] - key_press_times[i - 1]
-        for i in range(1, len(key_press_times))
-    ]
-
-    # Calculate press-release durations (time each key was held)
-    press_release_durations = [
-        key_release_times[i] - key_press_times[i]
-        for i in range(len(key_press_times))
-    ]
-
-    # Calculate release-press intervals
-    release_press_intervals = [
-        key_press_times[i] - key_release_times[i - 1]
-        for i in range(1, len(key_press_times))
-    ]
-
-    # Calculate hold times (the duration each key was held down)
-    hold_times = [
-        key_release_times[i] - key_press_times[i]
-        for i in range(len(key_press_times))
-    ]
+    # One conversion for both sequences keeps the per-call NumPy overhead low
+    times = np.array((key_press_times, key_release_times), dtype=np.float64)
+    press, release = times[0], times[1]
+
+    # Press-press intervals, release-press intervals and hold times (press-release durations)
+    press_press_intervals = press[1:] - press[:-1]
+    release_press_intervals = press[1:] - release[:-1]
+    hold_times = release - press
+
+    press_press_sum = float(press_press_intervals.sum())
     press_to_release_ratio_mean = (
-        sum(release_press_intervals) / sum(press_press_intervals)
-        if sum(press_press_intervals) != 0 else 0
+        float(release_press_intervals.sum()) / press_press_sum
+        if press_press_sum != 0 else 0
     )
-    
 
     # Calculate total typing time
-    total_typing_time = key_release_times[-1] - key_press_times[0]
+    total_typing_time = float(release[-1] - press[0])
 
     # Calculate typing speed (characters per second) based on number of key presses
-    total_characters = len(key_press_times)
+    total_characters = len(press)
     typing_speed_cps = total_characters / (total_typing_time / 1000)  # Convert ms to seconds
-    print("hold times is :"+str(hold_times))
-    # Return all calculated features
+
+    hold_times = hold_times.tolist()
+    # Return all calculated features as plain lists so they stay JSON serializable
     return {
-        'press_press_intervals': press_press_intervals,
-        'press_release_durations': press_release_durations,
-        'release_press_intervals': release_press_intervals,
+        'press_press_intervals': press_press_intervals.tolist(),
+        'press_release_durations': list(hold_times),
+        'release_press_intervals': release_press_intervals.tolist(),
         'hold_times': hold_times,
         'total_typing_time': total_typing_time,
-        'typing_speed_cps': typing_speed_cps,  # Characters per second   
-        'press_to_release_ratio_mean': press_to_release_ratio_mean,     
+        'typing_speed_cps': typing_speed_cps,  # Characters per second
+        'press_to_release_ratio_mean': press_to_release_ratio_mean,
+    }
+
+
+def _segment_mean_var(values, segments, counts):
+    # Population mean and variance (like np.mean / np.var) of each segment, 0 for empty ones
+    safe_counts = np.maximum(counts, 1)
+    means = np.bincount(segments, weights=values, minlength=len(counts)) / safe_counts
+    squared = (values - means[segments]) ** 2
+    variances = np.bincount(segments, weights=squared, minlength=len(counts)) / safe_counts
+    means[counts == 0] = 0.0
+    variances[counts == 0] = 0.0
+    return means, variances
+
+
+def ragged_mean_var(sequences):
+    """
+    Population mean and variance of every sequence in a list of sequences of different
+    lengths, in one pass over the flattened values (0 for empty sequences, like
+    process_single_keystroke_data).
+
+    Returns:
+        tuple: (means, variances), arrays of shape (len(sequences),).
+    """
+    counts = np.fromiter((len(values) for values in sequences), dtype=np.int64, count=len(sequences))
+    values = np.concatenate([np.asarray(values, dtype=np.float64) for values in sequences]) if sequences else np.empty(0)
+    segments = np.repeat(np.arange(len(counts)), counts)
+    return _segment_mean_var(values, segments, counts)
+
+
+def calculate_keystroke_features_batch(key_press_times, key_release_times, lengths=None):
+    """
+    Calculate the keystroke features of many typing sessions in one vectorized pass.
+
+    Args:
+        key_press_times: Either a list of per-session sequences (ragged), or a padded
+            2-D array of shape (sessions, max_keys) together with lengths.
+        key_release_times: Release timestamps in the same layout as key_press_times.
+        lengths (array-like of int): Number of valid keys per row of a padded array.
+
+    Returns:
+        dict: Per-session arrays of shape (sessions,) for the scalar features and for the
+        means and variances used by preprocessing, plus lists of per-session interval
+        arrays. Sessions with a total typing time of 0 get a typing speed of 0.
+    """
+    if lengths is None:
+        lengths = np.array([len(times) for times in key_press_times], dtype=np.int64)
+        if any(len(p) != len(r) for p, r in zip(key_press_times, key_release_times)):
+            raise ValueError("Mismatch between key press and release times")
+        total = int(lengths.sum())
+        press = np.fromiter(chain.from_iterable(key_press_times), dtype=np.float64, count=total)
+        release = np.fromiter(chain.from_iterable(key_release_times), dtype=np.float64, count=total)
+    else:
+        lengths = np.asarray(lengths, dtype=np.int64)
+        press_2d = np.asarray(key_press_times, dtype=np.float64)
+        release_2d = np.asarray(key_release_times, dtype=np.float64)
+        if press_2d.shape != release_2d.shape:
+            raise ValueError("Mismatch between key press and release times")
+        valid = np.arange(press_2d.shape[1]) < lengths[:, None]
+        press = press_2d[valid]  # Row-major, so sessions stay contiguous and in order
+        release = release_2d[valid]
+
+    if np.any(lengths < 1):
+        raise ValueError("Every session needs at least one key press")
+
+    sessions = len(lengths)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    segments = np.repeat(np.arange(sessions), lengths)
+
+    # Intervals between consecutive keys of the same session only
+    same_session = segments[1:] == segments[:-1]
+    interval_segments = segments[1:][same_session]
+    press_press = (press[1:] - press[:-1])[same_session]
+    release_press = (press[1:] - release[:-1])[same_session]
+    hold = release - press
+    interval_counts = lengths - 1
+
+    press_press_sum = np.bincount(interval_segments, weights=press_press, minlength=sessions)
+    release_press_sum = np.bincount(interval_segments, weights=release_press, minlength=sessions)
+    ratio = np.divide(release_press_sum, press_press_sum,
+                      out=np.zeros(sessions), where=press_press_sum != 0)
+
+    total_typing_time = release[ends - 1] - press[starts]
+    typing_speed_cps = np.divide(lengths * 1000.0, total_typing_time,
+                                 out=np.zeros(sessions), where=total_typing_time != 0)
+
+    pp_mean, pp_var = _segment_mean_var(press_press, interval_segments, interval_counts)
+    rp_mean, rp_var = _segment_mean_var(release_press, interval_segments, interval_counts)
+    hold_mean, hold_var = _segment_mean_var(hold, segments, lengths)
+
+    interval_splits = np.cumsum(interval_counts)[:-1]
+    return {
+        'lengths': lengths,
+        'press_press_intervals': np.split(press_press, interval_splits),
+        'release_press_intervals': np.split(release_press, interval_splits),
+        'hold_times': np.split(hold, ends[:-1]),
+        'total_typing_time': total_typing_time,
+        'typing_speed_cps': typing_speed_cps,
+        'press_to_release_ratio_mean': ratio,
+        'press_press_interval_mean': pp_mean,
+        'press_press_interval_variance': pp_var,
+        'release_interval_mean': rp_mean,
+        'release_interval_variance': rp_var,
+        'hold_time_mean': hold_mean,
+        'hold_time_variance': hold_var,
     }
@@ -0,0 +1,318 @@
+import numpy as np
+
+# Array-backed copies of the fitted sklearn models for the login hot path. For a single
+# 10-feature row most of sklearn's predict time goes to input validation, so these
+# predictors keep only the fitted arrays and do the arithmetic with NumPy:
+#
+# - Logistic regression, SGD and the MLP become weight matrices.
+# - Random forest and gradient boosting become flattened node arrays, traversed for all
+#   rows and trees at once.
+# - The RBF SVC keeps its support vectors, dual coefficients and one-vs-one intercepts.
+#
+# compile_models only keeps a predictor when its predictions match sklearn on the
+# check rows, so an unsupported or mismatching model keeps being served by sklearn.
+
+COMPILED_ARTIFACT = 'compiled_models'
+
+
+def expit(scores):
+    # scipy.special takes a noticeable part of the app's import time, load it on first scoring
+    from scipy.special import expit as scipy_expit
+    return scipy_expit(scores)
+
+
+def _as_matrix(X):
+    return np.ascontiguousarray(X, dtype=np.float64).reshape(-1, np.shape(X)[-1])
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+
+class LinearPredictor:
+    """
+    Logistic regression or SGD classifier: scores = X @ coef.T + intercept.
+    """
+
+    def __init__(self, model, proba):
+        self.coef = np.ascontiguousarray(model.coef_.T, dtype=np.float64)
+        self.intercept = np.asarray(model.intercept_, dtype=np.float64)
+        self.classes_ = model.classes_
+        self.proba = proba  # 'softmax' (multinomial) or 'ovr' (normalized one-vs-rest)
+
+    def decision_function(self, X):
+        scores = _as_matrix(X) @ self.coef + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            return self.classes_[(scores > 0).astype(int)]
+        return self.classes_[np.argmax(scores, axis=1)]
+
+    def predict_proba(self, X):
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            positive = expit(scores)
+            return np.column_stack([1 - positive, positive])
+        if self.proba == 'softmax':
+            return _softmax(scores)
+        probabilities = expit(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+
+_ACTIVATIONS = {
+    'identity': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'logistic': expit,
+}
+
+
+class MLPPredictor:
+    """
+    Multi-layer perceptron forward pass over the fitted weight matrices.
+    """
+
+    def __init__(self, model):
+        self.coefs = [np.ascontiguousarray(c, dtype=np.float64) for c in model.coefs_]
+        self.intercepts = [np.asarray(b, dtype=np.float64) for b in model.intercepts_]
+        self.activation = model.activation
+        self.classes_ = model.classes_
+
+    def _output(self, X):
+        activation = _as_matrix(X)
+        hidden = _ACTIVATIONS[self.activation]
+        last = len(self.coefs) - 1
+        for i, (coef, intercept) in enumerate(zip(self.coefs, self.intercepts)):
+            activation = activation @ coef + intercept
+            if i != last:
+                activation = hidden(activation)
+        return activation  # Output layer before softmax / logistic
+
+    def predict(self, X):
+        output = self._output(X)
+        if output.shape[1] == 1:
+            return self.classes_[(expit(output.ravel()) > 0.5).astype(int)]
+        return self.classes_[np.argmax(output, axis=1)]
+
+    def predict_proba(self, X):
+        output = self._output(X)
+        if output.shape[1] == 1:
+            positive = expit(output.ravel())
+            return np.column_stack([1 - positive, positive])
+        return _softmax(output)
+
+
+def _flatten_trees(trees):
+    """
+    Concatenate the node arrays of many sklearn trees. Leaves point to themselves, so
+    max_depth traversal steps always end on a leaf.
+    """
+    left, right, feature, threshold, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        count = tree.node_count
+        nodes = np.arange(offset, offset + count)
+        is_leaf = tree.children_left == -1
+        left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+        right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        roots.append(offset)
+        offset += count
+        max_depth = max(max_depth, tree.max_depth)
+    return (
+        np.concatenate(left).astype(np.intp),
+        np.concatenate(right).astype(np.intp),
+        np.concatenate(feature).astype(np.intp),
+        np.concatenate(threshold).astype(np.float64),
+        np.asarray(roots, dtype=np.intp),
+        max_depth
+    )
+
+
+class _TreeEnsemble:
+
+    def _set_trees(self, trees):
+        (self.left, self.right, self.feature, self.threshold,
+         self.roots, self.max_depth) = _flatten_trees(trees)
+
+    def _leaves(self, X):
+        # sklearn trees compare float32 features with float64 thresholds
+        X = _as_matrix(X).astype(np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.repeat(self.roots[None, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes  # Shape (rows, trees)
+
+
+class ForestPredictor(_TreeEnsemble):
+    """
+    Random forest: mean of the normalized class distributions of the reached leaves.
+    """
+
+    def __init__(self, model):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        self._set_trees(trees)
+        values = np.concatenate([tree.value[:, 0, :] for tree in trees]).astype(np.float64)
+        normalizer = values.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        self.values = values / normalizer
+        self.classes_ = model.classes_
+
+    def predict_proba(self, X):
+        leaves = self._leaves(X)
+        # Accumulate tree by tree, in the same order as sklearn
+        probabilities = np.zeros((leaves.shape[0], self.values.shape[1]))
+        for t in range(leaves.shape[1]):
+            probabilities += self.values[leaves[:, t]]
+        probabilities /= leaves.shape[1]
+        return probabilities
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class GradientBoostingPredictor(_TreeEnsemble):
+    """
+    Gradient boosting: initial raw score plus learning_rate times the reached leaf values.
+    """
+
+    def __init__(self, model, n_features):
+        stages, outputs = model.estimators_.shape
+        trees = [model.estimators_[i, k].tree_ for i in range(stages) for k in range(outputs)]
+        self._set_trees(trees)
+        self.values = np.concatenate([tree.value[:, 0, 0] for tree in trees]).astype(np.float64)
+        self.stages = stages
+        self.outputs = outputs
+        self.learning_rate = model.learning_rate
+        # The default (prior) init estimator gives every row the same raw score
+        self.init_raw = np.asarray(model._raw_predict_init(np.zeros((1, n_features))), dtype=np.float64)[0]
+        self.classes_ = model.classes_
+
+    def decision_function(self, X):
+        leaf_values = self.values[self._leaves(X)].reshape(-1, self.stages, self.outputs)
+        raw = np.repeat(self.init_raw[None, :], leaf_values.shape[0], axis=0)
+        for i in range(self.stages):
+            raw += self.learning_rate * leaf_values[:, i, :]
+        return raw.ravel() if self.outputs == 1 else raw
+
+    def predict(self, X):
+        raw = self.decision_function(X)
+        if raw.ndim == 1:
+            return self.classes_[(raw >= 0).astype(int)]
+        return self.classes_[np.argmax(raw, axis=1)]
+
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        if raw.ndim == 1:
+            positive = expit(raw)
+            return np.column_stack([1 - positive, positive])
+        return _softmax(raw)
+
+
+class SVCPredictor:
+    """
+    RBF support vector classifier with libsvm's one-vs-one voting.
+    """
+
+    def __init__(self, model):
+        self.support_vectors = np.ascontiguousarray(model.support_vectors_, dtype=np.float64)
+        self.gamma = float(model._gamma)
+        # libsvm's own coefficients and intercepts (sklearn flips the public ones for binary problems)
+        dual_coef = np.asarray(model._dual_coef_, dtype=np.float64)
+        intercept = np.asarray(model._intercept_, dtype=np.float64)
+        starts = np.concatenate([[0], np.cumsum(model.n_support_)])
+        classes = len(model.classes_)
+
+        self.pairs = []
+        # Per pair (i, j): the coefficients of all support vectors, zero outside classes i and j
+        pair_coef = np.zeros((len(self.support_vectors), classes * (classes - 1) // 2))
+        p = 0
+        for i in range(classes):
+            for j in range(i + 1, classes):
+                pair_coef[starts[i]:starts[i + 1], p] = dual_coef[j - 1, starts[i]:starts[i + 1]]
+                pair_coef[starts[j]:starts[j + 1], p] = dual_coef[i, starts[j]:starts[j + 1]]
+                self.pairs.append((i, j))
+                p += 1
+        self.pair_coef = pair_coef
+        self.pair_first = np.array([i for i, _ in self.pairs], dtype=np.intp)
+        self.pair_second = np.array([j for _, j in self.pairs], dtype=np.intp)
+        self.intercept = intercept
+        self.classes_ = model.classes_
+
+    def _pair_decisions(self, X):
+        X = _as_matrix(X)
+        distances = np.zeros((X.shape[0], len(self.support_vectors)))
+        for f in range(X.shape[1]):
+            diff = X[:, f, None] - self.support_vectors[None, :, f]
+            distances += diff * diff
+        kernel = np.exp(-self.gamma * distances)
+        return kernel @ self.pair_coef + self.intercept
+
+    def predict(self, X):
+        decisions = self._pair_decisions(X)
+        # Each pair votes for its first class on a positive decision, else for its second
+        winners = np.where(decisions > 0, self.pair_first, self.pair_second)
+        votes = (winners[:, :, None] == np.arange(len(self.classes_))).sum(axis=1)
+        return self.classes_[np.argmax(votes, axis=1)]  # Ties go to the lower class, as in libsvm
+
+
+def compile_model(model, n_features):
+    """
+    Build the array-backed predictor for a fitted model, or None if it is not supported.
+    """
+    # Only training compiles models, serving just unpickles the predictors
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.neural_network import MLPClassifier
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+    from sklearn.svm import SVC
+
+    if isinstance(model, LogisticRegression):
+        return LinearPredictor(model, proba='softmax')
+    if isinstance(model, SGDClassifier):
+        return LinearPredictor(model, proba='ovr')
+    if isinstance(model, MLPClassifier):
+        return MLPPredictor(model)
+    if isinstance(model, RandomForestClassifier):
+        return ForestPredictor(model)
+    if isinstance(model, GradientBoostingClassifier) and model.init != 'zero':
+        return GradientBoostingPredictor(model, n_features)
+    if isinstance(model, SVC) and model.kernel == 'rbf':
+        return SVCPredictor(model)
+    return None
+
+
+def compile_models(models, X_check):
+    """
+    Compile every supported model and keep those that reproduce sklearn's predictions.
+
+    Args:
+        models (dict): Model name -> fitted sklearn model.
+        X_check (ndarray): Transformed rows the predictions are compared on.
+
+    Returns:
+        dict: Model name -> compiled predictor.
+    """
+    X_check = _as_matrix(X_check)
+    compiled = {}
+    for model_name, model in models.items():
+        try:
+            predictor = compile_model(model, X_check.shape[1])
+        except Exception as e:
+            print(f"Could not compile {model_name}: {e}")
+            continue
+        if predictor is None:
+            continue
+        if np.array_equal(predictor.predict(X_check), model.predict(X_check)):
+            compiled[model_name] = predictor
+        else:
+            print(f"Compiled {model_name} does not match sklearn, serving the sklearn model")
+    return compiled
@@ -0,0 +1,209 @@
+import sys
+import time
+import sqlite3
+import argparse
+
+# Schema migrations for the SQLite database, written against the sqlite3 module only so
+# they can run without the Flask app (python -m utils.db_migrations instance/keystroke_dynamics.db).
+#
+# The schema version is kept in PRAGMA user_version. Every migration checks the actual
+# tables before changing them, so it is also safe on a database that db.create_all just
+# created with the current models. create_app applies pending migrations at startup
+# (AUTO_MIGRATE_DB); they run in one exclusive transaction, so concurrently starting
+# workers cannot apply them twice.
+
+# SQLite expression for the current time as epoch seconds, like time.time()
+NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+PREPROCESSED_COLUMNS = [
+    ('press_press_interval_mean', 'FLOAT NOT NULL'),
+    ('release_interval_mean', 'FLOAT NOT NULL'),
+    ('hold_time_mean', 'FLOAT NOT NULL DEFAULT 0.0'),
+    ('press_press_interval_variance', 'FLOAT NOT NULL'),
+    ('release_interval_variance', 'FLOAT NOT NULL DEFAULT 0.0'),
+    ('hold_time_variance', 'FLOAT NOT NULL DEFAULT 0.0'),
+    ('backspace_count', 'INTEGER NOT NULL'),
+    ('error_rate', 'FLOAT NOT NULL'),
+    ('total_typing_time', 'FLOAT NOT NULL DEFAULT 0.0'),
+    ('typing_speed_cps', 'FLOAT NOT NULL DEFAULT 0.0'),
+]
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _preprocessed_surrogate_key(conn):
+    """
+    preprocessed_keystroke_data: surrogate id, created_at, (user_id, created_at) index.
+    keystrokes: index on the user_id foreign key.
+    """
+    if _table_exists(conn, 'preprocessed_keystroke_data') and 'id' not in _columns(conn, 'preprocessed_keystroke_data'):
+        columns = ''.join(f'{name} {ddl}, ' for name, ddl in PREPROCESSED_COLUMNS)
+        conn.execute(
+            "CREATE TABLE preprocessed_keystroke_data_new ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id INTEGER NOT NULL, "
+            f"{columns}"
+            f"created_at FLOAT NOT NULL DEFAULT {NOW_SQL}, "
+            "FOREIGN KEY (user_id) REFERENCES users (id))"
+        )
+        # The old rowid becomes the id, so the training watermarks (row ids) stay valid.
+        # Existing rows have no recorded creation time and get the migration time.
+        names = ', '.join(name for name, _ in PREPROCESSED_COLUMNS)
+        conn.execute(
+            f"INSERT INTO preprocessed_keystroke_data_new (id, user_id, {names}, created_at) "
+            f"SELECT rowid, user_id, {names}, ? FROM preprocessed_keystroke_data ORDER BY rowid",
+            (time.time(),)
+        )
+        conn.execute("DROP TABLE preprocessed_keystroke_data")
+        conn.execute("ALTER TABLE preprocessed_keystroke_data_new RENAME TO preprocessed_keystroke_data")
+
+    if _table_exists(conn, 'preprocessed_keystroke_data'):
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_preprocessed_keystroke_data_user_created "
+            "ON preprocessed_keystroke_data (user_id, created_at)"
+        )
+    if _table_exists(conn, 'keystrokes'):
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_keystrokes_user_id ON keystrokes (user_id)")
+
+
+def feature_stats_rebuild_sql():
+    """
+    Statements that recompute user_feature_stats from every preprocessed row: per user
+    and feature column the count, the mean and M2, the sum of squared deviations from
+    the mean (two passes, so as exact as the running updates).
+    """
+    statements = ["DELETE FROM user_feature_stats"]
+    for name, _ in PREPROCESSED_COLUMNS:
+        statements.append(
+            "INSERT INTO user_feature_stats (user_id, feature, count, mean, m2) "
+            f"SELECT p.user_id, '{name}', COUNT(*), a.mean, SUM((p.{name} - a.mean) * (p.{name} - a.mean)) "
+            "FROM preprocessed_keystroke_data p "
+            f"JOIN (SELECT user_id, AVG({name}) AS mean FROM preprocessed_keystroke_data GROUP BY user_id) a "
+            "ON a.user_id = p.user_id GROUP BY p.user_id"
+        )
+    return statements
+
+
+def _user_feature_stats(conn):
+    """
+    user_feature_stats: per-user running count, mean and M2 of every feature column,
+    filled from the existing rows.
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS user_feature_stats ("
+        "user_id INTEGER NOT NULL, "
+        "feature VARCHAR(64) NOT NULL, "
+        "count INTEGER NOT NULL, "
+        "mean FLOAT NOT NULL, "
+        "m2 FLOAT NOT NULL, "
+        "PRIMARY KEY (user_id, feature), "
+        "FOREIGN KEY (user_id) REFERENCES users (id))"
+    )
+    if _table_exists(conn, 'preprocessed_keystroke_data'):
+        for statement in feature_stats_rebuild_sql():
+            conn.execute(statement)
+
+
+def _preprocessed_keystroke_link(conn):
+    """
+    preprocessed_keystroke_data.keystroke_id: the raw keystrokes row a sample came from,
+    unique so preprocessing never stores a sample twice. The preprocessing watermark
+    starts after the existing keystrokes, which the routes have already preprocessed.
+    """
+    if not _table_exists(conn, 'preprocessed_keystroke_data'):
+        return
+    if 'keystroke_id' not in _columns(conn, 'preprocessed_keystroke_data'):
+        conn.execute("ALTER TABLE preprocessed_keystroke_data ADD COLUMN keystroke_id INTEGER REFERENCES keystrokes (id)")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_preprocessed_keystroke_data_keystroke_id "
+        "ON preprocessed_keystroke_data (keystroke_id)"
+    )
+    if _table_exists(conn, 'keystrokes'):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS watermarks (name VARCHAR(64) NOT NULL PRIMARY KEY, "
+            "value INTEGER NOT NULL, updated_at FLOAT)"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO watermarks (name, value, updated_at) "
+            "SELECT 'preprocessing', COALESCE(MAX(id), 0), ? FROM keystrokes",
+            (time.time(),)
+        )
+
+
+def _training_job_heartbeat(conn):
+    """
+    training_jobs.heartbeat_at: refreshed by the worker while a job runs, so only jobs of
+    dead workers are reaped.
+    """
+    if _table_exists(conn, 'training_jobs') and 'heartbeat_at' not in _columns(conn, 'training_jobs'):
+        conn.execute("ALTER TABLE training_jobs ADD COLUMN heartbeat_at FLOAT")
+
+
+# (version, name, function) in the order they are applied
+MIGRATIONS = [
+    (1, 'preprocessed_surrogate_key', _preprocessed_surrogate_key),
+    (2, 'user_feature_stats', _user_feature_stats),
+    (3, 'preprocessed_keystroke_link', _preprocessed_keystroke_link),
+    (4, 'training_job_heartbeat', _training_job_heartbeat),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path, dry_run=False):
+    """
+    Apply the pending migrations to a SQLite database file.
+
+    Returns:
+        list: Names of the migrations applied (or, with dry_run, pending).
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # Blocks other writers until the migrations are done
+        current = schema_version(conn)
+        pending = [(version, name, func) for version, name, func in MIGRATIONS if version > current]
+        if dry_run or not pending:
+            conn.execute("ROLLBACK")
+            return [name for _, name, _ in pending]
+        try:
+            for version, name, func in pending:
+                func(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                print(f"Applied database migration {version}: {name}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [name for _, name, _ in pending]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply schema migrations to the keystroke database')
+    parser.add_argument('db_path', nargs='?', default='instance/keystroke_dynamics.db')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the pending migrations')
+    args = parser.parse_args()
+
+    applied = migrate(args.db_path, dry_run=args.dry_run)
+    if not applied:
+        print("Database schema is up to date")
+    elif args.dry_run:
+        print(f"Pending migrations: {', '.join(applied)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,37 @@
 import numpy as np
-from sklearn.metrics import precision_score, recall_score, f1_score, confusion_matrix
-y_true =[3]
-def calculate_frr_far(y_true, y_pred):
-    # Check if confusion matrix can be computed properly
-    if len(set(y_true)) > 1 or len(set(y_pred)) > 1:
-        tn, fp, fn, tp = confusion_matrix(y_true, y_pred).ravel()
-        frr = fn / (fn + tp) if (fn + tp) > 0 else 0.0  # False Rejection Rate (FRR)
-        far = fp / (fp + tn) if (fp + tn) > 0 else 0.0  # False Acceptance Rate (FAR)
-    else:
-        # If there's no variation in predictions or ground truth, return default values
-        frr = 0.0
-        far = 0.0
+from sklearn.metrics import precision_score, recall_score, f1_score
+
+# Scores of more users than this times the held-out rows are processed per block of users
+BLOCK_ELEMENTS = 2_000_000
+
 
+def calculate_frr_far(y_true, y_pred, positive_class=None):
+    """
+    False rejection and false acceptance rate of the positive class (the claimed user).
+
+    With more than two classes and no positive_class, the one-vs-rest rates of every
+    class in y_true are averaged.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if positive_class is None:
+        classes = np.unique(y_true)
+        if len(classes) > 2:
+            rates = np.array([calculate_frr_far(y_true, y_pred, c) for c in classes])
+            return float(rates[:, 0].mean()), float(rates[:, 1].mean())
+        if len(np.union1d(classes, np.unique(y_pred))) < 2:
+            # If there's no variation in predictions or ground truth, return default values
+            return 0.0, 0.0
+        positive_class = np.union1d(classes, np.unique(y_pred))[-1]  # Like confusion_matrix(...).ravel()
+
+    genuine = y_true == positive_class
+    accepted = y_pred == positive_class
+    fn = np.count_nonzero(genuine & ~accepted)
+    tp = np.count_nonzero(genuine & accepted)
+    fp = np.count_nonzero(~genuine & accepted)
+    tn = np.count_nonzero(~genuine & ~accepted)
+    frr = fn / (fn + tp) if (fn + tp) > 0 else 0.0  # False Rejection Rate (FRR)
+    far = fp / (fp + tn) if (fp + tn) > 0 else 0.0  # False Acceptance Rate (FAR)
     return frr, far
 
 def evaluate_model(y_true, y_pred, user_id):  # Accept user_id as a parameter
@@ -29,8 +49,8 @@ def evaluate_model(y_true, y_pred, user_id):  # Accept user_id as a parameter
     recall = recall_score(y_true, y_pred, pos_label=positive_class, zero_division=1)
     f1 = f1_score(y_true, y_pred, pos_label=positive_class, zero_division=1)
 
-    # Calculate FRR and FAR
-    frr, far = calculate_frr_far(y_true, y_pred)
+    # Calculate FRR and FAR of the claimed user
+    frr, far = calculate_frr_far(y_true, y_pred, positive_class)
 
     # Return the metrics as a dictionary
     metrics = {
@@ -42,3 +62,124 @@ def evaluate_model(y_true, y_pred, user_id):  # Accept user_id as a parameter
     }
 
     return metrics
+
+
+def _column_blocks(rows, columns):
+    block = max(1, BLOCK_ELEMENTS // max(rows, 1))
+    for start in range(0, columns, block):
+        yield slice(start, min(start + block, columns))
+
+
+def user_error_rates(scores, y_true, classes):
+    """
+    Exact per-user EER and ROC AUC for every threshold, from one score matrix.
+
+    Every user's scores are sorted once in descending order; cumulative sums of the genuine
+    and impostor rows then give the acceptances at every threshold of every user at once.
+    Tied scores share one operating point.
+
+    Args:
+        scores (array): (rows, users), column j scores the claim "this is classes[j]".
+        y_true (array): True user of every row.
+        classes (array): User of every score column.
+
+    Returns:
+        dict: Arrays over the users: 'genuine' and 'impostor' row counts, 'eer',
+        'eer_threshold' (accept at score >= threshold) and 'auc'. NaN for users without
+        genuine or impostor rows.
+    """
+    scores = np.asarray(scores)
+    if not np.issubdtype(scores.dtype, np.floating):
+        scores = scores.astype(np.float64)
+    y_true = np.asarray(y_true)
+    classes = np.asarray(classes)
+    rows, users = scores.shape
+    result = {key: np.full(users, np.nan) for key in ('eer', 'eer_threshold', 'auc')}
+    result['genuine'] = np.zeros(users, dtype=np.int64)
+    result['impostor'] = np.zeros(users, dtype=np.int64)
+    if rows == 0:
+        return result
+
+    positions = np.arange(rows)[None, :]
+    for block in _column_blocks(rows, users):
+        # One contiguous row of scores per user, sorted descending; the sort needn't be
+        # stable because tied scores are merged below
+        user_scores = np.ascontiguousarray(scores[:, block].T)
+        order = np.argsort(-user_scores, axis=1)
+        sorted_scores = np.take_along_axis(user_scores, order, axis=1)
+        genuine = y_true[order] == classes[block, None]
+        accepted_genuine = np.cumsum(genuine, axis=1)
+        accepted_impostor = positions + 1 - accepted_genuine
+
+        # Every row of a group of equal scores takes the counts of the group's last row
+        last = np.ones_like(genuine)
+        last[:, :-1] = sorted_scores[:, :-1] != sorted_scores[:, 1:]
+        group_end = np.minimum.accumulate(np.where(last, positions, rows - 1)[:, ::-1], axis=1)[:, ::-1]
+        accepted_genuine = np.take_along_axis(accepted_genuine, group_end, axis=1)
+        accepted_impostor = np.take_along_axis(accepted_impostor, group_end, axis=1)
+
+        n_genuine = accepted_genuine[:, -1]
+        n_impostor = rows - n_genuine
+        # Operating points from a threshold above every score (accept nobody) downwards
+        start = np.zeros((len(n_genuine), 1))
+        tpr = np.hstack([start, accepted_genuine / np.maximum(n_genuine, 1)[:, None]])
+        far = np.hstack([start, accepted_impostor / np.maximum(n_impostor, 1)[:, None]])
+        frr = 1.0 - tpr
+
+        auc = np.sum(np.diff(far, axis=1) * (tpr[:, 1:] + tpr[:, :-1]) / 2, axis=1)
+
+        # EER: interpolate between the last point with FRR > FAR and the first with FRR <= FAR
+        gap = frr - far  # 1 at the top, -1 at the bottom
+        crossing = np.argmax(gap <= 0, axis=1)
+        users_in_block = np.arange(len(n_genuine))
+        before, after = gap[users_in_block, crossing - 1], gap[users_in_block, crossing]
+        weight = np.divide(before, before - after, out=np.zeros_like(before), where=before != after)
+        far_before = far[users_in_block, crossing - 1]
+        eer = far_before + weight * (far[users_in_block, crossing] - far_before)
+        eer_threshold = sorted_scores[users_in_block, crossing - 1]
+
+        valid = (n_genuine > 0) & (n_impostor > 0)
+        result['genuine'][block] = n_genuine
+        result['impostor'][block] = n_impostor
+        result['eer'][block] = np.where(valid, eer, np.nan)
+        result['eer_threshold'][block] = np.where(valid, eer_threshold, np.nan)
+        result['auc'][block] = np.where(valid, auc, np.nan)
+    return result
+
+
+def grid_error_rates(scores, y_true, classes, thresholds):
+    """
+    FAR and FRR curves of every user at fixed thresholds (accept at score >= threshold),
+    from one histogram of all scores per user instead of a comparison per threshold.
+
+    Returns:
+        tuple: (far, frr), arrays of shape (users, len(thresholds)); NaN for users without
+        impostor or genuine rows respectively.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    y_true = np.asarray(y_true)
+    classes = np.asarray(classes)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rows, users = scores.shape
+    bins = len(thresholds) + 1
+    far = np.full((users, len(thresholds)), np.nan)
+    frr = np.full((users, len(thresholds)), np.nan)
+
+    for block in _column_blocks(rows, users):
+        width = block.stop - block.start
+        # Bin b holds the scores that pass exactly the first b thresholds
+        bin_index = np.searchsorted(thresholds, scores[:, block], side='right')
+        cells = (np.arange(width)[None, :] * bins + bin_index).ravel()
+        genuine = (y_true[:, None] == classes[None, block]).ravel()
+        genuine_hist = np.bincount(cells[genuine], minlength=width * bins).reshape(width, bins)
+        impostor_hist = np.bincount(cells[~genuine], minlength=width * bins).reshape(width, bins)
+
+        # Rows accepted at threshold g are those in bins g+1 and up
+        n_genuine = genuine_hist.sum(axis=1, keepdims=True)
+        n_impostor = impostor_hist.sum(axis=1, keepdims=True)
+        rejected_genuine = np.cumsum(genuine_hist, axis=1)[:, :-1]
+        rejected_impostor = np.cumsum(impostor_hist, axis=1)[:, :-1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frr[block] = rejected_genuine / n_genuine
+            far[block] = (n_impostor - rejected_impostor) / n_impostor
+    return far, frr
@@ -0,0 +1,158 @@
+import os
+import sys
+import argparse
+import numpy as np
+from sqlalchemy import text
+from models import db
+from utils.feature_transform import FEATURE_COLUMNS
+from utils.db_migrations import feature_stats_rebuild_sql
+
+# Per-user running statistics of the feature columns, kept in user_feature_stats as
+# count, mean and M2 (sum of squared deviations from the mean) per user and feature.
+#
+# - Every route that stores preprocessed rows calls record_samples in the same
+#   transaction, so the table never disagrees with preprocessed_keystroke_data.
+# - The update is Chan's parallel form of Welford's algorithm, done in one UPSERT: the
+#   new rows of a user are summarized (count, mean, M2) and merged into the stored
+#   values. For a single row it is exactly Welford's update. It is O(1) per user and
+#   feature, needs no read first and is numerically stable.
+# - Rows written outside the app (e.g. pandas to_sql) are not counted; rebuild()
+#   recomputes the table from history and check() compares it with a full recompute.
+#   From the command line: python -m utils.feature_stats check|rebuild
+
+# Merge a batch summary into the stored values; the right-hand sides see the old values
+MERGE_SQL = text(
+    "INSERT INTO user_feature_stats (user_id, feature, count, mean, m2) "
+    "VALUES (:user_id, :feature, :count, :mean, :m2) "
+    "ON CONFLICT(user_id, feature) DO UPDATE SET "
+    "count = count + excluded.count, "
+    "mean = mean + (excluded.mean - mean) * excluded.count / (count + excluded.count), "
+    "m2 = m2 + excluded.m2 + (excluded.mean - mean) * (excluded.mean - mean) * count * excluded.count / (count + excluded.count)"
+)
+
+
+def _value(row, column):
+    return row[column] if isinstance(row, dict) else getattr(row, column)
+
+
+def summarize(rows):
+    """
+    Group preprocessed rows (dicts or PreprocessedKeystrokeData objects) by user.
+
+    Returns:
+        list: MERGE_SQL parameters, one per user and feature column.
+    """
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(int(_value(row, 'user_id')), []).append([float(_value(row, column)) for column in FEATURE_COLUMNS])
+
+    params = []
+    for user_id, values in by_user.items():
+        values = np.asarray(values, dtype=np.float64)
+        means = values.mean(axis=0)
+        m2s = ((values - means) ** 2).sum(axis=0)
+        for j, column in enumerate(FEATURE_COLUMNS):
+            params.append({'user_id': user_id, 'feature': column, 'count': len(values),
+                           'mean': float(means[j]), 'm2': float(m2s[j])})
+    return params
+
+
+def record_samples(rows, bind=None):
+    """
+    Add new preprocessed rows to the running statistics. Does not commit: call it
+    before the commit that stores the rows (bind defaults to db.session).
+    """
+    if bind is None:
+        bind = db.session
+        bind.flush()  # Fills column defaults (e.g. hold_time_variance) of pending objects
+    params = summarize(rows)
+    if params:
+        bind.execute(MERGE_SQL, params)
+
+
+def get_user_stats(user_id):
+    """
+    Running statistics of one user.
+
+    Returns:
+        dict: feature -> {'count', 'mean', 'variance'} with the population variance
+        (like np.var), empty if the user has no samples.
+    """
+    rows = db.session.execute(
+        text("SELECT feature, count, mean, m2 FROM user_feature_stats WHERE user_id = :user_id"),
+        {'user_id': user_id}
+    ).all()
+    return {
+        feature: {'count': count, 'mean': mean, 'variance': m2 / count if count else 0.0}
+        for feature, count, mean, m2 in rows
+    }
+
+
+def rebuild():
+    """
+    Recompute the table from every preprocessed row, in one transaction.
+
+    Returns:
+        int: Number of users in the rebuilt table.
+    """
+    try:
+        for statement in feature_stats_rebuild_sql():
+            db.session.execute(text(statement))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return db.session.execute(text("SELECT COUNT(DISTINCT user_id) FROM user_feature_stats")).scalar()
+
+
+def check(rtol=1e-6, atol=1e-6):
+    """
+    Compare the stored statistics with a full recompute in NumPy.
+
+    Returns:
+        list: One dict per user and feature that is missing, extra or differs; empty if all match.
+    """
+    columns = ', '.join(FEATURE_COLUMNS)
+    rows = db.session.execute(text(f"SELECT user_id, {columns} FROM preprocessed_keystroke_data")).all()
+    expected = {
+        (p['user_id'], p['feature']): p
+        for p in summarize({'user_id': row[0], **dict(zip(FEATURE_COLUMNS, row[1:]))} for row in rows)
+    }
+    stored = {
+        (user_id, feature): {'count': count, 'mean': mean, 'm2': m2}
+        for user_id, feature, count, mean, m2 in db.session.execute(
+            text("SELECT user_id, feature, count, mean, m2 FROM user_feature_stats")
+        )
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None or want['count'] != have['count'] \
+                or not np.isclose(have['mean'], want['mean'], rtol=rtol, atol=atol) \
+                or not np.isclose(have['m2'] / have['count'], want['m2'] / want['count'], rtol=rtol, atol=atol):
+            mismatches.append({'user_id': key[0], 'feature': key[1], 'expected': want, 'stored': have})
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check or rebuild the per-user feature statistics')
+    parser.add_argument('command', choices=['check', 'rebuild'])
+    parser.add_argument('--db', help='SQLite database file (default: the configured database)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.db)}'} if args.db else None)
+    with app.app_context():
+        if args.command == 'rebuild':
+            print(f"Rebuilt the feature statistics of {rebuild()} users")
+            return 0
+        mismatches = check()
+        for mismatch in mismatches[:20]:
+            print(f"Mismatch: {mismatch}")
+        print(f"{len(mismatches)} mismatching user/feature statistics")
+        return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
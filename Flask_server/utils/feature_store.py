@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from utils.feature_transform import FEATURE_COLUMNS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# On-disk, memory-mappable copy of the training matrix of preprocessed_keystroke_data:
+#
+#   <database>-features/X.f32       float32 features, one row of FEATURE_COLUMNS per sample
+#   <database>-features/y.i64       int64 user ids
+#   <database>-features/row_id.i64  int64 sample ids, ascending
+#   <database>-features/meta.json   row count, max row id and column totals the files hold
+#   <database>-features/.lock       held by the process that is syncing
+#
+# The files are raw arrays opened with np.memmap, so a training run maps them instead
+# of running SELECT * through pandas. sync() compares meta.json with the table: the
+# count and max id, plus the count and the total of every column up to the stored max
+# id. New rows are read with one narrow query and appended; anything else (deleted
+# rows, rewritten rows that change a column total, other columns) rebuilds the files.
+# A rewrite that leaves every column total unchanged goes unnoticed. Samples are only
+# ever inserted with increasing ids, so the usual case is an append of the rows since
+# the last run.
+#
+# meta.json is replaced atomically after the arrays are written and readers only map
+# meta['count'] rows, so a crash during an append leaves a valid, slightly older cache.
+# A sync, with its appends, holds an exclusive lock on .lock as well as the thread lock:
+# the training job of the app and python -m utils.offline_evaluation may sync the same
+# store from different processes.
+
+STORE_VERSION = 2  # 2: meta.json holds the column totals
+_FILES = {'X': ('X.f32', np.float32), 'y': ('y.i64', np.int64), 'row_id': ('row_id.i64', np.int64)}
+LOCK_FILE = '.lock'
+
+_lock = threading.Lock()
+_stats = {'syncs': 0, 'appended_rows': 0, 'rebuilds': 0, 'last_sync_ms': None}
+
+
+def store_dir():
+    """
+    FEATURE_STORE_DIR, or a directory next to the SQLite file of the app.
+    """
+    configured = current_app.config.get('FEATURE_STORE_DIR')
+    if configured:
+        return configured
+    return f'{db.engine.url.database}-features'
+
+
+@contextmanager
+def _store_lock(directory):
+    """
+    Exclusive lock on the store shared by every process; blocks until it is free.
+    """
+    with open(os.path.join(directory, LOCK_FILE), 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory, meta):
+    path = os.path.join(directory, 'meta.json')
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+READ_CHUNK_ROWS = 50000
+
+
+def _read_chunks(conn, after_row_id):
+    # Only the columns the matrix needs, through the raw sqlite3 cursor and in chunks,
+    # so neither SQLAlchemy rows nor the whole table are ever held in memory
+    columns = ', '.join(FEATURE_COLUMNS)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(
+            f"SELECT id, user_id, {columns} FROM preprocessed_keystroke_data WHERE id > ? ORDER BY id",
+            (after_row_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(READ_CHUNK_ROWS)
+            if not rows:
+                return
+            rows = np.array(rows, dtype=np.float64)
+            yield rows[:, 2:].astype(np.float32), rows[:, 1].astype(np.int64), rows[:, 0].astype(np.int64)
+    finally:
+        cursor.close()
+
+
+def _truncate(directory, count):
+    # Drops whatever an append that crashed before meta.json was replaced left behind
+    for key, (name, dtype) in _FILES.items():
+        width = len(FEATURE_COLUMNS) if key == 'X' else 1
+        with open(os.path.join(directory, name), 'ab') as f:
+            f.truncate(count * width * np.dtype(dtype).itemsize)
+
+
+def _append(directory, X, y, row_ids):
+    for key, array in (('X', X), ('y', y), ('row_id', row_ids)):
+        name, dtype = _FILES[key]
+        with open(os.path.join(directory, name), 'ab') as f:
+            f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _totals(conn, max_row_id):
+    # Row count and the total of every cached column up to max_row_id, in one scan
+    totals = ', '.join(f'TOTAL({column})' for column in ['user_id'] + FEATURE_COLUMNS)
+    row = conn.execute(
+        text(f"SELECT COUNT(*), {totals} FROM preprocessed_keystroke_data WHERE id <= :max_id"),
+        {'max_id': max_row_id}
+    ).one()
+    return row[0], [float(total) for total in row[1:]]
+
+
+def _sync(conn, directory, meta):
+    table_count, table_max = conn.execute(
+        text("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM preprocessed_keystroke_data")
+    ).one()
+    rebuild = (
+        meta is None
+        or meta.get('version') != STORE_VERSION
+        or meta.get('columns') != FEATURE_COLUMNS
+        or meta['max_row_id'] > table_max
+        or _totals(conn, meta['max_row_id']) != (meta['count'], meta['totals'])
+    )
+    if rebuild:
+        meta = {'version': STORE_VERSION, 'columns': FEATURE_COLUMNS, 'count': 0, 'max_row_id': 0}
+
+    appended = 0
+    if rebuild or table_count != meta['count']:
+        _truncate(directory, meta['count'])
+        max_row_id = meta['max_row_id']
+        for X, y, row_ids in _read_chunks(conn, meta['max_row_id']):
+            _append(directory, X, y, row_ids)
+            appended += len(row_ids)
+            max_row_id = int(row_ids[-1])
+        meta.update({'count': meta['count'] + appended, 'max_row_id': max_row_id, 'updated_at': time.time()})
+        meta['totals'] = _totals(conn, max_row_id)[1]
+        _write_meta(directory, meta)
+    return appended, rebuild, meta
+
+
+def sync():
+    """
+    Bring the cache up to date with preprocessed_keystroke_data.
+
+    Returns:
+        dict: 'rows' in the cache, 'appended' rows and whether it was 'rebuilt'.
+    """
+    with _lock:
+        start = time.perf_counter()
+        directory = store_dir()
+        os.makedirs(directory, exist_ok=True)
+        with _store_lock(directory):
+            # Read under the lock, another process may have just appended
+            meta = _read_meta(directory)
+            with db.engine.connect() as conn:  # Own connection, the caller's session is left alone
+                appended, rebuild, meta = _sync(conn, directory, meta)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        _stats['syncs'] += 1
+        _stats['appended_rows'] += appended
+        _stats['rebuilds'] += int(rebuild)
+        _stats['last_sync_ms'] = elapsed
+        if rebuild or appended:
+            print(f"Feature store: {'rebuilt with' if rebuild else 'appended'} {appended} rows, {meta['count']} in total")
+        return {'rows': meta['count'], 'appended': appended, 'rebuilt': rebuild}
+
+
+def load(after_row_id=0, refresh=True):
+    """
+    Memory-mapped training arrays, synced with the table first unless refresh is False.
+
+    Args:
+        after_row_id (int): Only return the rows with a larger sample id (e.g. a watermark).
+
+    Returns:
+        tuple: (X float32 of shape (rows, len(FEATURE_COLUMNS)), y int64, row_ids int64),
+        read-only views of the cache files.
+    """
+    if refresh:
+        sync()
+    directory = store_dir()
+    meta = _read_meta(directory)
+    count = meta['count'] if meta is not None else 0
+    if count == 0:
+        return (np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32),
+                np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    arrays = {}
+    for key, (name, dtype) in _FILES.items():
+        shape = (count, len(FEATURE_COLUMNS)) if key == 'X' else (count,)
+        arrays[key] = np.memmap(os.path.join(directory, name), dtype=dtype, mode='r', shape=shape)
+    start = int(np.searchsorted(arrays['row_id'], after_row_id, side='right'))
+    return arrays['X'][start:], arrays['y'][start:], arrays['row_id'][start:]
+
+
+def stats():
+    """
+    Sync counters of this process and the size of the cache.
+    """
+    meta = _read_meta(store_dir())
+    return dict(_stats, rows=meta['count'] if meta else 0, max_row_id=meta['max_row_id'] if meta else 0)
@@ -0,0 +1,57 @@
+import numpy as np
+
+# The feature-transform stage shared by training and inference. train_model fits one
+# StandardScaler on the training rows and publishes it with the models as the
+# 'feature_transform' artifact; at login the feature vector is transformed once and
+# the resulting contiguous float array is passed to every model.
+
+# Feature columns of preprocessed_keystroke_data the models are trained on
+FEATURE_COLUMNS = [
+    'press_press_interval_mean',
+    'release_interval_mean',
+    'hold_time_mean',
+    'press_press_interval_variance',
+    'release_interval_variance',
+    'hold_time_variance',
+    'backspace_count',
+    'error_rate',
+    'total_typing_time',
+    'typing_speed_cps'
+]
+
+TRANSFORM_ARTIFACT = 'feature_transform'
+
+
+def to_matrix(rows):
+    """
+    Convert feature rows (in FEATURE_COLUMNS order) into a C-contiguous float64 matrix.
+    """
+    return np.ascontiguousarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+
+
+def processed_to_vector(processed_data):
+    """
+    Build the feature vector from the dict returned by process_single_keystroke_data.
+    """
+    return [processed_data[column] for column in FEATURE_COLUMNS]
+
+
+def transform(X, artifacts):
+    """
+    Apply the published feature transform to a feature matrix.
+
+    Args:
+        X (ndarray): Raw features, shape (rows, len(FEATURE_COLUMNS)).
+        artifacts (dict): The 'artifacts' of a model set from the model registry.
+
+    Returns:
+        ndarray: C-contiguous float64 matrix the models consume. Model sets published
+        before the transform was persisted get the raw features.
+    """
+    scaler = artifacts.get(TRANSFORM_ARTIFACT)
+    if scaler is None:
+        return to_matrix(X)
+    if getattr(scaler, 'mean_', None) is not None and getattr(scaler, 'scale_', None) is not None:
+        # Same arithmetic as StandardScaler.transform without its per-call input validation
+        return np.ascontiguousarray((to_matrix(X) - scaler.mean_) / scaler.scale_)
+    return np.ascontiguousarray(scaler.transform(to_matrix(X)), dtype=np.float64)
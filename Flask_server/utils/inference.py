@@ -0,0 +1,203 @@
+import time
+import threading
+from functools import partial
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app
+
+# Runs the ensemble's predict calls for /authenticate. With INFERENCE_EXECUTOR set to
+# 'threads' the models run concurrently in a shared thread pool (sklearn releases the
+# GIL in most of its native code), and each model gets its own timeout so one slow
+# model cannot stall a login. A model that times out is reported without a prediction;
+# its call keeps running in the pool until it finishes, as threads cannot be cancelled.
+
+DEFAULT_WORKERS = 5
+DEFAULT_TIMEOUT = 1.0  # Seconds per model
+
+# Cascade mode (INFERENCE_MODE = 'cascade'): cheap models are scored first with
+# predict_proba. A stage decides when the mean probability of the claimed user is at
+# least 'accept' (valid user) or at most 'reject' (intruder); inside that uncertainty
+# band the next stage runs. When no stage decides, CASCADE_FALLBACK 'full_ensemble'
+# runs every remaining model, 'last_stage' accepts the last stage's majority.
+DEFAULT_CASCADE_STAGES = [
+    {'models': ['logistic_regression'], 'accept': 0.9, 'reject': 0.05},
+    {'models': ['neural_network'], 'accept': 0.8, 'reject': 0.1}
+]
+
+_cascade_stats = {}
+_cascade_stats_lock = threading.Lock()
+_unserved_stage_models = set()  # Stage models already warned about
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Created on first use so a pre-fork server never forks a process holding pool threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('INFERENCE_WORKERS', DEFAULT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        return _executor
+
+
+def _timed_predict(model, X):
+    start = time.perf_counter()
+    prediction = model.predict(X)
+    return prediction, (time.perf_counter() - start) * 1000
+
+
+def _model_timeout(model_name):
+    timeouts = current_app.config.get('INFERENCE_MODEL_TIMEOUTS') or {}
+    return timeouts.get(model_name, current_app.config.get('INFERENCE_TIMEOUT', DEFAULT_TIMEOUT))
+
+
+def _run_models(calls):
+    """
+    Run one call per model, sequentially or in the thread pool with per-model timeouts.
+
+    Args:
+        calls (dict): Model name -> callable without arguments returning (value, latency_ms).
+
+    Returns:
+        dict: Model name -> (value or None, {'latency_ms', 'timed_out', 'error'}), in
+        the order of calls.
+    """
+    outcomes = {}
+    if current_app.config.get('INFERENCE_EXECUTOR', 'sequential') != 'threads':
+        for model_name, call in calls.items():
+            try:
+                value, latency = call()
+                outcomes[model_name] = (value, {'latency_ms': latency, 'timed_out': False, 'error': None})
+            except Exception as e:
+                outcomes[model_name] = (None, {'latency_ms': None, 'timed_out': False, 'error': str(e)})
+        return outcomes
+
+    executor = _get_executor()
+    submitted_at = time.perf_counter()
+    futures = {model_name: executor.submit(call) for model_name, call in calls.items()}
+    for model_name, future in futures.items():
+        # Every timeout counts from submission, so waiting on one model does not eat
+        # into the budget of the models after it
+        remaining = _model_timeout(model_name) - (time.perf_counter() - submitted_at)
+        try:
+            value, latency = future.result(timeout=max(remaining, 0))
+            outcomes[model_name] = (value, {'latency_ms': latency, 'timed_out': False, 'error': None})
+        except FutureTimeoutError:
+            elapsed = (time.perf_counter() - submitted_at) * 1000
+            outcomes[model_name] = (None, {'latency_ms': elapsed, 'timed_out': True, 'error': 'Timed out'})
+        except Exception as e:
+            outcomes[model_name] = (None, {'latency_ms': None, 'timed_out': False, 'error': str(e)})
+    return outcomes
+
+
+def predict_ensemble(models, X):
+    """
+    Run predict of every model on the same input.
+
+    Args:
+        models (dict): Model name -> fitted model.
+        X (ndarray): Transformed feature matrix.
+
+    Returns:
+        dict: Model name -> {'prediction': array or None, 'latency_ms': float,
+        'timed_out': bool, 'error': str or None}, in the order of models.
+    """
+    outcomes = _run_models({model_name: partial(_timed_predict, model, X) for model_name, model in models.items()})
+    return {model_name: {'prediction': prediction, **info} for model_name, (prediction, info) in outcomes.items()}
+
+
+def latency_report(results):
+    """
+    Per-model latency in milliseconds, for debug output.
+    """
+    return {
+        model_name: (round(result['latency_ms'], 3) if result['latency_ms'] is not None else None)
+        for model_name, result in results.items()
+    }
+
+
+def _count_cascade_decision(stage_name):
+    with _cascade_stats_lock:
+        _cascade_stats[stage_name] = _cascade_stats.get(stage_name, 0) + 1
+
+
+def cascade_stats():
+    """
+    How often each cascade stage (or the fallback) made the decision in this process.
+    """
+    with _cascade_stats_lock:
+        return dict(_cascade_stats)
+
+
+def _claimed_user_probability(model, X, user_id):
+    # (probability the model gives the claimed user, label it predicts), latency
+    start = time.perf_counter()
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(X)[0]
+        prediction = model.classes_[np.argmax(probabilities)]
+        matches = np.flatnonzero(model.classes_ == user_id)
+        probability = float(probabilities[matches[0]]) if len(matches) else 0.0
+    else:
+        prediction = model.predict(X)[0]
+        probability = 1.0 if prediction == user_id else 0.0
+    return (probability, prediction), (time.perf_counter() - start) * 1000
+
+
+def predict_cascade(models, X, user_id):
+    """
+    Score a single login row stage by stage and stop at the first confident stage.
+
+    Args:
+        models (dict): Model name -> fitted model.
+        X (ndarray): Transformed feature matrix with one row.
+        user_id (int): The claimed user.
+
+    Returns:
+        tuple: (results of the models that ran, in the format of predict_ensemble,
+        {'stage': name of the deciding stage, 'decision': 'valid', 'intruder' or 'ensemble'})
+    """
+    stages = current_app.config.get('CASCADE_STAGES') or DEFAULT_CASCADE_STAGES
+    results = {}
+    probability = None
+    for index, stage in enumerate(stages):
+        stage_models = [name for name in stage['models'] if name in models]
+        for name in set(stage['models']) - set(models) - _unserved_stage_models:
+            _unserved_stage_models.add(name)
+            current_app.logger.warning("Cascade stage model %s is not served, the stage runs without it", name)
+        if not stage_models:
+            continue
+        # The stage's models run like the ensemble: concurrently and with timeouts when configured
+        outcomes = _run_models({
+            model_name: partial(_claimed_user_probability, models[model_name], X, user_id) for model_name in stage_models
+        })
+        probabilities = []
+        for model_name, (value, info) in outcomes.items():
+            if value is None:
+                results[model_name] = {'prediction': None, **info}
+                continue
+            model_probability, prediction = value
+            results[model_name] = {'prediction': np.array([prediction]), **info}
+            probabilities.append(model_probability)
+        if not probabilities:
+            continue
+
+        probability = float(np.mean(probabilities))
+        stage_name = '+'.join(stage_models)
+        if probability >= stage['accept'] or probability <= stage['reject']:
+            _count_cascade_decision(stage_name)
+            decision = 'valid' if probability >= stage['accept'] else 'intruder'
+            return results, {'stage': stage_name, 'decision': decision, 'probability': probability}
+
+    if current_app.config.get('CASCADE_FALLBACK', 'full_ensemble') == 'last_stage' and probability is not None:
+        _count_cascade_decision('last_stage')
+        decision = 'valid' if probability >= 0.5 else 'intruder'
+        return results, {'stage': 'last_stage', 'decision': decision, 'probability': probability}
+
+    # Uncertain everywhere: fall back to the full ensemble
+    remaining = {name: model for name, model in models.items() if name not in results}
+    results.update(predict_ensemble(remaining, X))
+    _count_cascade_decision('full_ensemble')
+    ordered = {name: results[name] for name in models if name in results}
+    return ordered, {'stage': 'full_ensemble', 'decision': 'ensemble', 'probability': probability}
@@ -1,45 +1,201 @@
 import os
+import copy
+import time
+import shutil
+import tempfile
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import numpy as np
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 from models import db, PreprocessedKeystrokeData, User  # Import your models
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.svm import SVC
 from sklearn.metrics import classification_report, accuracy_score
 from sklearn.neural_network import MLPClassifier  # Importing MLPClassifier
-import joblib  # Importing joblib for saving models
+from utils import model_registry  # Keeps the shared model instances current
+from utils import model_store  # Publishes versioned model sets
+from utils import feature_store  # Memory-mapped training matrix
+from utils.watermarks import get_watermark, set_watermark
+from utils.feature_transform import FEATURE_COLUMNS, TRANSFORM_ARTIFACT
+from utils.compiled_models import COMPILED_ARTIFACT, compile_models
+from flask import current_app
 from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import make_pipeline
+
+# Models that support partial_fit and are updated in incremental training mode
+INCREMENTAL_MODELS = ['SGD Classifier', 'Neural Network']
+
+TRAINING_WATERMARK = 'training'  # Highest preprocessed row id the published models have seen
+PARITY_SAMPLE_ROWS = 2000  # Older rows an incremental update checks its recompiled models on
+
+
+def build_models(forest_jobs=-1):
+    """
+    Create the untrained models, keyed by display name.
+    """
+    return {
+        'Logistic Regression': LogisticRegression(max_iter=1000, class_weight='balanced'),
+        'Random Forest': RandomForestClassifier(n_estimators=100, class_weight='balanced', n_jobs=forest_jobs),
+        'Support Vector Machine': SVC(class_weight='balanced'),
+        'Gradient Boosting': GradientBoostingClassifier(n_estimators=100),
+        'Neural Network': MLPClassifier(max_iter=1000),  # Added Neural Network
+        # Linear model that can be updated online; partial_fit does not support class_weight='balanced'
+        'SGD Classifier': SGDClassifier(loss='log_loss', random_state=42)
+    }
+
+
+def load_training_data(bind, after_row_id=0):
+    """
+    Read preprocessed rows newer than after_row_id, with their row id as 'row_id'.
+    """
+    return pd.read_sql(
+        text('SELECT rowid AS row_id, * FROM preprocessed_keystroke_data WHERE rowid > :after ORDER BY rowid'),
+        bind,
+        params={'after': after_row_id}
+    )
+
+
+def training_arrays(bind, after_row_id=0):
+    """
+    Features (FEATURE_COLUMNS order), user ids and row ids of the preprocessed rows newer
+    than after_row_id: from the feature store when FEATURE_STORE_ENABLED, which only reads
+    the rows added since its last sync, otherwise straight from the table.
+    """
+    if current_app.config.get('FEATURE_STORE_ENABLED', True):
+        return feature_store.load(after_row_id=after_row_id)
+    data = load_training_data(bind, after_row_id=after_row_id)
+    return data[FEATURE_COLUMNS].to_numpy(dtype=np.float64), data['user_id'].to_numpy(), data['row_id'].to_numpy()
+
+
+def sample_training_rows(bind, up_to_row_id, size, seed=0):
+    """
+    Features (FEATURE_COLUMNS order) of at most size random rows with ids up to
+    up_to_row_id, without reading the other rows into memory.
+    """
+    if current_app.config.get('FEATURE_STORE_ENABLED', True):
+        X, _, row_ids = feature_store.load(refresh=False)
+        count = int(np.searchsorted(row_ids, up_to_row_id, side='right'))
+        picked = np.sort(np.random.default_rng(seed).choice(count, size=min(size, count), replace=False))
+        return np.asarray(X[picked], dtype=np.float64)
+    columns = ', '.join(FEATURE_COLUMNS)
+    with bind.connect() as conn:
+        rows = conn.execute(
+            text(f'SELECT {columns} FROM preprocessed_keystroke_data WHERE rowid <= :up_to ORDER BY RANDOM() LIMIT :n'),
+            {'up_to': up_to_row_id, 'n': size}
+        ).all()
+    return np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+
+
+def partial_update_models(models, scaler, X_delta, y_delta):
+    """
+    Update copies of the incremental models with new rows only.
+
+    Args:
+        models (dict): Display name -> fitted model supporting partial_fit.
+        scaler (StandardScaler): The scaler the models were trained with (not refitted).
+        X_delta (array-like): New feature rows in FEATURE_COLUMNS order.
+        y_delta (array-like): User ids of the new rows.
+
+    Returns:
+        dict: Display name -> (updated model, {'update_time_s'}), or None if the new rows
+        contain a user the models have never seen (which needs a full rebuild).
+    """
+    X_scaled = scaler.transform(np.asarray(X_delta, dtype=np.float64))
+    updated = {}
+    for model_name, model in models.items():
+        if not np.isin(np.unique(y_delta), model.classes_).all():
+            print(f"{model_name}: new users in the update, a full rebuild is required")
+            return None
+        # The shared instances are read-only, so update a copy
+        start = time.perf_counter()
+        model = copy.deepcopy(model)
+        model.partial_fit(X_scaled, y_delta)
+        updated[model_name] = (model, {'update_time_s': time.perf_counter() - start})
+    return updated
+
+
+def _fit_and_score(model, X_train, y_train, X_test, measure_memory=False):
+    """
+    Fit one model and predict the test set, measuring wall time and, with measure_memory,
+    peak allocated memory (tracemalloc slows every allocation, so it is off by default).
+    """
+    if measure_memory:
+        tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = model.predict(X_test)
+        predict_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1] if measure_memory else None
+    finally:
+        if measure_memory:
+            tracemalloc.stop()
+
+    timing = {
+        'fit_time_s': fit_time,
+        'predict_time_s': predict_time,
+        'peak_memory_mb': peak_memory / (1024 * 1024) if peak_memory is not None else None
+    }
+    return model, y_pred, timing
+
+
+def _fit_model_worker(model, data_dir, measure_memory=False):
+    # Runs in a pool process: the matrices are memory-mapped from the files the parent
+    # wrote once, instead of being pickled to every worker
+    X_train = np.load(os.path.join(data_dir, 'X_train.npy'), mmap_mode='r')
+    y_train = np.load(os.path.join(data_dir, 'y_train.npy'), mmap_mode='r')
+    X_test = np.load(os.path.join(data_dir, 'X_test.npy'), mmap_mode='r')
+    return _fit_and_score(model, X_train, y_train, X_test, measure_memory)
+
+
+def _fit_models_parallel(models, X_train, y_train, X_test, workers, measure_memory=False):
+    """
+    Fit the models in a pool of spawned processes (TRAINING_PARALLEL).
+
+    Spawned workers import the script that started the server as their __main__, so
+    that script must only create and run the app under if __name__ == '__main__' (as
+    app.py does; wsgi.py is imported by the WSGI server, not run). Without the guard
+    every worker starts a server of its own and the pool raises BrokenProcessPool, in
+    which case train_model fits the models one by one.
+    """
+    data_dir = tempfile.mkdtemp(prefix='keystroke-train-')
+    try:
+        np.save(os.path.join(data_dir, 'X_train.npy'), X_train)
+        np.save(os.path.join(data_dir, 'y_train.npy'), y_train)
+        np.save(os.path.join(data_dir, 'X_test.npy'), X_test)
+
+        # Spawned workers do not inherit the parent's threads or open DB connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            futures = {
+                model_name: executor.submit(_fit_model_worker, model, data_dir, measure_memory)
+                for model_name, model in models.items()
+            }
+            return {model_name: future.result() for model_name, future in futures.items()}
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
 
 def train_model(preprocessed=True):
+    started_at = time.time()
+
     # Create a session
     Session = sessionmaker(bind=db.engine)
     session = Session()
 
     try:
         if preprocessed:
-            # Load preprocessed keystroke data, including new columns
-            data = pd.read_sql('SELECT * FROM preprocessed_keystroke_data', session.bind)
-
-            # Define expected columns for features
-            expected_columns = [
-                'press_press_interval_mean',
-                'release_interval_mean',
-                'hold_time_mean',
-                'press_press_interval_variance',
-                'release_interval_variance',
-                'hold_time_variance',  # New column added
-                'backspace_count',
-                'error_rate',
-                'total_typing_time',
-                'typing_speed_cps'
-            ]
-
-            # Select features and target variable
-            X = data[expected_columns]
-            y = data['user_id']  # Assuming user_id is the target variable
+            # Load the features and target variable (user_id) of the preprocessed rows
+            X, y, row_ids = training_arrays(session.bind)
+            expected_columns = FEATURE_COLUMNS
 
             print("Shape of X:", X.shape)  # Check the shape of X
 
@@ -51,39 +207,217 @@ def train_model(preprocessed=True):
         # Split data into training and testing sets
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
-        # Scale the features and keep them as DataFrames with feature names
+        # Fit the shared feature transform; it is published with the models and applied
+        # once per login, so every model is trained and queried on the same scaled arrays
         scaler = StandardScaler()
-        X_train_scaled_df = pd.DataFrame(scaler.fit_transform(X_train), columns=X_train.columns)
-        X_test_scaled_df = pd.DataFrame(scaler.transform(X_test), columns=X_test.columns)
+        X_train_scaled = scaler.fit_transform(np.asarray(X_train, dtype=np.float64))
+        X_test_scaled = scaler.transform(np.asarray(X_test, dtype=np.float64))
+
+        parallel = current_app.config.get('TRAINING_PARALLEL', False)
+        workers = current_app.config.get('TRAINING_WORKERS') or min(5, os.cpu_count() or 1)
+        # In parallel mode the cores are shared between the fits
+        forest_jobs = max(1, (os.cpu_count() or 1) // workers) if parallel else -1
+        measure_memory = current_app.config.get('TRAINING_MEASURE_MEMORY', False)
 
         # Initialize models including the Neural Network
-        models = {
-            'Logistic Regression': make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000, class_weight='balanced')),
-            'Random Forest': RandomForestClassifier(n_estimators=100, class_weight='balanced'),
-            'Support Vector Machine': SVC(class_weight='balanced'),
-            'Gradient Boosting': GradientBoostingClassifier(n_estimators=100),
-            'Neural Network': MLPClassifier(max_iter=1000)  # Added Neural Network
-        }
+        models = build_models(forest_jobs=forest_jobs)
 
-        # Train and evaluate models
+        # Train the models, concurrently in a process pool when configured
+        if parallel:
+            print(f"Training {len(models)} models in parallel with {workers} workers")
+            try:
+                fitted = _fit_models_parallel(models, X_train_scaled, np.asarray(y_train), X_test_scaled, workers,
+                                              measure_memory)
+            except BrokenProcessPool as e:
+                # Usually an entry script without an if __name__ == '__main__' guard, which
+                # every spawned worker re-runs on import
+                print(f"Parallel training failed ({e}), fitting the models one by one instead")
+                parallel = False
+                models = build_models()
+        if not parallel:
+            fitted = {
+                model_name: _fit_and_score(model, X_train_scaled, y_train, X_test_scaled, measure_memory)
+                for model_name, model in models.items()
+            }
+
+        # Evaluate models
         results = {}
-        for model_name, model in models.items():
-            model.fit(X_train_scaled_df, y_train)  # Fit using DataFrame with feature names
-            y_pred = model.predict(X_test_scaled_df)  # Predict using DataFrame
+        trained_models = {}
+        for model_name, (model, y_pred, timing) in fitted.items():
+            # Parallelism only pays off for fitting; predicting a login row on many cores is slower
+            if 'n_jobs' in model.get_params():
+                model.set_params(n_jobs=None)
             accuracy = accuracy_score(y_test, y_pred)
             report = classification_report(y_test, y_pred, zero_division=0)  # Set zero_division to avoid warnings
 
-            # Save the trained model to the "models" folder
-            model_path = os.path.join('models', f'{model_name.replace(" ", "_").lower()}.joblib')
-            joblib.dump(model, model_path)
+            trained_models[model_registry.model_file_name(model_name)] = model
 
             results[model_name] = {
                 'accuracy': accuracy,
-                'report': report
+                'report': report,
+                **timing  # fit_time_s, predict_time_s, peak_memory_mb (None unless TRAINING_MEASURE_MEMORY)
             }
 
+        # Publish all models as one version so logins never see a mix of training runs
+        watermark = int(row_ids.max()) if len(row_ids) else 0
+        manifest = {
+            'features': expected_columns,
+            'training_mode': 'full',
+            'training_rows': int(len(X)),
+            'train_rows': int(len(X_train)),
+            'test_rows': int(len(X_test)),
+            'watermark': watermark,
+            'full_watermark': watermark,  # Rows of the last full training; incremental updates keep it
+            'incremental_updates': 0,
+            'full_trained_at': time.time(),
+            'started_at': started_at,
+            'finished_at': time.time(),
+            'accuracy': {name: float(result['accuracy']) for name, result in results.items()}
+        }
+        # NumPy copies of the models for serving, checked against sklearn on every row seen here
+        compiled = compile_models(trained_models, np.vstack([X_train_scaled, X_test_scaled]))
+        manifest['compiled_models'] = sorted(compiled)
+        artifacts = {TRANSFORM_ARTIFACT: scaler, COMPILED_ARTIFACT: compiled}
+        version = model_store.publish_version(
+            trained_models,
+            manifest,
+            keep=current_app.config.get('MODEL_VERSIONS_TO_KEEP', model_store.DEFAULT_VERSIONS_TO_KEEP),
+            artifacts=artifacts,
+            size_budget_mb=current_app.config.get('MODEL_SIZE_BUDGET_MB'),
+            size_budget_action=current_app.config.get('MODEL_SIZE_BUDGET_ACTION', 'warn')
+        )
+        model_registry.activate(version, trained_models, artifacts)
+        set_watermark(TRAINING_WATERMARK, watermark)
+
         return results  # Return the results of the training
     finally:
         session.close()
 
 
+def update_models_incrementally():
+    """
+    Update the partial_fit models of the active version with the rows added since the
+    training watermark and publish the result as a new version. The other models are
+    carried over unchanged until the next full rebuild.
+
+    Returns:
+        dict: Per-model update results, or None if a full rebuild is required instead.
+    """
+    started_at = time.time()
+    model_set = model_registry.get_model_set()
+    previous = model_set['manifest']
+    scaler = model_set['artifacts'].get(TRANSFORM_ARTIFACT)
+    incremental = {name: model_set['models'].get(model_registry.model_file_name(name)) for name in INCREMENTAL_MODELS}
+    if scaler is None or any(model is None for model in incremental.values()):
+        print("Active model version cannot be updated incrementally, a full rebuild is required")
+        return None
+
+    Session = sessionmaker(bind=db.engine)
+    session = Session()
+    try:
+        watermark = get_watermark(TRAINING_WATERMARK)
+        X_delta, y_delta, delta_ids = training_arrays(session.bind, after_row_id=watermark)
+        if len(delta_ids) == 0:
+            print("No new preprocessed rows since the last training run")
+            return {}
+        # The recompiled models are checked on the new rows plus a bounded sample of the older ones
+        X_older = sample_training_rows(session.bind, watermark, PARITY_SAMPLE_ROWS)
+    finally:
+        session.close()
+
+    start = time.perf_counter()
+    updated = partial_update_models(incremental, scaler, X_delta, np.asarray(y_delta))
+    update_time = time.perf_counter() - start
+    if updated is None:
+        return None
+
+    trained_models = dict(model_set['models'])
+    for model_name, (model, _) in updated.items():
+        trained_models[model_registry.model_file_name(model_name)] = model
+
+    new_watermark = int(delta_ids.max())
+    manifest = {
+        key: value for key, value in previous.items()
+        if key not in ('version', 'models', 'artifacts', 'published_at')
+    }
+    manifest.update({
+        'training_mode': 'incremental',
+        'training_rows': previous.get('training_rows', 0) + int(len(delta_ids)),
+        'delta_rows': int(len(delta_ids)),
+        'watermark': new_watermark,
+        'incremental_updates': previous.get('incremental_updates', 0) + 1,
+        'started_at': started_at,
+        'finished_at': time.time()
+    })
+    # Recompile only the updated models, the others keep their compiled copies
+    compiled = dict(model_set['artifacts'].get(COMPILED_ARTIFACT) or {})
+    updated_names = [model_registry.model_file_name(model_name) for model_name in updated]
+    for name in updated_names:
+        compiled.pop(name, None)
+    X_check = scaler.transform(np.vstack([np.asarray(X_delta, dtype=np.float64), X_older]))
+    compiled.update(compile_models({name: trained_models[name] for name in updated_names}, X_check))
+    manifest['compiled_models'] = sorted(compiled)
+    artifacts = {TRANSFORM_ARTIFACT: scaler, COMPILED_ARTIFACT: compiled}
+    version = model_store.publish_version(
+        trained_models,
+        manifest,
+        keep=current_app.config.get('MODEL_VERSIONS_TO_KEEP', model_store.DEFAULT_VERSIONS_TO_KEEP),
+        artifacts=artifacts,
+        size_budget_mb=current_app.config.get('MODEL_SIZE_BUDGET_MB'),
+        size_budget_action=current_app.config.get('MODEL_SIZE_BUDGET_ACTION', 'warn')
+    )
+    model_registry.activate(version, trained_models, artifacts)
+    set_watermark(TRAINING_WATERMARK, new_watermark)
+
+    print(f"Incrementally updated {list(updated)} with {len(delta_ids)} rows in {update_time:.3f} s")
+    return {
+        model_name: {'rows': int(len(delta_ids)), **timing}  # update_time_s of this model
+        for model_name, (_, timing) in updated.items()
+    }
+
+
+def rollback_models(version=None):
+    """
+    Make an older retained version active again (the previous one by default) and move
+    the training watermark back to the rows that version has seen, so the next
+    incremental update feeds it the rows it was not trained on.
+
+    Returns:
+        str: The version now active.
+    """
+    version = model_store.rollback(version)
+    watermark = model_store.read_manifest(version).get('watermark')
+    if watermark is not None:
+        set_watermark(TRAINING_WATERMARK, watermark)
+    return version
+
+
+def _full_rebuild_due(manifest):
+    every = current_app.config.get('FULL_REBUILD_EVERY', 20)
+    max_age = current_app.config.get('FULL_REBUILD_MAX_AGE', 24 * 3600)
+    if manifest.get('full_trained_at') is None:
+        return True
+    if every and manifest.get('incremental_updates', 0) >= every:
+        return True
+    return bool(max_age) and time.time() - manifest['full_trained_at'] >= max_age
+
+
+def run_training():
+    """
+    Run the configured kind of training: the changed per-user verifiers when
+    VERIFICATION_ENGINE is 'per_user', an incremental update when TRAINING_MODE is
+    'incremental' and no periodic full rebuild is due, otherwise a full retrain.
+    """
+    if current_app.config.get('VERIFICATION_ENGINE', 'ensemble') == 'per_user':
+        from utils.user_verifiers import train_user_verifiers  # user_verifiers imports this module
+        return train_user_verifiers()
+
+    if current_app.config.get('TRAINING_MODE', 'full') == 'incremental':
+        model_set = model_registry.get_model_set()
+        if not _full_rebuild_due(model_set['manifest']):
+            results = update_models_incrementally()
+            if results is not None:
+                return results
+    return train_model()
+
+
@@ -0,0 +1,278 @@
+import os
+import time
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from utils import model_store
+from utils.compiled_models import COMPILED_ARTIFACT
+
+# This module keeps a single in-process copy of the active model set so the routes
+# do not have to unpickle the artifacts from the "models" folder on every request.
+# The models handed out by the registry are shared between requests and threads,
+# so callers must treat them as read-only (predict only, never fit).
+#
+# The registry follows models/CURRENT: when another process publishes or rolls back
+# a version, the next request that notices it loads the new set and swaps it in as
+# a whole, so a request always sees models from a single training run.
+#
+# Artifacts are loaded with joblib's mmap_mode (MODEL_MMAP_MODE, 'r' by default), so
+# their NumPy arrays stay backed by the files in models/versions and are shared by
+# all worker processes. Mapped arrays are read-only, another reason never to fit them.
+# The flat legacy files predate the versioned layout (and may be compressed or written
+# by an older joblib without aligned arrays), so they are loaded without mmap.
+#
+# Each model is loaded on its own: one that cannot be unpickled (e.g. written by an
+# incompatible scikit-learn version) is logged and left out of the set, which is only
+# rejected when none of its models load.
+
+# Model names in the order they are trained and reported
+MODEL_NAMES = [
+    'logistic_regression',
+    'random_forest',
+    'support_vector_machine',
+    'gradient_boosting',
+    'neural_network'
+]
+
+# Trained for incremental updates rather than to vote; served only with SERVE_SGD_CLASSIFIER
+TRAINING_ONLY_MODELS = ['sgd_classifier']
+
+# Seconds between checks of models/CURRENT for a newly published version
+RELOAD_CHECK_INTERVAL = 1.0
+
+LEGACY_VERSION = 'legacy'  # Flat models/<name>.joblib files from before versioning
+
+DEFAULT_MMAP_MODE = 'r'
+
+_lock = threading.Lock()
+_active = None  # {'version', 'marker', 'manifest', 'models', 'artifacts', 'info'}
+_last_check = 0.0
+
+
+def model_file_name(model_name):
+    """
+    Convert a display name such as 'Random Forest' into the artifact name 'random_forest'.
+    """
+    return model_name.replace(' ', '_').lower()
+
+
+def _mmap_mode():
+    if has_app_context():
+        return current_app.config.get('MODEL_MMAP_MODE', DEFAULT_MMAP_MODE)
+    return DEFAULT_MMAP_MODE
+
+
+def process_rss_bytes():
+    """
+    Resident set size of this process, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def mapped_bytes(obj, _seen=None):
+    """
+    Total size of the memory-mapped arrays reachable from a loaded artifact. These
+    pages live in the shared page cache rather than in the process's private memory.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.memmap):
+        return obj.nbytes
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return sum(mapped_bytes(item, seen) for item in obj.ravel())
+        return 0
+    if isinstance(obj, dict):
+        return sum(mapped_bytes(value, seen) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(mapped_bytes(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return mapped_bytes(vars(obj), seen)
+    return 0
+
+
+def _load_artifact(path, version, mmap=True):
+    import joblib  # Deferred until the first model load, like the sklearn modules it unpickles
+    rss_before = process_rss_bytes()
+    start = time.perf_counter()
+    model = joblib.load(path, mmap_mode=_mmap_mode() if mmap else None)
+    load_time = time.perf_counter() - start
+    rss_after = process_rss_bytes()
+    info = {
+        'path': path,
+        'size_bytes': os.path.getsize(path),
+        'mapped_bytes': mapped_bytes(model),  # Shared with the other workers
+        # Private memory the load added to this process (approximate, includes allocator noise)
+        'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        'load_time_ms': load_time * 1000,
+        'version': version,
+        'loaded_at': time.time()
+    }
+    return model, info
+
+
+def _load_model_set(marker):
+    version = model_store.current_version()
+    artifacts = {}
+    if version is None:
+        # Nothing published yet, fall back to the flat artifacts
+        version = LEGACY_VERSION
+        manifest = {}
+        paths = {name: os.path.join(model_store.models_dir(), f'{name}.joblib') for name in MODEL_NAMES}
+    else:
+        manifest = model_store.read_manifest(version)
+        paths = {
+            name: os.path.join(model_store.version_dir(version), entry['file'])
+            for name, entry in manifest['models'].items()
+        }
+        for name, entry in manifest.get('artifacts', {}).items():
+            artifacts[name], _ = _load_artifact(os.path.join(model_store.version_dir(version), entry['file']), version)
+
+    models = {}
+    info = {}
+    failed = {}
+    for name, path in paths.items():
+        try:
+            models[name], info[name] = _load_artifact(path, version, mmap=version != LEGACY_VERSION)
+        except Exception as e:
+            failed[name] = str(e)
+            print(f"Model registry: skipped {name} ({version}), could not load it: {e}")
+            continue
+        print(f"Model registry: loaded {name} ({version}) in {info[name]['load_time_ms']:.1f} ms")
+    if not models:
+        raise RuntimeError(f"No model of version {version} could be loaded")
+
+    return {
+        'version': version,
+        'marker': marker,
+        'manifest': manifest,
+        'models': models,
+        'artifacts': artifacts,
+        'info': info,
+        'failed': failed
+    }
+
+
+def _refresh():
+    global _active, _last_check
+    now = time.monotonic()
+    if _active is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return
+    _last_check = now
+    marker = model_store.current_marker()
+    if _active is not None and marker == _active['marker']:
+        return
+
+    with _lock:
+        if _active is not None and marker == _active['marker']:
+            return
+        try:
+            model_set = _load_model_set(marker)
+        except Exception as e:
+            if _active is None:
+                raise
+            # Keep serving the models we already have
+            print(f"Model registry: could not load new model version: {e}")
+            return
+        _active = model_set  # Single reference swap, readers keep their old snapshot
+
+
+def get_model_set():
+    """
+    Return the active model set as a consistent snapshot:
+    {'version', 'manifest', 'models', 'artifacts', 'info', 'failed'}.
+    """
+    _refresh()
+    return _active
+
+
+def get_models():
+    """
+    Return a dict of every trained model keyed by artifact name, in training order.
+    """
+    return get_model_set()['models']
+
+
+def get_model(name):
+    """
+    Return the shared instance of a trained model from the active version.
+    """
+    return get_models()[name]
+
+
+def serving_models(model_set, compiled=True):
+    """
+    Return the models to predict with: the compiled NumPy predictor where the set has
+    one (see utils/compiled_models.py), otherwise the sklearn model. TRAINING_ONLY_MODELS
+    are left out unless SERVE_SGD_CLASSIFIER is set.
+    """
+    compiled_models = (model_set['artifacts'].get(COMPILED_ARTIFACT) or {}) if compiled else {}
+    serve_sgd = has_app_context() and current_app.config.get('SERVE_SGD_CLASSIFIER', False)
+    return {
+        name: compiled_models.get(name, model) for name, model in model_set['models'].items()
+        if serve_sgd or name not in TRAINING_ONLY_MODELS
+    }
+
+
+def activate(version, models, artifacts=None):
+    """
+    Make a version this process just published active without reloading it from disk.
+    """
+    global _active, _last_check
+    manifest = model_store.read_manifest(version)
+    model_set = {
+        'version': version,
+        'marker': model_store.current_marker(),
+        'manifest': manifest,
+        'models': dict(models),
+        'artifacts': dict(artifacts or {}),
+        'info': {},
+        'failed': {}
+    }
+    for name, entry in manifest['models'].items():
+        model_set['info'][name] = {
+            'path': os.path.join(model_store.version_dir(version), entry['file']),
+            'size_bytes': entry['size_bytes'],
+            'mapped_bytes': 0,  # Trained in this process, held in private memory
+            'rss_delta_bytes': None,
+            'load_time_ms': 0.0,  # Trained in this process, never unpickled
+            'version': version,
+            'loaded_at': time.time()
+        }
+    with _lock:
+        _active = model_set
+        _last_check = time.monotonic()
+
+
+def clear():
+    """
+    Drop the loaded models so the next access reloads them from disk.
+    """
+    global _active
+    with _lock:
+        _active = None
+
+
+def model_info():
+    """
+    Return load time, artifact size, memory use and loaded version of every model in
+    the registry, the models that could not be loaded, plus the resident set size of
+    this process.
+    """
+    model_set = _active
+    if model_set is None:
+        return {'version': None, 'models': {}, 'process_rss_bytes': process_rss_bytes()}
+    return {
+        'version': model_set['version'],
+        'models': model_set['info'],
+        'size_bytes': sum(entry['size_bytes'] for entry in model_set['info'].values()),
+        'failed': model_set['failed'],
+        'process_rss_bytes': process_rss_bytes(),
+        'compiled': sorted(model_set['artifacts'].get(COMPILED_ARTIFACT) or {})
+    }
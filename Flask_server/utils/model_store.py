@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import shutil
+import datetime
+from flask import current_app, has_app_context
+
+# This module stores every training run as a versioned model set:
+#
+#   models/versions/<version>/<model>.joblib
+#   models/versions/<version>/manifest.json
+#   models/CURRENT                      <- name of the active version
+#
+# The "models" folder is MODELS_DIR of the app config (relative to the working
+# directory), so tests and side-by-side deployments can keep their own model sets.
+#
+# A set is written to a temporary directory first and renamed into place once it is
+# complete, and CURRENT is replaced atomically, so a reader never sees a half-written
+# model or a mix of two training runs. Older versions are kept for rollback. The
+# temporary directory of a publish that was killed is removed by a later prune.
+#
+# Artifacts are written uncompressed so the model registry can load them with
+# joblib's mmap_mode: the large NumPy arrays are then mapped from the file and shared
+# through the page cache by every worker process instead of copied into each one.
+
+DEFAULT_MODELS_DIR = 'models'
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_VERSIONS_TO_KEEP = 3
+TMP_GRACE_SECONDS = 3600  # Age after which a .tmp-<version> directory is an abandoned publish
+
+
+def _new_version_id():
+    # Sortable UTC timestamp, unique enough for one training job at a time
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+
+def models_dir():
+    """
+    MODELS_DIR of the current app, or the default folder outside an app context.
+    """
+    if has_app_context():
+        return current_app.config.get('MODELS_DIR') or DEFAULT_MODELS_DIR
+    return DEFAULT_MODELS_DIR
+
+
+def versions_dir():
+    return os.path.join(models_dir(), 'versions')
+
+
+def _current_file():
+    return os.path.join(models_dir(), 'CURRENT')
+
+
+def version_dir(version):
+    return os.path.join(versions_dir(), version)
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)  # Atomic on POSIX and Windows
+
+
+def current_version():
+    """
+    Return the name of the active model version, or None if nothing was published yet.
+    """
+    try:
+        with open(_current_file()) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def current_marker():
+    """
+    Return a cheap token that changes whenever CURRENT is replaced.
+    """
+    path = _current_file()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size, st.st_ino)  # The path, so a different MODELS_DIR reloads too
+
+
+def read_manifest(version):
+    with open(os.path.join(version_dir(version), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def list_versions():
+    """
+    Return the complete (published) model versions, oldest first.
+    """
+    directory = versions_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        name for name in os.listdir(directory)
+        if not name.startswith('.')
+        and os.path.exists(os.path.join(directory, name, MANIFEST_NAME))
+    )
+
+
+def set_current(version):
+    """
+    Atomically switch the active model set to an already published version.
+    """
+    if version not in list_versions():
+        raise ValueError(f"Unknown model version: {version}")
+    _write_atomic(_current_file(), version)
+
+
+def _dump_all(objects, directory):
+    import joblib  # Only needed when publishing, not at import time
+    files = {}
+    for name, obj in objects.items():
+        file_name = f'{name}.joblib'
+        joblib.dump(obj, os.path.join(directory, file_name), compress=0)  # Compressed files cannot be memory-mapped
+        files[name] = {
+            'file': file_name,
+            'size_bytes': os.path.getsize(os.path.join(directory, file_name))
+        }
+    return files
+
+
+def check_size_budget(files, budget_mb, action='warn'):
+    """
+    Compare the total size of a model set with its budget.
+
+    Args:
+        files (dict): Artifact name -> {'file', 'size_bytes'} as written by _dump_all.
+        budget_mb (float): Allowed total size in megabytes, None to disable the check.
+        action (str): 'warn' prints a warning, 'fail' raises ValueError.
+
+    Returns:
+        str: The warning message, or None if the set is within budget.
+    """
+    if budget_mb is None:
+        return None
+    total = sum(entry['size_bytes'] for entry in files.values())
+    if total <= budget_mb * 1024 * 1024:
+        return None
+    largest = sorted(files.items(), key=lambda item: item[1]['size_bytes'], reverse=True)[:3]
+    largest = ', '.join(f"{name} {entry['size_bytes'] / (1024 * 1024):.1f} MB" for name, entry in largest)
+    message = f"Model set is {total / (1024 * 1024):.1f} MB, over the budget of {budget_mb} MB (largest: {largest})"
+    if action == 'fail':
+        raise ValueError(message)
+    print(f"Warning: {message}")
+    return message
+
+
+def publish_version(models, manifest, keep=DEFAULT_VERSIONS_TO_KEEP, artifacts=None,
+                    size_budget_mb=None, size_budget_action='warn'):
+    """
+    Write a complete model set plus its manifest and make it the active version.
+
+    Args:
+        models (dict): Artifact name -> fitted model.
+        manifest (dict): Training metadata (features, row counts, timestamps, ...).
+        keep (int): Number of published versions to retain, including the new one.
+        artifacts (dict): Other fitted objects the models depend on, such as the scaler.
+        size_budget_mb (float): Allowed size of the whole set, None for no limit.
+        size_budget_action (str): 'warn' publishes anyway, 'fail' raises ValueError
+            and leaves the active version unchanged.
+
+    Returns:
+        str: The new version name.
+    """
+    os.makedirs(versions_dir(), exist_ok=True)
+    version = _new_version_id()
+    tmp_dir = os.path.join(versions_dir(), f'.tmp-{version}')
+    os.makedirs(tmp_dir)
+
+    try:
+        manifest = dict(manifest)
+        manifest['version'] = version
+        manifest['models'] = _dump_all(models, tmp_dir)
+        manifest['artifacts'] = _dump_all(artifacts or {}, tmp_dir)
+        files = {**manifest['models'], **manifest['artifacts']}
+        manifest['size_bytes'] = sum(entry['size_bytes'] for entry in files.values())
+        manifest['size_budget_warning'] = check_size_budget(files, size_budget_mb, size_budget_action)
+        manifest['published_at'] = time.time()
+        _write_atomic(os.path.join(tmp_dir, MANIFEST_NAME), json.dumps(manifest, indent=2))
+
+        # The directory only appears under its final name once every file is written
+        os.rename(tmp_dir, version_dir(version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    set_current(version)
+    prune_versions(keep)
+    print(f"Published model version {version}")
+    return version
+
+
+def previous_version():
+    """
+    Return the version published before the active one, if it is still retained.
+    """
+    versions = list_versions()
+    current = current_version()
+    if current not in versions:
+        return versions[-1] if versions else None
+    index = versions.index(current)
+    return versions[index - 1] if index > 0 else None
+
+
+def rollback(version=None):
+    """
+    Make an older retained version active again (the previous one by default).
+    """
+    target = version or previous_version()
+    if target is None:
+        raise ValueError("No older model version is available for rollback")
+    set_current(target)
+    print(f"Rolled back to model version {target}")
+    return target
+
+
+def prune_versions(keep=DEFAULT_VERSIONS_TO_KEEP, tmp_grace=TMP_GRACE_SECONDS):
+    """
+    Delete the oldest versions beyond the retention count, never the active one, and
+    the temporary directories of publishes that were killed more than tmp_grace
+    seconds ago. Younger ones may belong to a publish still in progress.
+    """
+    keep = max(int(keep), 2)  # Always retain one version to roll back to
+    current = current_version()
+    versions = list_versions()
+    for version in versions[:-keep]:
+        if version != current:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+
+    directory = versions_dir()
+    if not os.path.isdir(directory):
+        return
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith('.tmp-'):
+            continue
+        try:
+            abandoned = now - os.path.getmtime(path) > tmp_grace
+        except FileNotFoundError:  # Renamed into place meanwhile
+            continue
+        if abandoned:
+            print(f"Removing abandoned model publish {name}")
+            shutil.rmtree(path, ignore_errors=True)
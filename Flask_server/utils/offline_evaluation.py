@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from flask import current_app
+from sklearn.model_selection import train_test_split
+from models import db
+from utils import model_registry
+from utils import model_store
+from utils.ml_utils import training_arrays
+from utils.feature_transform import TRANSFORM_ARTIFACT
+from utils.evaluate_metrics import user_error_rates, grid_error_rates
+
+# Offline FAR/FRR/EER evaluation of the active model version.
+#
+# Every model scores the held-out rows once (predict_proba, or decision_function where
+# a model has no probabilities), giving a (rows, users) score matrix whose column j is
+# the claim "this is user j". utils/evaluate_metrics.py then derives the exact EER and
+# ROC AUC of every user from one sort per column, and the FAR/FRR curves on a fixed
+# threshold grid from one histogram per column, so nothing loops over users or
+# thresholds in Python. Run it from the Flask_server folder:
+#
+#   python -m utils.offline_evaluation [--holdout split|new] [--out report.json] [--curves curves.npz]
+#
+# The report goes next to the manifest of the evaluated version by default.
+
+REPORT_NAME = 'evaluation.json'
+USER_FIELDS = ['user_id', 'genuine', 'impostor', 'eer', 'eer_threshold', 'auc']
+GRID_SIZE = 101
+
+
+def holdout_set(manifest, holdout='split'):
+    """
+    Rows the version was not trained on.
+
+    Args:
+        manifest (dict): Manifest of the evaluated version.
+        holdout (str): 'split' repeats the test split of the last full training,
+            'new' takes the rows added after the version's watermark.
+
+    Returns:
+        tuple: (X, y) of the held-out rows.
+    """
+    X, y, row_ids = training_arrays(db.engine)
+    if holdout == 'new':
+        keep = row_ids > manifest.get('watermark', 0)
+        return np.asarray(X[keep], dtype=np.float64), np.asarray(y[keep])
+    if holdout != 'split':
+        raise ValueError(f"Unknown holdout {holdout!r}, expected 'split' or 'new'")
+    # Same rows and the same split call as train_model; rows added by incremental updates
+    # are left out because the partial_fit models trained on all of them
+    trained = row_ids <= manifest.get('full_watermark', manifest.get('watermark', 0))
+    _, X_test, _, y_test = train_test_split(
+        np.asarray(X[trained], dtype=np.float64), np.asarray(y[trained]), test_size=0.2, random_state=42
+    )
+    return X_test, y_test
+
+
+def score_matrix(model, fallback, X):
+    """
+    Scores of every row for every class of the model, higher meaning more likely.
+
+    Returns:
+        tuple: (scores of shape (rows, classes), classes).
+    """
+    for candidate in (model, fallback):
+        for method in ('predict_proba', 'decision_function'):
+            if hasattr(candidate, method):
+                scores = np.asarray(getattr(candidate, method)(X), dtype=np.float64)
+                if scores.ndim == 1:  # Binary decision_function scores the second class
+                    scores = np.column_stack([-scores, scores])
+                return scores, np.asarray(candidate.classes_)
+    raise TypeError(f"{type(model).__name__} has neither predict_proba nor decision_function")
+
+
+def threshold_grid(scores):
+    # Probabilities share one fixed grid, other scores use their own quantiles
+    if len(scores) and scores.min() >= 0 and scores.max() <= 1:
+        return np.linspace(0, 1, GRID_SIZE)
+    return np.unique(np.quantile(scores, np.linspace(0, 1, GRID_SIZE)))
+
+
+def _rounded(values, digits=4):
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+def evaluate_scores(scores, y_true, classes):
+    """
+    Compact report of one model's score matrix, plus its full threshold-grid curves.
+    """
+    start = time.perf_counter()
+    rates = user_error_rates(scores, y_true, classes)
+    thresholds = threshold_grid(scores)
+    far, frr = grid_error_rates(scores, y_true, classes, thresholds)
+    metrics_time = time.perf_counter() - start
+
+    evaluated = ~np.isnan(rates['eer'])  # Users with genuine and impostor rows
+    eer = rates['eer'][evaluated]
+    report = {
+        'users': int(len(classes)),
+        'users_evaluated': int(evaluated.sum()),
+        'eer': {
+            'mean': float(eer.mean()) if len(eer) else None,
+            'median': float(np.median(eer)) if len(eer) else None,
+            'p90': float(np.percentile(eer, 90)) if len(eer) else None
+        },
+        'auc_mean': float(rates['auc'][evaluated].mean()) if len(eer) else None,
+        # Macro average over the users of the FAR/FRR curves
+        'thresholds': _rounded(thresholds, 6),
+        'far': _rounded(far[evaluated].mean(axis=0)) if len(eer) else None,
+        'frr': _rounded(frr[evaluated].mean(axis=0)) if len(eer) else None,
+        'metrics_time_s': metrics_time,
+        'user_fields': USER_FIELDS,
+        'per_user': [
+            [int(user), int(genuine), int(impostor)] + _rounded([user_eer, threshold, auc], 6)
+            for user, genuine, impostor, user_eer, threshold, auc in zip(
+                classes, rates['genuine'], rates['impostor'], rates['eer'], rates['eer_threshold'], rates['auc']
+            )
+        ]
+    }
+    return report, {'thresholds': thresholds, 'far': far, 'frr': frr}
+
+
+def evaluate(holdout='split', model_names=None):
+    """
+    Evaluate the active model version on its held-out rows.
+
+    Returns:
+        tuple: (report dict, curves dict of numpy arrays keyed '<model>/<array>').
+    """
+    model_set = model_registry.get_model_set()
+    manifest = model_set['manifest']
+    X, y = holdout_set(manifest, holdout)
+    scaler = model_set['artifacts'].get(TRANSFORM_ARTIFACT)
+    if scaler is not None and len(X):
+        X = scaler.transform(X)
+    serving = model_registry.serving_models(model_set, compiled=current_app.config.get('USE_COMPILED_MODELS', True))
+
+    report = {
+        'version': model_set['version'],
+        'holdout': holdout,
+        'rows': int(len(X)),
+        'created_at': time.time(),
+        'models': {}
+    }
+    curves = {}
+    if len(X) == 0:
+        print(f"Offline evaluation: no held-out rows for holdout '{holdout}'")
+        return report, curves
+
+    for name, model in serving.items():
+        if model_names and name not in model_names:
+            continue
+        start = time.perf_counter()
+        scores, classes = score_matrix(model, model_set['models'][name], X)
+        score_time = time.perf_counter() - start
+        model_report, model_curves = evaluate_scores(scores, y, classes)
+        model_report['score_time_s'] = score_time
+        report['models'][name] = model_report
+        curves.update({f'{name}/{key}': value for key, value in model_curves.items()})
+        print(f"Offline evaluation: {name} mean EER {model_report['eer']['mean']} over "
+              f"{model_report['users_evaluated']} users in {score_time + model_report['metrics_time_s']:.2f} s")
+    return report, curves
+
+
+def write_report(report, path=None):
+    """
+    Write the report as compact JSON, by default next to the evaluated version's manifest.
+    """
+    if path is None:
+        directory = model_store.version_dir(report['version'])
+        # Models from before versioning have no folder of their own
+        path = os.path.join(directory if os.path.isdir(directory) else model_store.models_dir(), REPORT_NAME)
+    with open(path, 'w') as f:
+        json.dump(report, f, separators=(',', ':'))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-user FAR/FRR/EER of the active model version')
+    parser.add_argument('--holdout', choices=['split', 'new'], default='split',
+                        help="'split': test split of the last full training, 'new': rows added since")
+    parser.add_argument('--models', nargs='*', help='Model names to evaluate (default: all)')
+    parser.add_argument('--out', help=f'Report file (default: {REPORT_NAME} in the version folder)')
+    parser.add_argument('--curves', help='Also save the per-user FAR/FRR curves to this .npz file')
+    parser.add_argument('--db', help='SQLite database file (default: the configured database)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.db)}'} if args.db else None)
+    with app.app_context():
+        report, curves = evaluate(args.holdout, args.models)
+        print(f"Wrote {write_report(report, args.out)}")
+        if args.curves:
+            np.savez_compressed(args.curves, **curves)
+            print(f"Wrote {args.curves}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,15 @@
-import pandas as pd
-import numpy as np
-from sqlalchemy.orm import sessionmaker
-from sklearn.preprocessing import StandardScaler
-from scipy import stats
 import ast
-from models import db, Keystroke  # Ensure you import your Keystroke model
+import time
+import numpy as np
+from flask import current_app
+from sqlalchemy import text
+from models import db, PreprocessedKeystrokeData
+from utils import feature_stats
+from utils import training_scheduler
+from utils import user_cache
+from utils.watermarks import get_watermark, set_watermark
+from utils.calculate_features import ragged_mean_var
+from utils.timing_codec import decode_timings
 
 
 def convert_to_float_list(string_list):
@@ -27,79 +32,114 @@ def convert_to_float_list_sec(input_data):
         print(f"Error converting to float list: {e}")
         return []
 
-def preprocess_keystroke_data():
-    # Step 1: Create a new SQLAlchemy session using the existing db instance
-    Session = sessionmaker(bind=db.engine)
-    session = Session()
 
-    try:
-        # Step 2: Query the database using SQLAlchemy
-        keystroke_data = session.query(
-            Keystroke.user_id,
-            Keystroke.key_press_times,
-            Keystroke.key_release_times,
-            Keystroke.backspace_count,
-            Keystroke.error_rate
-        ).all()
-
-        # Convert SQLAlchemy query result into a pandas DataFrame
-        data = pd.DataFrame(keystroke_data, columns=['user_id', 'key_press_times', 'key_release_times', 'backspace_count', 'error_rate'])
-        print("Data before preprocessing:")
-        print(data[['key_press_times', 'key_release_times', 'backspace_count', 'error_rate']].head())
-        print(data.dtypes)
-
-        # Step 3: Convert key press and release times from comma-separated strings to lists of floats
-
-
-        data['key_press_times'] = data['key_press_times'].apply(convert_to_float_list)
-        data['key_release_times'] = data['key_release_times'].apply(convert_to_float_list)
-
-        # Step 4: Calculate metrics from the key press and release times for each session
-        data['press_time_mean'] = data['key_press_times'].apply(lambda x: np.mean(x) if x else 0)
-        data['release_time_mean'] = data['key_release_times'].apply(lambda x: np.mean(x) if x else 0)
-        data['interval_time_mean'] = data.apply(lambda row: np.mean(np.diff(row['key_press_times'])) if len(row['key_press_times']) > 1 else 0, axis=1)
-        data['press_time_variance'] = data['key_press_times'].apply(lambda x: np.var(x) if x else 0)
-        data['release_time_variance'] = data['key_release_times'].apply(lambda x: np.var(x) if x else 0)
-        data['interval_time_variance'] = data.apply(lambda row: np.var(np.diff(row['key_press_times'])) if len(row['key_press_times']) > 1 else 0, axis=1)
-
-        # Step 5: Handle Missing Values
-        data['press_time_mean'].fillna(data['press_time_mean'].median(), inplace=True)
-        data['release_time_mean'].fillna(data['release_time_mean'].median(), inplace=True)
-        data['interval_time_mean'].fillna(data['interval_time_mean'].median(), inplace=True)
-        data['backspace_count'].fillna(0, inplace=True)  # Assume no backspace if data is missing
-        data['error_rate'].fillna(data['error_rate'].median(), inplace=True)
-
-        # Step 6: Outlier Detection and Removal
-        z_scores = np.abs(stats.zscore(data[['press_time_mean', 'release_time_mean', 'interval_time_mean', 'backspace_count', 'error_rate']].fillna(0)))
-        data_cleaned = data[(z_scores < 3).all(axis=1)].copy()  # Use .copy() to avoid setting values on a slice
-        print("Shape of data after outlier removal:", data_cleaned.shape)
-
-        # Step 7: Feature Scaling and Normalization (Optional)
-        if data_cleaned.empty:
-            print("data_cleaned is empty. Cannot scale.")
-        else:
-            scaler = StandardScaler()
-            data_cleaned[['press_time_mean', 'release_time_mean', 'interval_time_mean']] = scaler.fit_transform(
-                data_cleaned[['press_time_mean', 'release_time_mean', 'interval_time_mean']]
+PREPROCESS_WATERMARK = 'preprocessing'  # Highest keystrokes id already preprocessed
+DEFAULT_CHUNK_SIZE = 1000
+
+# Keystrokes past the watermark, with the id of the sample already computed from them (if any)
+_CHUNK_SQL = text(
+    "SELECT k.id, k.user_id, k.press_press_intervals, k.release_press_intervals, k.hold_times, "
+    "k.total_typing_time, k.typing_speed, k.backspace_count, k.error_rate, p.id "
+    "FROM keystrokes k LEFT JOIN preprocessed_keystroke_data p ON p.keystroke_id = k.id "
+    "WHERE k.id > :after ORDER BY k.id LIMIT :limit"
+)
+
+
+def _preprocess_chunk(rows):
+    """
+    Compute the preprocessed rows of a chunk of keystrokes rows in one vectorized pass.
+    Rows whose interval lists cannot be parsed are skipped.
+
+    Returns:
+        tuple: (list of preprocessed_keystroke_data dicts, number of skipped rows)
+    """
+    parsed, skipped = [], 0
+    for row in rows:
+        try:
+            parsed.append((row, decode_timings(row[2]), decode_timings(row[3]), decode_timings(row[4])))
+        except (TypeError, ValueError) as e:
+            print(f"Skipping keystrokes row {row[0]}: {e}")
+            skipped += 1
+    if not parsed:
+        return [], skipped
+
+    pp_mean, pp_var = ragged_mean_var([entry[1] for entry in parsed])
+    rp_mean, rp_var = ragged_mean_var([entry[2] for entry in parsed])
+    hold_mean, hold_var = ragged_mean_var([entry[3] for entry in parsed])
+    now = time.time()
+    entries = [
+        {
+            'user_id': row[1],
+            'keystroke_id': row[0],
+            'press_press_interval_mean': float(pp_mean[k]),
+            'release_interval_mean': float(rp_mean[k]),
+            'hold_time_mean': float(hold_mean[k]),
+            'press_press_interval_variance': float(pp_var[k]),
+            'release_interval_variance': float(rp_var[k]),
+            'hold_time_variance': float(hold_var[k]),
+            'backspace_count': row[7] or 0,
+            'error_rate': row[8] or 0.0,
+            'total_typing_time': row[5] or 0.0,
+            'typing_speed_cps': row[6] or 0.0,
+            'created_at': now
+        }
+        for k, (row, _, _, _) in enumerate(parsed)
+    ]
+    return entries, skipped
+
+
+def preprocess_keystroke_data(chunk_size=None):
+    """
+    Preprocess the keystrokes rows added since the last run, chunk by chunk.
+
+    Each chunk is one transaction that inserts the new samples, updates the feature
+    statistics and moves the watermark, so a failed run resumes after the last
+    committed chunk. Keystrokes that already have a sample (the routes store both) are
+    skipped, and keystroke_id is unique, so a rerun never stores a sample twice.
+
+    Returns:
+        dict: Counts of rows read, samples inserted, rows skipped and chunks, plus the watermark.
+    """
+    if chunk_size is None:
+        chunk_size = current_app.config.get('PREPROCESS_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    summary = {'read': 0, 'inserted': 0, 'already_preprocessed': 0, 'invalid': 0, 'chunks': 0}
+
+    while True:
+        try:
+            # Take the write lock first, so concurrent runs process one chunk after the other
+            db.session.execute(
+                text("INSERT OR IGNORE INTO watermarks (name, value, updated_at) VALUES (:name, 0, :now)"),
+                {'name': PREPROCESS_WATERMARK, 'now': time.time()}
             )
-
-        # Step 8: Feature Extraction - Press to Release Ratio
-        data_cleaned['press_to_release_ratio'] = data_cleaned['press_time_mean'] / data_cleaned['release_time_mean']
-
-        # Step 9: Prepare Session Data for Insertion
-        session_data = data_cleaned[['user_id', 'press_time_mean', 'release_time_mean', 
-                                     'interval_time_mean', 'press_time_variance', 'release_time_variance', 
-                                     'interval_time_variance', 'backspace_count', 'error_rate', 'press_to_release_ratio']].copy()
-
-        # Step 10: Save Preprocessed Data into the 'preprocessed_keystroke_data' table in the same database
-        session_data.to_sql('preprocessed_keystroke_data', con=db.engine, if_exists='append', index=False)
-
-        print("Preprocessing complete. Session data is saved to the 'preprocessed_keystroke_data' table in the keystroke_dynamics.db database and ready for model training.")
-
-    except Exception as e:
-        print(f"Error during preprocessing: {e}")
-    finally:
-        session.close()  # Ensure the session is closed regardless of whether an error occurred
+            watermark = get_watermark(PREPROCESS_WATERMARK)
+            rows = db.session.execute(_CHUNK_SQL, {'after': watermark, 'limit': chunk_size}).all()
+            if not rows:
+                db.session.rollback()
+                break
+
+            pending = [row for row in rows if row[9] is None]
+            entries, skipped = _preprocess_chunk(pending)
+            if entries:
+                db.session.execute(PreprocessedKeystrokeData.__table__.insert(), entries)
+                feature_stats.record_samples(entries)
+            set_watermark(PREPROCESS_WATERMARK, rows[-1][0], commit=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        summary['read'] += len(rows)
+        summary['inserted'] += len(entries)
+        summary['already_preprocessed'] += len(rows) - len(pending)
+        summary['invalid'] += skipped
+        summary['chunks'] += 1
+        print(f"Preprocessed keystrokes up to id {rows[-1][0]}: {len(entries)} new samples")
+
+    summary['watermark'] = get_watermark(PREPROCESS_WATERMARK)
+    if summary['inserted']:
+        user_cache.clear()  # Cached sample counts are behind now
+        training_scheduler.note_new_samples(summary['inserted'])
+    return summary
 
 def process_single_keystroke_data(user_id, press_press_intervals, release_press_intervals, hold_times, total_typing_time, typing_speed_cps, backspace_count, error_rate):
     print(f"Processing keystroke data for user {user_id}...")
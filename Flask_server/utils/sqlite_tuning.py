@@ -0,0 +1,53 @@
+from sqlalchemy import event
+from models import db
+
+# Applies SQLITE_PRAGMAS to every new SQLite connection of the app's engine.
+#
+# With the default rollback journal a writer locks the whole database file, so the
+# commits of /authenticate, /train-keystroke and registration queue up behind each
+# other and behind the training read. In WAL mode readers never block the writer and
+# the writer never blocks readers; synchronous=NORMAL is crash safe in WAL mode and
+# only syncs at checkpoints. busy_timeout makes a connection wait for the write lock
+# instead of failing with "database is locked".
+
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,  # Milliseconds; first, so the journal mode switch can wait for a lock too
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,  # Bytes of the database file read through memory-mapped I/O
+}
+
+
+def _pragma_statements(pragmas):
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+
+def init_app(app):
+    """
+    Register the connect listener on the app's engine. Call after db.init_app and
+    before the first connection is opened.
+    """
+    pragmas = app.config.get('SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    statements = _pragma_statements(pragmas)
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def current_pragmas(names=None):
+    """
+    Read the effective pragma values from a pooled connection, for diagnostics.
+    """
+    names = names or list(DEFAULT_PRAGMAS)
+    with db.engine.connect() as conn:
+        return {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
@@ -0,0 +1,159 @@
+import sys
+import json
+import struct
+import sqlite3
+import argparse
+import numpy as np
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+# Storage format of the timing arrays in the keystrokes table (press_press_intervals,
+# release_press_intervals, hold_times). Two formats can live side by side, SQLite keeps
+# whatever type a value was written with:
+#
+# - 'json': the original json.dumps text.
+# - 'float32': a little-endian uint32 element count followed by the values as
+#   little-endian float32. About a quarter of the JSON size, and decode_timings returns
+#   a read-only np.frombuffer view of the blob instead of parsing text. float32 keeps
+#   about 7 significant digits, well below the millisecond resolution of the timings.
+#
+# KEYSTROKE_TIMING_FORMAT selects the format new rows are written in; decode_timings
+# reads both. The Keystroke model declares the columns as TimingArray, so the ORM
+# writes and reads arrays either way. Existing rows are converted with
+#   python -m utils.timing_codec instance/keystroke_dynamics.db --to float32
+
+TIMING_COLUMNS = ['press_press_intervals', 'release_press_intervals', 'hold_times']
+FORMATS = ('json', 'float32')
+
+_HEADER = struct.Struct('<I')
+_DTYPE = np.dtype('<f4')
+
+
+def encode_timings(values):
+    """
+    Encode a sequence of numbers as a float32 blob with its length header.
+    """
+    array = np.asarray(values, dtype=_DTYPE).ravel()
+    return _HEADER.pack(len(array)) + array.tobytes()
+
+
+def decode_timings(value):
+    """
+    Decode a stored timing array in either format.
+
+    Returns:
+        np.ndarray: float32 view of a blob (no copy) or float64 array of JSON text;
+        empty for NULL or empty values.
+    """
+    if value is None:
+        return np.empty(0, dtype=np.float64)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        if len(value) < _HEADER.size:
+            raise ValueError("Timing blob is shorter than its header")
+        (count,) = _HEADER.unpack_from(value)
+        if len(value) != _HEADER.size + count * _DTYPE.itemsize:
+            raise ValueError(f"Timing blob holds {len(value) - _HEADER.size} bytes, header says {count} values")
+        return np.frombuffer(value, dtype=_DTYPE, count=count, offset=_HEADER.size)
+    if not value:
+        return np.empty(0, dtype=np.float64)
+    return np.asarray(json.loads(value), dtype=np.float64)
+
+
+def store_timings(values, timing_format=None):
+    """
+    Value for a timing column in the configured format (KEYSTROKE_TIMING_FORMAT).
+    """
+    if timing_format is None:
+        from flask import current_app
+        timing_format = current_app.config.get('KEYSTROKE_TIMING_FORMAT', 'json')
+    if timing_format == 'float32':
+        return encode_timings(values)
+    return json.dumps(values.tolist() if isinstance(values, np.ndarray) else list(values))
+
+
+class TimingArray(TypeDecorator):
+    """
+    Column type of the timing arrays, declared as a BLOB. Arrays and lists are written
+    with store_timings, values that are already encoded (bytes or legacy JSON text) as
+    they are; reads decode either format with decode_timings.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, (bytes, str)):
+            return value
+        return store_timings(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_timings(value) if value is not None else None
+
+    # LargeBinary's own processors only take bytes; without them the driver binds bytes
+    # as a BLOB and legacy JSON text as TEXT, and hands back whichever was stored
+    def bind_processor(self, dialect):
+        return lambda value: self.process_bind_param(value, dialect)
+
+    def result_processor(self, dialect, coltype):
+        return lambda value: self.process_result_value(value, dialect)
+
+
+def _in_format(value, timing_format):
+    if value is None:
+        return True
+    is_blob = isinstance(value, (bytes, bytearray, memoryview))
+    return is_blob == (timing_format == 'float32')
+
+
+def convert_keystrokes(db_path, timing_format='float32', chunk_size=1000, vacuum=False):
+    """
+    Rewrite the timing columns of every keystrokes row in the given format, one chunk
+    per transaction. Rows already in the format are left alone, so an interrupted
+    conversion can simply be run again.
+
+    Returns:
+        int: Number of rows rewritten.
+    """
+    if timing_format not in FORMATS:
+        raise ValueError(f"Unknown timing format {timing_format!r}, expected one of {FORMATS}")
+    columns = ', '.join(TIMING_COLUMNS)
+    assignments = ', '.join(f'{column} = ?' for column in TIMING_COLUMNS)
+    conn = sqlite3.connect(db_path, timeout=30)
+    converted, last_id = 0, 0
+    try:
+        while True:
+            rows = conn.execute(
+                f"SELECT id, {columns} FROM keystrokes WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size)
+            ).fetchall()
+            if not rows:
+                break
+            updates = [
+                tuple(None if value is None else store_timings(decode_timings(value), timing_format) for value in row[1:])
+                + (row[0],)
+                for row in rows
+                if not all(_in_format(value, timing_format) for value in row[1:])
+            ]
+            with conn:  # One transaction per chunk
+                conn.executemany(f"UPDATE keystrokes SET {assignments} WHERE id = ?", updates)
+            converted += len(updates)
+            last_id = rows[-1][0]
+        if vacuum:
+            conn.execute("VACUUM")  # Returns the freed pages to the file system
+    finally:
+        conn.close()
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the stored keystroke timing arrays to another format')
+    parser.add_argument('db_path', nargs='?', default='instance/keystroke_dynamics.db')
+    parser.add_argument('--to', dest='timing_format', choices=FORMATS, default='float32')
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--vacuum', action='store_true', help='Shrink the database file afterwards')
+    args = parser.parse_args()
+
+    converted = convert_keystrokes(args.db_path, args.timing_format, args.chunk_size, args.vacuum)
+    print(f"Converted {converted} keystrokes rows to {args.timing_format}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text
+from models import db, TrainingState, TrainingJob
+from utils import model_store
+
+# This module runs model retraining in the background instead of inside a request.
+#
+# - New samples are counted in the training_state table, so the trigger survives
+#   restarts and is shared by every worker process.
+# - A retrain request while another job is still queued is coalesced into that job.
+# - Jobs live in the training_jobs table and are claimed with a conditional UPDATE,
+#   so only one job runs at a time even with several worker processes.
+# - Each process runs a single daemon thread that picks up queued jobs, unless
+#   TRAINING_WORKER_ENABLED is off (jobs are then left to another process).
+# - While a job runs, a side thread of the worker refreshes its heartbeat_at. A running
+#   job whose heartbeat is older than TRAINING_JOB_TIMEOUT belonged to a process that
+#   died, and is failed so the queue moves on; a long but live job is never reaped.
+
+DEFAULT_TRIGGER_SAMPLES = 5  # Retrain after this many new samples
+DEFAULT_HEARTBEAT_INTERVAL = 30.0  # Seconds between heartbeats of a running job
+DEFAULT_JOB_TIMEOUT = 300  # Seconds without a heartbeat after which a running job is considered dead
+POLL_INTERVAL = 5.0  # Seconds between checks for jobs queued by other processes
+
+_app = None
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def init_app(app):
+    """
+    Remember the application so the worker thread can push an app context.
+    """
+    global _app
+    _app = app
+
+
+def _ensure_worker():
+    # Started lazily so no thread exists before a pre-fork server forks its workers
+    global _worker
+    if not _config('TRAINING_WORKER_ENABLED', True):
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name='training-scheduler', daemon=True)
+            _worker.start()
+
+
+def job_to_dict(job):
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'reason': job.reason,
+        'requests': job.requests,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'heartbeat_at': job.heartbeat_at,
+        'model_version': job.model_version,
+        'error': job.error
+    }
+
+
+def _config(key, default):
+    return _app.config.get(key, default) if _app is not None else default
+
+
+def request_training(reason='manual'):
+    """
+    Queue a retrain, or join the job that is already waiting to run.
+
+    Returns:
+        tuple: (job dict, coalesced flag)
+    """
+    queued = TrainingJob.query.filter_by(status='queued').order_by(TrainingJob.created_at).first()
+    if queued is not None:
+        db.session.execute(
+            text("UPDATE training_jobs SET requests = requests + 1 WHERE id = :id"),
+            {'id': queued.id}
+        )
+        db.session.commit()
+        db.session.refresh(queued)
+        coalesced = True
+        job = queued
+    else:
+        job = TrainingJob(id=uuid.uuid4().hex, status='queued', reason=reason, requests=1, created_at=time.time())
+        db.session.add(job)
+        db.session.commit()
+        coalesced = False
+
+    _ensure_worker()
+    _wakeup.set()
+    return job_to_dict(job), coalesced
+
+
+def count_new_samples(count=1, bind=None):
+    """
+    Add new samples to the durable trigger counter inside the caller's transaction,
+    on the connection bind or else the session. Nothing is committed.
+
+    Returns:
+        bool: True if this call reached the threshold and reset the counter; the caller
+        schedules the retrain with request_training once its transaction is committed.
+    """
+    executor = bind if bind is not None else db.session
+    threshold = _config('TRAINING_TRIGGER_SAMPLES', DEFAULT_TRIGGER_SAMPLES)
+    executor.execute(text("INSERT OR IGNORE INTO training_state (id, pending_samples) VALUES (1, 0)"))
+    executor.execute(
+        text("UPDATE training_state SET pending_samples = pending_samples + :count WHERE id = 1"),
+        {'count': count}
+    )
+    # Only the request that resets the counter schedules the retrain
+    claimed = executor.execute(
+        text("UPDATE training_state SET pending_samples = 0 WHERE id = 1 AND pending_samples >= :threshold"),
+        {'threshold': threshold}
+    ).rowcount
+    return bool(claimed)
+
+
+def note_new_samples(count=1):
+    """
+    Count new samples and commit the session, so the sample rows the caller added and
+    the counter update are one transaction. Schedules a retrain once the threshold is
+    reached. Returns the job dict if this call scheduled one.
+    """
+    claimed = count_new_samples(count)
+    db.session.commit()
+
+    if claimed:
+        job, _ = request_training(reason='new_samples')
+        return job
+    return None
+
+
+def get_job(job_id):
+    job = db.session.get(TrainingJob, job_id)
+    return job_to_dict(job) if job is not None else None
+
+
+def status():
+    """
+    Summarize the trigger counter, the running job and the most recent jobs.
+    """
+    state = db.session.get(TrainingState, 1)
+    running = TrainingJob.query.filter_by(status='running').first()
+    recent = TrainingJob.query.order_by(TrainingJob.created_at.desc()).limit(10).all()
+    return {
+        'pending_samples': state.pending_samples if state is not None else 0,
+        'trigger_samples': _config('TRAINING_TRIGGER_SAMPLES', DEFAULT_TRIGGER_SAMPLES),
+        'running_job': job_to_dict(running) if running is not None else None,
+        'recent_jobs': [job_to_dict(job) for job in recent]
+    }
+
+
+def _fail_stale_jobs():
+    # A job left 'running' by a crashed process would otherwise block training forever.
+    # Jobs from before the heartbeat column fall back to their start time.
+    timeout = _config('TRAINING_JOB_TIMEOUT', DEFAULT_JOB_TIMEOUT)
+    db.session.execute(
+        text("UPDATE training_jobs SET status = 'failed', finished_at = :now, error = 'Timed out' "
+             "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < :cutoff"),
+        {'now': time.time(), 'cutoff': time.time() - timeout}
+    )
+    db.session.commit()
+
+
+def _claim_next_job():
+    _fail_stale_jobs()
+    job = TrainingJob.query.filter_by(status='queued').order_by(TrainingJob.created_at).first()
+    if job is None:
+        return None
+    claimed = db.session.execute(
+        text("UPDATE training_jobs SET status = 'running', started_at = :now, heartbeat_at = :now "
+             "WHERE id = :id AND status = 'queued' "
+             "AND NOT EXISTS (SELECT 1 FROM training_jobs WHERE status = 'running')"),
+        {'now': time.time(), 'id': job.id}
+    ).rowcount
+    db.session.commit()
+    return job.id if claimed else None
+
+
+def _finish_job(job_id, status, model_version=None, error=None):
+    db.session.execute(
+        text("UPDATE training_jobs SET status = :status, finished_at = :now, "
+             "model_version = :version, error = :error WHERE id = :id"),
+        {'status': status, 'now': time.time(), 'version': model_version, 'error': error, 'id': job_id}
+    )
+    db.session.commit()
+
+
+def _beat(job_id):
+    # Own connection and transaction, the training run keeps the session
+    with db.engine.begin() as conn:
+        conn.execute(
+            text("UPDATE training_jobs SET heartbeat_at = :now WHERE id = :id AND status = 'running'"),
+            {'now': time.time(), 'id': job_id}
+        )
+
+
+@contextmanager
+def _heartbeat(job_id):
+    """
+    Refresh the heartbeat of a running job from a side thread until the block exits.
+    """
+    stop = threading.Event()
+    interval = _config('TRAINING_JOB_HEARTBEAT', DEFAULT_HEARTBEAT_INTERVAL)
+
+    def run():
+        with _app.app_context():
+            while not stop.wait(interval):
+                try:
+                    _beat(job_id)
+                except Exception as e:
+                    print(f"Training job {job_id} heartbeat failed: {e}")
+
+    thread = threading.Thread(target=run, name='training-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _run_one_job():
+    job_id = _claim_next_job()
+    if job_id is None:
+        return False
+
+    print(f"Training job {job_id} started")
+    try:
+        from utils.ml_utils import run_training  # Imported on first job, ml_utils pulls in pandas and sklearn
+        with _heartbeat(job_id):
+            run_training()
+        _finish_job(job_id, 'succeeded', model_version=model_store.current_version())
+        print(f"Training job {job_id} succeeded")
+    except Exception as e:
+        db.session.rollback()
+        _finish_job(job_id, 'failed', error=str(e))
+        print(f"Training job {job_id} failed: {e}")
+    return True
+
+
+def _run_worker():
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        if not _config('TRAINING_WORKER_ENABLED', True):
+            continue
+        try:
+            with _app.app_context():
+                # Drain the queue, one job at a time
+                while _run_one_job():
+                    pass
+                db.session.remove()
+        except Exception as e:
+            print(f"Training scheduler error: {e}")
@@ -0,0 +1,104 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+from models import User, PreprocessedKeystrokeData
+
+# In-process cache of the user profile a login needs: id, password hash and the number
+# of enrolled (preprocessed) samples. With a warm cache /authenticate and
+# /train-keystroke run no read queries before verifying the password.
+#
+# - Entries are keyed by username, bounded by USER_CACHE_SIZE (least recently used
+#   first out) and reloaded from the database after USER_CACHE_TTL seconds.
+# - Samples stored by this process update the cached count in place. Samples stored
+#   by other worker processes show up when the entry expires; the count only gates
+#   the 10-sample minimum before predictions are made.
+# - Registration invalidates the username. Unknown usernames are never cached.
+# - Only the stored hash is cached, every login still checks the password against it.
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_TTL = 60.0  # Seconds
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # username -> {'id', 'password_hash', 'sample_count', 'loaded_at'}
+_stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def _enabled():
+    return current_app.config.get('USER_CACHE_ENABLED', True)
+
+
+def _load(username):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        return None
+    sample_count = PreprocessedKeystrokeData.query.filter_by(user_id=user.id).count()
+    return {
+        'id': user.id,
+        'password_hash': user.password,
+        'sample_count': sample_count,
+        'loaded_at': time.monotonic()
+    }
+
+
+def get_profile(username):
+    """
+    Return {'id', 'password_hash', 'sample_count'} of a user, or None if the username is unknown.
+    The returned dict is a copy and safe to keep.
+    """
+    if not _enabled():
+        return _load(username)
+
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    with _lock:
+        profile = _cache.get(username)
+        if profile is not None and time.monotonic() - profile['loaded_at'] < ttl:
+            _cache.move_to_end(username)
+            _stats['hits'] += 1
+            return dict(profile)
+        if profile is not None:
+            _stats['expired'] += 1
+        _stats['misses'] += 1
+
+    profile = _load(username)  # Outside the lock, other logins keep using the cache
+    if profile is None:
+        return None
+    with _lock:
+        _cache[username] = profile
+        _cache.move_to_end(username)
+        while len(_cache) > current_app.config.get('USER_CACHE_SIZE', DEFAULT_CACHE_SIZE):
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+    return dict(profile)
+
+
+def add_samples(username, count=1):
+    """
+    Count samples this process just stored for a user.
+    """
+    with _lock:
+        profile = _cache.get(username)
+        if profile is not None:
+            profile['sample_count'] += count
+
+
+def invalidate(username):
+    """
+    Drop a user's cached profile, e.g. after registration.
+    """
+    with _lock:
+        if _cache.pop(username, None) is not None:
+            _stats['invalidations'] += 1
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def cache_info():
+    """
+    Hit, miss, expiry and eviction counts of this process, plus the current size.
+    """
+    with _lock:
+        return dict(_stats, size=len(_cache))
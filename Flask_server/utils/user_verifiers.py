@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import text
+from flask import current_app
+from models import db
+from utils import model_store
+from utils.feature_transform import FEATURE_COLUMNS
+
+# Alternative verification engine with one small model per user instead of one
+# multiclass model over every user_id. Each model answers "is this the claimed user?",
+# so enrolling or retraining a user only touches that user's model.
+#
+#   models/users/<shard>/<user_id>.joblib   <- shard = user_id % 256, keeps directories small
+#   models/users/index.json                 <- row count and max row id each model was trained on
+#
+# The folder is USER_VERIFIERS_DIR, by default "users" inside MODELS_DIR.
+#
+# Models are loaded lazily into a bounded LRU cache, each with the index entry it was
+# trained for. When the index changes (another process retrained some users) only the
+# users whose entry changed are evicted and reloaded on demand.
+
+MIN_SAMPLES = 10  # Same enrollment threshold as /authenticate
+NEGATIVE_POOL_SIZE = 2000  # Rows sampled from other users as impostor examples
+DEFAULT_CACHE_SIZE = 1024
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # user_id -> (index entry, model), most recently used last
+_cache_marker = None
+_cache_index = {}  # index.json as of _cache_marker
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def users_dir():
+    return current_app.config.get('USER_VERIFIERS_DIR') or os.path.join(model_store.models_dir(), 'users')
+
+
+def _index_file():
+    return os.path.join(users_dir(), 'index.json')
+
+
+def _model_path(user_id):
+    return os.path.join(users_dir(), f'{user_id % 256:02x}', f'{user_id}.joblib')
+
+
+def _write_atomic(path, write):
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _index_marker():
+    path = _index_file()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def read_index():
+    try:
+        with open(_index_file()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _cache_size():
+    return current_app.config.get('VERIFIER_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+
+def _refresh_index(marker):
+    # Evict the cached users whose index entry changed since they were loaded
+    global _cache_marker, _cache_index
+    index = read_index() if marker is not None else {}
+    with _lock:
+        if marker is not None and _cache_marker is not None and marker[0] == _cache_marker[0]:
+            stale = [user_id for user_id, (entry, _) in _cache.items() if index.get(str(user_id)) != entry]
+        else:
+            stale = list(_cache)  # Another folder, or its index is gone
+        for user_id in stale:
+            del _cache[user_id]
+        _stats['invalidations'] += len(stale)
+        _cache_marker = marker
+        _cache_index = index
+
+
+def get_verifier(user_id):
+    """
+    Return the user's verifier model from the LRU cache, loading it on a miss.
+    Returns None if the user has no trained verifier yet.
+    """
+    marker = _index_marker()
+    if marker != _cache_marker:
+        _refresh_index(marker)
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached is not None:
+            _cache.move_to_end(user_id)
+            _stats['hits'] += 1
+            return cached[1]
+        _stats['misses'] += 1
+        entry = _cache_index.get(str(user_id))
+
+    path = _model_path(user_id)
+    if not os.path.exists(path):
+        return None
+    import joblib  # Deferred so processes that never verify a user do not import it
+    model = joblib.load(path)
+
+    with _lock:
+        _cache[user_id] = (entry, model)
+        _cache.move_to_end(user_id)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+    return model
+
+
+def verify(user_id, feature_vector):
+    """
+    Check a feature vector against the user's own model.
+
+    Returns:
+        bool or None: True if it looks like the user, None if no model exists yet.
+    """
+    model = get_verifier(user_id)
+    if model is None:
+        return None
+    X = np.asarray(feature_vector, dtype=np.float64).reshape(1, -1)
+    prediction = model.predict(X)[0]
+    # user-vs-rest models predict 1 for the user, one-class models predict +1 for inliers
+    return bool(prediction == 1)
+
+
+def cache_info():
+    with _lock:
+        return {'size': len(_cache), 'capacity': _cache_size(), **_stats}
+
+
+def _build_verifier(positives, negatives):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import OneClassSVM
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.pipeline import make_pipeline
+    kind = current_app.config.get('PER_USER_MODEL', 'user_vs_rest')
+    if kind == 'one_class' or len(negatives) == 0:
+        model = make_pipeline(StandardScaler(), OneClassSVM(nu=0.1, gamma='scale'))
+        model.fit(positives)
+        return model
+
+    X = np.vstack([positives, negatives])
+    y = np.concatenate([np.ones(len(positives), dtype=int), np.zeros(len(negatives), dtype=int)])
+    model = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000, class_weight='balanced'))
+    model.fit(X, y)
+    return model
+
+
+def train_user_verifiers(changed_only=True):
+    """
+    Train the per-user verifiers of every user whose preprocessed rows changed since
+    their model was trained (or every enrolled user when changed_only is False).
+
+    Returns:
+        dict: user_id -> {'rows': ..., 'fit_time_s': ...} for the retrained users.
+    """
+    import joblib
+    import pandas as pd  # Training only, keeps pandas out of the login path
+    summary = pd.read_sql(
+        text('SELECT user_id, COUNT(*) AS row_count, MAX(rowid) AS max_row_id '
+             'FROM preprocessed_keystroke_data GROUP BY user_id'),
+        db.engine
+    )
+    index = read_index()
+
+    changed = []
+    for row in summary.itertuples(index=False):
+        if row.row_count < MIN_SAMPLES:
+            continue
+        trained = index.get(str(row.user_id))
+        if changed_only and trained is not None and trained['row_count'] == row.row_count \
+                and trained['max_row_id'] == row.max_row_id:
+            continue
+        changed.append(row)
+
+    if not changed:
+        print("Per-user verifiers are up to date")
+        return {}
+
+    columns = ', '.join(FEATURE_COLUMNS)
+    # One shared sample of rows serves as impostor examples for every retrained user
+    pool = pd.read_sql(
+        text(f'SELECT user_id, {columns} FROM preprocessed_keystroke_data ORDER BY RANDOM() LIMIT :n'),
+        db.engine,
+        params={'n': NEGATIVE_POOL_SIZE}
+    )
+
+    results = {}
+    for row in changed:
+        user_id = int(row.user_id)
+        positives = pd.read_sql(
+            text(f'SELECT {columns} FROM preprocessed_keystroke_data WHERE user_id = :user_id'),
+            db.engine,
+            params={'user_id': user_id}
+        ).to_numpy(dtype=np.float64)
+        negatives = pool.loc[pool['user_id'] != user_id, FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+
+        start = time.perf_counter()
+        model = _build_verifier(positives, negatives)
+        fit_time = time.perf_counter() - start
+
+        path = _model_path(user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, lambda tmp_path: joblib.dump(model, tmp_path))
+
+        index[str(user_id)] = {
+            'row_count': int(row.row_count),
+            'max_row_id': int(row.max_row_id),
+            'trained_at': time.time()
+        }
+        results[user_id] = {'rows': int(row.row_count), 'fit_time_s': fit_time}
+
+    # Publishing the index makes every process drop its cached verifiers of these users
+    os.makedirs(users_dir(), exist_ok=True)
+
+    def write_index(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+
+    _write_atomic(_index_file(), write_index)
+    print(f"Trained per-user verifiers for {len(results)} users")
+    return results
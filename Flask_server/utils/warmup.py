@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+import numpy as np
+from flask import current_app
+from sqlalchemy import text
+from models import db
+from utils import model_registry
+from utils import feature_transform
+from utils.calculate_features import calculate_keystroke_features, calculate_keystroke_features_batch
+
+# Loads everything the first login would otherwise pay for: the database engine, the
+# feature code and the active model set. wsgi.py runs it in the master process of a
+# pre-fork server so the workers inherit the loaded state, /ready reports when it is done.
+
+_app = None
+_lock = threading.Lock()
+_state = {
+    'ready': False,
+    'started_at': None,
+    'finished_at': None,
+    'warmed_in_pid': None,
+    'models_loaded': False,
+    'steps': {}
+}
+
+
+def init_app(app):
+    global _app
+    _app = app
+
+
+def _run_step(name, func):
+    start = time.perf_counter()
+    try:
+        detail = func()
+        _state['steps'][name] = {'ok': True, 'time_ms': (time.perf_counter() - start) * 1000, 'detail': detail}
+        return True
+    except Exception as e:
+        _state['steps'][name] = {'ok': False, 'time_ms': (time.perf_counter() - start) * 1000, 'error': str(e)}
+        print(f"Warm-up step {name} failed: {e}")
+        return False
+
+
+def _warm_database():
+    db.session.execute(text("SELECT 1")).scalar()
+    db.session.remove()
+    # Close the pooled connections so forked workers never share a SQLite connection;
+    # the engine and its dialect stay initialized and new connections open per worker
+    db.engine.dispose()
+
+
+def _warm_features():
+    press = [100.0, 250.0, 420.0, 600.0]
+    release = [180.0, 330.0, 500.0, 690.0]
+    calculate_keystroke_features(press, release)
+    calculate_keystroke_features_batch([press, press], [release, release])
+
+
+def _warm_models():
+    model_set = model_registry.get_model_set()
+    serving_models = model_registry.serving_models(model_set, current_app.config.get('USE_COMPILED_MODELS', True))
+    model_input = feature_transform.transform(np.zeros((1, len(feature_transform.FEATURE_COLUMNS))), model_set['artifacts'])
+    # One prediction per model touches the mapped pages and the predict code paths
+    for model in serving_models.values():
+        model.predict(model_input)
+        if hasattr(model, 'predict_proba'):
+            model.predict_proba(model_input)
+    return {'version': model_set['version'], 'models': list(serving_models)}
+
+
+def warm_up(app=None):
+    """
+    Warm the database engine, the feature code and the models, then mark the process ready.
+
+    A failing step is recorded and the others still run: without a published model set
+    the process is ready to register users, but models_loaded stays False.
+    """
+    app = app or _app
+    with _lock:
+        _state['started_at'] = time.time()
+        with app.app_context():
+            _run_step('database', _warm_database)
+            _run_step('features', _warm_features)
+            _state['models_loaded'] = _run_step('models', _warm_models)
+        _state['finished_at'] = time.time()
+        _state['warmed_in_pid'] = os.getpid()
+        _state['ready'] = True
+    print(f"Warm-up finished in {_state['finished_at'] - _state['started_at']:.2f} s")
+
+
+def status():
+    """
+    Readiness of this process, including the time each warm-up step took.
+    """
+    state = dict(_state, steps=dict(_state['steps']), pid=os.getpid())
+    if not state['ready'] and state['started_at'] is None:
+        state['reason'] = 'Warm-up has not run in this process'
+    return state
@@ -0,0 +1,27 @@
+import time
+from sqlalchemy import text
+from models import db
+
+# High-water marks stored in the watermarks table. Each one records the highest row id
+# a background process (training, preprocessing, ...) has already consumed, so the
+# next run only has to read the rows added since.
+
+
+def get_watermark(name, default=0):
+    row = db.session.execute(
+        text("SELECT value FROM watermarks WHERE name = :name"), {'name': name}
+    ).first()
+    return row[0] if row is not None else default
+
+
+def set_watermark(name, value, commit=True):
+    """
+    Store a high-water mark. Pass commit=False to make it part of a larger transaction.
+    """
+    db.session.execute(
+        text("INSERT INTO watermarks (name, value, updated_at) VALUES (:name, :value, :now) "
+             "ON CONFLICT(name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at"),
+        {'name': name, 'value': int(value), 'now': time.time()}
+    )
+    if commit:
+        db.session.commit()
@@ -0,0 +1,198 @@
+import time
+import atexit
+import threading
+from models import db, PreprocessedKeystrokeData
+from utils import training_scheduler
+from utils import feature_stats
+
+# Optional write-behind buffer for the samples /authenticate stores after a login
+# (WRITE_BEHIND_ENABLED). Instead of one INSERT and commit per login, rows are appended
+# to an in-process buffer and written by a background thread in one executemany
+# transaction, once WRITE_BEHIND_BATCH_SIZE rows are waiting or the oldest row has
+# waited WRITE_BEHIND_FLUSH_INTERVAL seconds.
+#
+# - Rows carry their login time as created_at, so the flush delay does not move them.
+# - The training trigger counts the rows in the flush transaction, so a retrain never
+#   starts before its samples are visible and a retried flush never counts them twice.
+# - Pending rows are flushed at interpreter exit. A process that is killed outright
+#   loses at most the rows of one flush interval.
+# - When the buffer holds WRITE_BEHIND_MAX_PENDING rows, enqueue refuses new rows and
+#   the caller writes them synchronously.
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 0.5  # Seconds
+DEFAULT_MAX_PENDING = 10000
+
+_app = None
+_lock = threading.Lock()
+_condition = threading.Condition(_lock)
+_flush_lock = threading.Lock()  # One flush at a time (worker thread or shutdown)
+_pending = []
+_oldest_at = None
+_worker = None
+_stopping = False
+_atexit_registered = False
+_stats = {
+    'enqueued': 0,
+    'flushed_rows': 0,
+    'flushes': 0,
+    'failed_flushes': 0,
+    'rejected': 0,
+    'max_depth': 0,
+    'last_flush_ms': None,
+    'max_flush_ms': None,
+    'total_flush_ms': 0.0
+}
+
+
+def init_app(app):
+    """
+    Remember the application for the flush thread and flush pending rows at exit.
+    """
+    global _app, _atexit_registered
+    _app = app
+    if not _atexit_registered:  # Once per process, however many apps are created
+        atexit.register(shutdown)
+        _atexit_registered = True
+
+
+def _config(key, default):
+    return _app.config.get(key, default) if _app is not None else default
+
+
+def _ensure_worker():
+    # Started on first use so no thread exists before a pre-fork server forks
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        _worker = threading.Thread(target=_run_worker, name='write-behind', daemon=True)
+        _worker.start()
+
+
+def enqueue(row):
+    """
+    Buffer one preprocessed_keystroke_data row (a dict of column values).
+
+    Returns:
+        bool: False if the buffer is full or shutting down; the caller must write the row itself.
+    """
+    global _oldest_at
+    row = dict(row)
+    row.setdefault('created_at', time.time())
+    with _condition:
+        if _stopping or len(_pending) >= _config('WRITE_BEHIND_MAX_PENDING', DEFAULT_MAX_PENDING):
+            _stats['rejected'] += 1
+            return False
+        if not _pending:
+            _oldest_at = time.monotonic()
+        _pending.append(row)
+        _stats['enqueued'] += 1
+        _stats['max_depth'] = max(_stats['max_depth'], len(_pending))
+        if len(_pending) >= _config('WRITE_BEHIND_BATCH_SIZE', DEFAULT_BATCH_SIZE):
+            _condition.notify()
+        _ensure_worker()
+    return True
+
+
+def _take_batch():
+    global _oldest_at
+    batch = list(_pending)
+    _pending.clear()
+    _oldest_at = None
+    return batch
+
+
+def _write(batch):
+    # Returns True if the batch reached the retrain threshold
+    start = time.perf_counter()
+    with db.engine.begin() as conn:
+        conn.execute(PreprocessedKeystrokeData.__table__.insert(), batch)  # One executemany, one commit
+        feature_stats.record_samples(batch, bind=conn)
+        retrain_due = training_scheduler.count_new_samples(len(batch), bind=conn)
+    elapsed = (time.perf_counter() - start) * 1000
+    with _lock:
+        _stats['flushes'] += 1
+        _stats['flushed_rows'] += len(batch)
+        _stats['last_flush_ms'] = elapsed
+        _stats['max_flush_ms'] = max(_stats['max_flush_ms'] or 0.0, elapsed)
+        _stats['total_flush_ms'] += elapsed
+    return retrain_due
+
+
+def flush():
+    """
+    Write every buffered row now. If the insert transaction fails the rows go back to the
+    front of the buffer; once it has committed they are never written again.
+
+    Returns:
+        int: Number of rows written.
+    """
+    global _oldest_at
+    with _flush_lock:
+        with _lock:
+            batch = _take_batch()
+        if not batch:
+            return 0
+        with _app.app_context():
+            try:
+                retrain_due = _write(batch)
+            except Exception as e:
+                print(f"Write-behind flush of {len(batch)} rows failed: {e}")
+                with _lock:
+                    _stats['failed_flushes'] += 1
+                    _pending[:0] = batch  # Keep the original order, retried on the next flush
+                    _oldest_at = time.monotonic()
+                return 0
+            if retrain_due:
+                # The rows and their count are committed; a failure here only loses the job
+                try:
+                    training_scheduler.request_training(reason='new_samples')
+                except Exception as e:
+                    print(f"Write-behind: could not queue the retrain after a flush: {e}")
+        return len(batch)
+
+
+def _flush_due():
+    if not _pending:
+        return False
+    if len(_pending) >= _config('WRITE_BEHIND_BATCH_SIZE', DEFAULT_BATCH_SIZE):
+        return True
+    return time.monotonic() - _oldest_at >= _config('WRITE_BEHIND_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+
+
+def _run_worker():
+    interval = _config('WRITE_BEHIND_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+    while True:
+        with _condition:
+            while not _stopping and not _flush_due():
+                _condition.wait(timeout=interval)
+            if _stopping:
+                return
+        if flush() == 0 and _pending:
+            time.sleep(interval)  # The last flush failed, back off before retrying
+
+
+def shutdown(timeout=10.0):
+    """
+    Stop the flush thread and write the remaining rows. Registered with atexit.
+    """
+    global _stopping
+    with _condition:
+        _stopping = True
+        _condition.notify_all()
+    if _worker is not None and _worker.is_alive():
+        _worker.join(timeout)
+    if _pending and _app is not None:
+        print(f"Write-behind: flushing {len(_pending)} pending rows before exit")
+        flush()
+
+
+def stats():
+    """
+    Queue depth and flush metrics of this process.
+    """
+    with _lock:
+        result = dict(_stats, depth=len(_pending))
+    flushes = result.pop('total_flush_ms')
+    result['mean_flush_ms'] = flushes / result['flushes'] if result['flushes'] else None
+    result['enabled'] = bool(_config('WRITE_BEHIND_ENABLED', False))
+    return result
@@ -0,0 +1,15 @@
+from app import create_app
+from utils import warmup
+
+# Entry point for pre-fork WSGI servers, e.g. from the Flask_server folder:
+#
+#   gunicorn --preload --workers 4 --bind 0.0.0.0:5000 wsgi:app
+#
+# With --preload this module is imported once in the master process: the models, the
+# database engine and the feature code are warmed here, before the workers are forked,
+# so every worker starts with them already loaded and shares the memory copy-on-write.
+# Background threads (training worker, inference pool) are only started on first use
+# inside each worker, never in the master.
+
+app = create_app()
+warmup.warm_up(app)